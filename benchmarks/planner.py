@@ -0,0 +1,163 @@
+"""Compare the optimal day planner with the heuristic of `EnergyController`.
+
+Both control the same simulated battery through a clear-sky day and a cloudy
+day, with a constant household load. Reports the decision time per update,
+the self-consumed and exported energy and the state of charge at the end of
+the production period.
+
+Run from the repository root, so `ctrlsolar` is importable without installing it:
+
+    python -m benchmarks.planner --resolution-min 15 --load-w 250
+"""
+import argparse
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+import numpy as np
+import pandas as pd
+from pvlib.location import Location  # type: ignore
+from ctrlsolar.battery.abstract import BatterySnapshot
+from ctrlsolar.controller.energy import EnergyController
+from ctrlsolar.controller.planner import DayPlanner
+from ctrlsolar.localization import set_timezone
+from ctrlsolar.panels import GenericPanel, PanelGroup
+from ctrlsolar.panels.abstract import Weather
+
+TIMEZONE = "Europe/Berlin"
+
+
+class ClearSkyWeather(Weather):
+    def __init__(self, location: Location, date: str, days: int, resolution: timedelta, clouds: float):
+        self.resolution = resolution
+        times = pd.date_range(date, periods=int(days * timedelta(days=1) / resolution), freq=resolution)
+        local = times.tz_localize(location.tz)
+        clearsky = location.get_clearsky(local)
+        solpos = location.get_solarposition(local)
+        rng = np.random.default_rng(0)
+        factor = np.clip(1 - clouds * rng.random(len(times)), 0, 1)
+        self._forecast = pd.DataFrame(
+            {
+                "times": times,
+                "GHI": clearsky["ghi"].to_numpy() * factor,
+                "DNI": clearsky["dni"].to_numpy() * factor,
+                "DHI": clearsky["dhi"].to_numpy(),
+                "GTI": clearsky["ghi"].to_numpy() * factor,
+                "apparent_zenith": solpos["apparent_zenith"].to_numpy(),
+                "azimuth": solpos["azimuth"].to_numpy(),
+            }
+        )
+
+    @property
+    def version(self) -> int:
+        return 1
+
+    def get(self) -> pd.DataFrame:
+        return self._forecast
+
+
+@dataclass
+class SimBattery:
+    serial_number: str = "BENCH"
+    capacity: int = 2048
+    energy: float = 600.0
+    discharge_limit: float = 0.1
+    charge_limit: float = 1.0
+    panel_power: float = 0.0
+    energy_out: float = 0.0
+    online: bool = True
+
+    @property
+    def energy_charged(self) -> float:
+        return self.energy
+
+    @property
+    def energy_missing(self) -> float:
+        return self.capacity - self.energy
+
+    def snapshot(self) -> BatterySnapshot:
+        return BatterySnapshot.build(
+            online=self.online,
+            n_batteries=1,
+            capacity_per_battery=self.capacity,
+            state_of_charge=self.energy / self.capacity,
+            discharge_limit=self.discharge_limit,
+            charge_limit=self.charge_limit,
+            output_power=None,
+            panel_power=self.panel_power,
+            energy_out=self.energy_out,
+        )
+
+
+def simulate(controller: EnergyController, battery: SimBattery, load_W: float, optimal: bool) -> dict[str, float]:
+    series = controller._forecast.production_series()
+    h = series.slot_hours
+    production = controller.evaluate_day_schedule().production
+    prod_end = int(np.flatnonzero(production[: series.slots_per_day])[-1]) + 1
+    self_consumed = exported = 0.0
+    decision_s: list[float] = []
+    for slot in range(series.slots_per_day):
+        battery.panel_power = float(series.power[slot])
+        start = time.perf_counter()
+        if optimal:
+            target = controller.evaluate_planned_power_target(slot)
+        else:
+            controller.evaluate_day_schedule()
+            if controller.is_battery_slot(slot):
+                target = controller.evaluate_battery_power_target(slot)
+            else:
+                target = controller.evaluate_production_power_target(slot)
+        decision_s.append(time.perf_counter() - start)
+
+        target = max(target if target is not None else 0, controller._p_min)
+        # the battery cannot give more than it holds, solar surplus of a full battery is passed through
+        output = min(target * h, battery.energy - battery.discharge_limit * battery.capacity + series.energy[slot])
+        battery.energy += series.energy[slot] - output
+        surplus = max(battery.energy - battery.charge_limit * battery.capacity, 0.0)
+        battery.energy -= surplus
+        output += surplus
+        self_consumed += min(output, load_W * h)
+        exported += max(output - load_W * h, 0.0)
+        if slot == prod_end - 1:
+            soc_at_end = battery.energy / battery.capacity
+
+    return {
+        "decision_ms": 1e3 * float(np.mean(decision_s)),
+        "self_consumed_kWh": self_consumed / 1e3,
+        "exported_kWh": exported / 1e3,
+        "soc_end_of_production": soc_at_end,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--resolution-min", type=int, default=60)
+    parser.add_argument("--load-w", type=float, default=250)
+    parser.add_argument("--days", type=int, default=2, help="forecast horizon in days")
+    args = parser.parse_args()
+
+    set_timezone(TIMEZONE)
+    location = Location(48.1, 11.6, tz=TIMEZONE)
+    panels = PanelGroup([GenericPanel(area=2.0, efficiency=0.22, tilt=30, azimuth=180) for _ in range(4)])
+    date = datetime.now().strftime("%Y-%m-%d")
+    resolution = timedelta(minutes=args.resolution_min)
+
+    rows = []
+    for day, clouds in (("clear", 0.0), ("cloudy", 0.7)):
+        weather = ClearSkyWeather(location, date, args.days, resolution, clouds)
+        for name, optimal in (("heuristic", False), ("optimal", True)):
+            battery = SimBattery()
+            controller = EnergyController(
+                battery=battery,  # type: ignore
+                weather=weather,
+                panels=panels,
+                p_min=100,
+                p_max=800,
+                planner=DayPlanner(p_min=100, p_max=800) if optimal else None,
+            )
+            rows.append({"day": day, "planner": name, **simulate(controller, battery, args.load_w, optimal)})
+
+    print(pd.DataFrame(rows).round(3).to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,30 @@
 from ctrlsolar.mqtt.mqtt import set_mqtt, Mqtt
+from ctrlsolar.mqtt.aio import AsyncMqttLoop
 import ctrlsolar.mqtt.topics as mqtt_topics
-from ctrlsolar.controller import EnergyController
+from ctrlsolar.controller import EnergyController, PowerTracker, ZeroExportController
+from ctrlsolar.controller.abstract import OutputController
+from ctrlsolar.controller.forecast import ForecastBatch
+from ctrlsolar.controller.planner import DayPlanner
+from ctrlsolar.controller.trigger import ChangeTrigger
 from ctrlsolar.battery import Noah2000
-from ctrlsolar.panels import OpenMeteoWeather, GenericPanel, PanelGroup
+from ctrlsolar.panels import OpenMeteoWeather, create_panels
 from ctrlsolar.localization import set_timezone
 from ctrlsolar.config import Config
+from ctrlsolar.runtime import (
+    ControllerTask,
+    TickSchedule,
+    run_controllers,
+    run_scheduled,
+    start_controller_thread,
+    update_concurrently,
+)
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import timedelta
+from functools import partial
+from typing import Optional
+import asyncio
+import threading
 import time
 import logging
 import argparse
@@ -17,18 +37,149 @@ def publish_ha_autodiscovery(mqtt: Mqtt, device_id: str) -> None:
     for topic, payload in mqtt_topics.discovery_items(device_id):
         mqtt.publish(topic, payload, retain=True)
 
-def run(config_file: str) -> None:
-    config = Config.from_yaml(config_file)
-    set_timezone(config.timezone)
-
+def create_mqtt(config: Config) -> Mqtt:
     mqtt = Mqtt(
         host=config.mqtt_host, 
         port=config.mqtt_port,
         password=config.mqtt_password,
         username=config.mqtt_username,
     )
-    mqtt.connect()
     set_mqtt(mqtt)
+    return mqtt
+
+@dataclass
+class Device:
+    battery: Noah2000
+    controller: EnergyController
+    output_task: Optional[ControllerTask] = None     # fast loop owning the output setpoint
+
+
+def create_trigger(config: Config, batteries: list[Noah2000]) -> Optional[ChangeTrigger]:
+    """Wake up early on significant sensor changes, periodic update remains as fallback."""
+    if not config.event_driven:
+        return None
+
+    trigger = ChangeTrigger(min_interval_s=config.min_update_interval_s)
+    for battery in batteries:
+        trigger.watch(battery.sensors["online"], name=f"{battery.serial_number} online")
+        trigger.watch(
+            battery.sensors["panel_power"],
+            threshold=config.trigger_threshold_w,
+            name=f"{battery.serial_number} panel_power",
+        )
+
+    return trigger
+
+def build(config: Config, mqtt: Mqtt) -> tuple[list[Device], list[OpenMeteoWeather]]:
+    """Create panels, batteries, weather and controllers. Requires a connected MQTT client.
+
+    Batteries at the same location share one weather forecast, their production
+    forecasts are computed in one batch.
+    """
+    weathers: dict[tuple[float, float], OpenMeteoWeather] = {}
+    batches: dict[tuple[float, float], ForecastBatch] = {}
+
+    devices: list[Device] = []
+    for battery_config in config.batteries:
+        location = (round(battery_config.latitude, 4), round(battery_config.longitude, 4))
+        if location not in weathers:
+            weathers[location] = OpenMeteoWeather(
+                latitude=battery_config.latitude,
+                longitude=battery_config.longitude,
+                timezone=config.timezone,
+                horizon=timedelta(hours=config.forecast_horizon_h),
+                resolution=timedelta(minutes=config.forecast_resolution_min),
+                cache_dir=config.weather_cache_dir,
+            )
+            batches[location] = ForecastBatch(weathers[location])
+
+        panels = create_panels(battery_config.panels)
+        # an output controller makes small corrections on purpose, a deadband would drop them unnoticed
+        owned = battery_config.grid_sensor is not None or battery_config.power_sensor is not None
+        battery = Noah2000.from_grobro(
+            battery_config.serial,
+            power_deadband_W=None if owned else config.power_deadband_w,
+        )
+
+        # optional: create sensor for energy measurements
+        energy_sensor = None
+        if battery_config.energy_sensor is not None:
+            energy_sensor = battery_config.energy_sensor["type"](battery_config.energy_sensor["topic"])
+
+        # optional: follow the household consumption, or track the measured AC output between planner updates
+        output_controller: Optional[OutputController] = None
+        output_task = None
+        if battery_config.grid_sensor is not None:
+            grid_sensor = battery_config.grid_sensor["type"](battery_config.grid_sensor["topic"])
+            output_controller = ZeroExportController(
+                battery=battery,
+                grid_sensor=grid_sensor,
+                p_min=battery_config.power_min,
+                p_max=battery_config.power_max,
+                grid_target_W=config.grid_target_w,
+                gain=config.zero_export_gain,
+            )
+            grid_trigger = ChangeTrigger(min_interval_s=1)
+            grid_trigger.watch(grid_sensor, threshold=config.zero_export_threshold_w, name="grid")
+            output_task = ControllerTask(
+                controller=output_controller,
+                interval_s=config.zero_export_interval_s,
+                trigger=grid_trigger,
+                verbose=False,
+            )
+        elif battery_config.power_sensor is not None:
+            power_sensor = battery_config.power_sensor["type"](battery_config.power_sensor["topic"])
+            output_controller = PowerTracker(
+                battery=battery,
+                power_sensor=power_sensor,
+                p_min=battery_config.power_min,
+                p_max=battery_config.power_max,
+                kp=config.tracking_kp,
+                ki=config.tracking_ki,
+                max_step_W=config.tracking_max_step_w,
+            )
+            output_task = ControllerTask(controller=output_controller, interval_s=config.tracking_interval_s, verbose=False)
+
+        controller = EnergyController(
+            battery=battery,
+            weather=weathers[location],
+            panels=panels,
+            p_min=battery_config.power_min,
+            p_max=battery_config.power_max,
+            energy_sensor=energy_sensor,
+            forecast_cache=batches[location].add(panels),
+            tracker=output_controller,
+            planner=(
+                DayPlanner(p_min=battery_config.power_min, p_max=battery_config.power_max)
+                if config.planner == "optimal" else None
+            ),
+        )
+        devices.append(Device(battery=battery, controller=controller, output_task=output_task))
+
+        if config.ha_autodiscovery:
+            publish_ha_autodiscovery(mqtt, battery.serial_number)    
+
+    logger.info(f"Controlling {len(devices)} batteries at {len(weathers)} locations.")
+    return devices, list(weathers.values())
+
+def wait_for_batteries(batteries: list[Noah2000], timeout_s: float = 30) -> None:
+    """Wait until every battery reported its availability and state, at most `timeout_s`."""
+    deadline = time.monotonic() + timeout_s
+    while True:
+        missing = [
+            battery.serial_number for battery in batteries
+            if battery.online is None or battery.snapshot().received_at is None
+        ]
+        if not missing:
+            return
+        if time.monotonic() >= deadline:
+            logger.warning(f"No state received from {', '.join(missing)} yet. Starting anyway.")
+            return
+        time.sleep(0.5)
+
+def run_threaded(config: Config) -> None:
+    mqtt = create_mqtt(config)
+    mqtt.connect()
 
     # add a connection check with timeout and error raising if conenction fails
     for ii in range(5):
@@ -39,64 +190,79 @@ def run(config_file: str) -> None:
         if ii == 4:
             raise RuntimeError(f"Connection to MQTT broker could not be established.")
 
-    # create solar panels
-    panel_list = [
-        GenericPanel(
-            tilt=float(panel["tilt"]),
-            azimuth=float(panel["azimuth"]),
-            area=float(panel["area"]),
-            efficiency=float(panel["efficiency"]),
-            calibration=panel.get("calibration"),
-        ) for panel in config.panels]
-
-    panels = PanelGroup(panel_list)
-    battery = Noah2000.from_grobro(config.battery_sn)
-    weather = OpenMeteoWeather(
-        latitude=config.latitude,
-        longitude=config.longitude,
-        timezone=config.timezone
-    )
+    devices, weathers = build(config, mqtt)
+    trigger = create_trigger(config, [device.battery for device in devices])
+    tasks = [ControllerTask(controller=device.controller, interval_s=config.update_interval_s) for device in devices]
+    # one schedule for the round, all controllers are updated together
+    schedule = TickSchedule(config.update_interval_s, slot_s=60 * config.forecast_resolution_min, name="controllers")
+    for weather in weathers:
+        # the first forecast is loaded before the first planning round, the prefetch only refreshes ahead of expiry
+        weather.get()
+        weather.start_prefetch()
 
-    # optional: create sensor for energy measurements
-    energy_sensor = None
-    if config.energy_sensor is not None:
-        energy_sensor = config.energy_sensor["type"](config.energy_sensor["topic"])      
+    stop_output_tasks = threading.Event()
 
-    # TODO: For calibration, add later
-    # power_sensor = None
-    # if config.power_sensor is not None:
-    #     power_sensor = config.power_sensor["type"](config.power_sensor["topic"])
+    # run in loop
+    executor = ThreadPoolExecutor(max_workers=max(min(len(tasks), 8), 1), thread_name_prefix="controller")
+    try:
+        wait_for_batteries([device.battery for device in devices])
+        update = partial(update_concurrently, tasks, executor)
+        schedule.begin()
+        update()
+        schedule.finish()
 
-    # create the controllers
-    controllers = [
-        EnergyController(
-            battery=battery,
-            weather=weather,
-            panels=panels,
-            p_min=config.power_min,
-            p_max=config.power_max,
-            energy_sensor=energy_sensor
+        # the fast loops start from the first planned target
+        for device in devices:
+            if device.output_task is not None:
+                start_controller_thread(device.output_task, stop_output_tasks)
+
+        run_scheduled(update, schedule, threading.Event(), trigger, immediately=False)
+
+    except KeyboardInterrupt:
+        pass
+
+    stop_output_tasks.set()
+    executor.shutdown(wait=False)
+    for weather in weathers:
+        weather.stop_prefetch()
+
+    return
+
+async def run_asyncio(config: Config) -> None:
+    mqtt = create_mqtt(config)
+    mqtt_loop = AsyncMqttLoop(mqtt)
+    await mqtt_loop.connect()
+
+    devices, weathers = build(config, mqtt)
+    tasks = [
+        ControllerTask(
+            controller=device.controller,
+            interval_s=config.update_interval_s,
+            trigger=create_trigger(config, [device.battery]),
+            slot_s=60 * config.forecast_resolution_min,
         )
+        for device in devices
     ]
+    tasks.extend(device.output_task for device in devices if device.output_task is not None)
 
-    if config.ha_autodiscovery:
-        publish_ha_autodiscovery(mqtt, battery.serial_number)    
-
-    # run in loop
     try:
-        time.sleep(30)
-        while True:
-            for cc in controllers:
-                print()
-                info = f"Update started for {cc.name}."
-                logger.info(info)
-                logger.info(len(info) * "-")
-                cc.update()
+        await run_controllers(tasks, weathers=weathers)
+    finally:
+        await mqtt_loop.disconnect()
+
+    return
 
-            time.sleep(config.update_interval_s)
+def run(config_file: str) -> None:
+    config = Config.from_yaml(config_file)
+    set_timezone(config.timezone)
 
-    except KeyboardInterrupt:
-        pass
+    if config.runtime == "asyncio":
+        try:
+            asyncio.run(run_asyncio(config))
+        except KeyboardInterrupt:
+            pass
+    else:
+        run_threaded(config)
 
     return
 
@@ -109,4 +275,4 @@ if __name__ == "__main__":
         help="Path to YAML config file",
     )
     args = parser.parse_args()
-    run(config_file=args.config_file)
\ No newline at end of file
+    run(config_file=args.config_file)
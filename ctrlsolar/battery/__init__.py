@@ -1,5 +1,8 @@
+from ctrlsolar.battery.abstract import BatterySnapshot, DCCoupledBattery
 from ctrlsolar.battery.noah2000 import Noah2000
 
 __all__ = [
-    "Noah2000"
+    "BatterySnapshot",
+    "DCCoupledBattery",
+    "Noah2000",
 ]
\ No newline at end of file
@@ -1,13 +1,77 @@
 from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from ctrlsolar.mqtt.outbox import SetpointStatus
+from typing import Optional
 import logging
+import time
 
 logger = logging.getLogger(__name__)
 
 __all__ = [
+    "BatterySnapshot",
     "DCCoupledBattery",
 ]
 
 
+@dataclass(frozen=True)
+class BatterySnapshot:
+    """State of a battery at one instant, read at once and consistent in itself.
+
+    Controllers take one snapshot per update instead of reading the battery
+    properties one by one, which could mix values of different state messages.
+    """
+    online: bool
+    n_batteries: int
+    capacity: int                       # in [Wh]
+    state_of_charge: float | None       # 0-1
+    discharge_limit: float | None       # 0-1
+    charge_limit: float | None          # 0-1
+    output_power: float | None          # in [W]
+    panel_power: float | None           # in [W]
+    energy_out: float | None            # in [Wh]
+    energy_charged: float | None        # in [Wh]
+    energy_missing: float | None        # in [Wh]
+    received_at: float | None = None    # monotonic receive time of the underlying state, if known
+
+    @classmethod
+    def build(
+        cls,
+        online: bool,
+        n_batteries: int,
+        capacity_per_battery: int,
+        state_of_charge: float | None,
+        discharge_limit: float | None,
+        charge_limit: float | None,
+        output_power: float | None,
+        panel_power: float | None,
+        energy_out: float | None,
+        received_at: float | None = None,
+    ) -> "BatterySnapshot":
+        """Create a snapshot from raw values, computing the derived quantities once."""
+        capacity = n_batteries * capacity_per_battery
+        energy_charged = state_of_charge * capacity if state_of_charge is not None else None
+        return cls(
+            online=online,
+            n_batteries=n_batteries,
+            capacity=capacity,
+            state_of_charge=state_of_charge,
+            discharge_limit=discharge_limit,
+            charge_limit=charge_limit,
+            output_power=output_power,
+            panel_power=panel_power,
+            energy_out=energy_out,
+            energy_charged=energy_charged,
+            energy_missing=capacity - energy_charged if energy_charged is not None else None,
+            received_at=received_at,
+        )
+
+    def age(self, now: Optional[float] = None) -> float | None:
+        """Seconds since the state was received, `None` if unknown."""
+        if self.received_at is None:
+            return None
+        return (time.monotonic() if now is None else now) - self.received_at
+
+
 class DCCoupledBattery(ABC):
     max_power: int  # in [W]
     serial_number: str  # battery serial number
@@ -62,6 +126,12 @@ class DCCoupledBattery(ABC):
     def output_power(self, power: int | float) -> None:
         pass    
 
+    @property
+    @abstractmethod
+    def output_power_status(self) -> SetpointStatus:
+        """Delivery state of the output power setpoints."""
+        pass
+
     @property
     @abstractmethod
     def energy_charged(self) -> float | None:
@@ -70,4 +140,25 @@ class DCCoupledBattery(ABC):
     @property
     @abstractmethod
     def energy_missing(self) -> float | None:
-        pass
\ No newline at end of file
+        pass
+
+    def snapshot(self) -> BatterySnapshot:
+        """Current state in one object.
+
+        Reads the properties one by one. Implementations fed by a single state
+        message override this to capture all values of the same message.
+        """
+        n_batteries = self.n_batteries or 1
+        return BatterySnapshot(
+            online=bool(self.online),
+            n_batteries=n_batteries,
+            capacity=self.capacity,
+            state_of_charge=self.state_of_charge,
+            discharge_limit=self.discharge_limit,
+            charge_limit=self.charge_limit,
+            output_power=self.output_power,
+            panel_power=self.panel_power,
+            energy_out=self.energy_out,
+            energy_charged=self.energy_charged,
+            energy_missing=self.energy_missing,
+        )
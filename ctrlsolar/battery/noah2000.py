@@ -1,8 +1,9 @@
-from ctrlsolar.battery.abstract import DCCoupledBattery
+from ctrlsolar.battery.abstract import BatterySnapshot, DCCoupledBattery
 from ctrlsolar.mqtt.abstract import Sensor, Consumer
 from ctrlsolar.mqtt.mqtt import MqttSensor, MqttConsumer
-from typing import Any
-import json
+from ctrlsolar.mqtt.demux import DecodedMessage, Field, FieldSensor, JsonTopicDemux, get_demux
+from ctrlsolar.mqtt.outbox import SetpointStatus
+from typing import Any, Optional
 import logging
 
 __all__ = ["Noah2000"]
@@ -10,8 +11,21 @@ __all__ = ["Noah2000"]
 logger = logging.getLogger(__name__)
 
 
+# sensors decoded from the GroBro state message
+_STATE_SENSORS: tuple[str, ...] = (
+    "state_of_charge",
+    "discharge_limit",
+    "charge_limit",
+    "output_power",
+    "panel_power",
+    "n_batteries",
+    "energy_out",
+)
+
+
 class Noah2000(DCCoupledBattery):
     max_power: int = 800
+    capacity_per_battery: int = 2048
 
     def __init__(
         self,
@@ -25,6 +39,7 @@ class Noah2000(DCCoupledBattery):
         panel_power_sensor: Sensor,
         n_batteries_sensor: Sensor,
         energy_out_sensor: Sensor,
+        state: Optional[JsonTopicDemux] = None,
         *args: Any,
         **kwargs: Any,
     ):
@@ -39,6 +54,29 @@ class Noah2000(DCCoupledBattery):
         self._panel_power_sensor = panel_power_sensor
         self._n_batteries_sensor = n_batteries_sensor
         self._energy_out = energy_out_sensor
+        # with the demux of the state message, snapshots read all fields of its last message at once
+        self._state = state
+        self._state_fields: dict[str, Field] = {}
+        if state is not None:
+            self._state_fields = {
+                name: sensor.field
+                for name, sensor in self.sensors.items()
+                if name in _STATE_SENSORS and isinstance(sensor, FieldSensor)
+            }
+        self._snapshot: tuple[Optional[DecodedMessage], bool, BatterySnapshot] | None = None
+
+    @property
+    def sensors(self) -> dict[str, Sensor]:
+        return {
+            "online": self._online_sensor,
+            "state_of_charge": self._soc_sensor,
+            "discharge_limit": self._discharge_limit_sensor,
+            "charge_limit": self._charge_limit_sensor,
+            "output_power": self._output_power_sensor,
+            "panel_power": self._panel_power_sensor,
+            "n_batteries": self._n_batteries_sensor,
+            "energy_out": self._energy_out,
+        }
 
     @property
     def online(self) -> bool:
@@ -46,7 +84,7 @@ class Noah2000(DCCoupledBattery):
 
     @property
     def capacity(self) -> int:
-        return self.n_batteries*2048
+        return self.n_batteries * self.capacity_per_battery
 
     @property
     def n_batteries(self) -> int:
@@ -79,6 +117,10 @@ class Noah2000(DCCoupledBattery):
     def output_power(self, power: int | float) -> None:
         self._output_power_consumer.set(power) 
         return
+
+    @property
+    def output_power_status(self) -> SetpointStatus:
+        return self._output_power_consumer.status
     
     @property
     def energy_charged(self) -> float | None:
@@ -98,65 +140,68 @@ class Noah2000(DCCoupledBattery):
         
         return self.capacity - self.energy_charged
 
+    def snapshot(self) -> BatterySnapshot:
+        """All values of the last state message, with its receive time.
+
+        Derived quantities are computed once per message, later calls return the same snapshot.
+        """
+        if self._state is None or len(self._state_fields) < len(_STATE_SENSORS):
+            return super().snapshot()
+
+        message = self._state.last
+        online = bool(self.online)
+        cached = self._snapshot
+        if cached is not None and cached[0] is message and cached[1] == online:
+            return cached[2]
+
+        if message is None:
+            values: dict[str, Any] = {name: None for name in _STATE_SENSORS}
+        else:
+            values = {name: field.extract(message.data) for name, field in self._state_fields.items()}
+
+        snapshot = BatterySnapshot.build(
+            online=online,
+            n_batteries=values["n_batteries"] or 1,
+            capacity_per_battery=self.capacity_per_battery,
+            state_of_charge=values["state_of_charge"],
+            discharge_limit=values["discharge_limit"],
+            charge_limit=values["charge_limit"],
+            output_power=values["output_power"],
+            panel_power=values["panel_power"],
+            energy_out=values["energy_out"],
+            received_at=message.received_at if message is not None else None,
+        )
+        self._snapshot = (message, online, snapshot)
+        return snapshot
+
     @classmethod
     def from_grobro(
         cls,
         serial: str,
-    ) -> DCCoupledBattery:
+        power_deadband_W: float | None = None,
+    ) -> "Noah2000":
         online_sensor = MqttSensor(
             topic=f"homeassistant/grobro/{serial.upper()}/availability",
+            via="homeassistant/grobro/+/availability",
             filter=[lambda x: True if str(x)=="online" else False if not None else False], # type:ignore
         )
-        state_of_charge_sensor = MqttSensor(
-            topic=f"homeassistant/grobro/{serial.upper()}/state",
-            filter=[lambda y: (lambda x: float(x) / 100 if x is not None else 0)(  # type: ignore
-                json.loads(y)["tot_bat_soc_pct"]  # type: ignore
-            )],
-        )
-        discharge_limit_sensor = MqttSensor(
-            topic=f"homeassistant/grobro/{serial.upper()}/state",
-            filter=[lambda y: (lambda x: float(x) / 100 if x is not None else 0)(  # type: ignore
-                json.loads(y)["discharge_limit"]  # type: ignore
-            )],
-        )
-        charge_limit_sensor = MqttSensor(
-            topic=f"homeassistant/grobro/{serial.upper()}/state",
-            filter=[lambda y: (lambda x: float(x) / 100 if x is not None else 0)(  # type: ignore
-                json.loads(y)["charge_limit"]  # type: ignore
-            )],
-        )
-        output_power_sensor = MqttSensor(
-            topic=f"homeassistant/grobro/{serial.upper()}/state",
-            filter=[lambda y: (lambda x: float(x) if x is not None else None)(  # type: ignore
-                json.loads(y)["out_power"]  # type: ignore
-            )],
-        )
         output_power_consumer = MqttConsumer(
-            topic=f"homeassistant/number/grobro/{serial.upper()}/slot1_power/set"
-        )
-        panel_power_sensor = MqttSensor(
-            topic=f"homeassistant/grobro/{serial.upper()}/state",
-            filter=[lambda y: (lambda x: float(x) if x is not None else None)(  # type: ignore
-                json.loads(y)["pv_tot_power"]  # type: ignore
-            )],
+            topic=f"homeassistant/number/grobro/{serial.upper()}/slot1_power/set",
+            deadband=power_deadband_W,
         )
-        n_battery_sensor = MqttSensor(
-            topic=f"homeassistant/grobro/{serial.upper()}/state",
-            filter=[lambda y: (  # type: ignore
-                lambda x: (
-                    1
-                    if x is None else int(x)
-                )
-            )(
-                json.loads(y)["bat_cnt"]  # type: ignore
-            )],  # type: ignore
-        )
-        energy_out_sensor = MqttSensor(
-            topic=f"homeassistant/grobro/{serial.upper()}/state",
-            filter=[lambda y: (lambda x: 1E3*float(x) if x is not None else None)(  # type: ignore
-                json.loads(y)["eng_out_device"]  # type: ignore
-            )],
+
+        # all remaining values share the state topic, which is decoded once per message
+        state = get_demux(
+            f"homeassistant/grobro/{serial.upper()}/state",
+            via="homeassistant/grobro/+/state",
         )
+        state_of_charge_sensor = state.sensor(Field("tot_bat_soc_pct", scale=1 / 100, default=0))
+        discharge_limit_sensor = state.sensor(Field("discharge_limit", scale=1 / 100, default=0))
+        charge_limit_sensor = state.sensor(Field("charge_limit", scale=1 / 100, default=0))
+        output_power_sensor = state.sensor(Field("out_power"))
+        panel_power_sensor = state.sensor(Field("pv_tot_power"))
+        n_battery_sensor = state.sensor(Field("bat_cnt", default=1, cast=int))
+        energy_out_sensor = state.sensor(Field("eng_out_device", scale=1E3))
 
         return cls(
             serial_number=serial,
@@ -169,5 +214,6 @@ class Noah2000(DCCoupledBattery):
             panel_power_sensor=panel_power_sensor,
             n_batteries_sensor=n_battery_sensor,
             energy_out_sensor=energy_out_sensor,
+            state=state,
         )
         
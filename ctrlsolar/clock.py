@@ -0,0 +1,72 @@
+from abc import ABC, abstractmethod
+from dataclasses import dataclass, replace
+from datetime import date, datetime, timedelta, timezone
+from typing import Optional
+from ctrlsolar.localization import get_timezone
+
+__all__ = ["Clock", "SystemClock", "TickContext", "VirtualClock", "set_clock", "get_clock"]
+
+
+@dataclass(frozen=True)
+class TickContext:
+    """Time of one controller update, read once and passed to everything the update touches."""
+    now: datetime           # local time, timezone aware
+    date: date
+    hour: int
+    slot: Optional[int] = None  # forecast slot of `now`, once known
+
+    @classmethod
+    def at(cls, now: datetime) -> "TickContext":
+        return cls(now=now, date=now.date(), hour=now.hour)
+
+    def with_slot(self, slot: int) -> "TickContext":
+        return replace(self, slot=slot)
+
+
+class Clock(ABC):
+    @abstractmethod
+    def now(self) -> datetime:
+        """Current local time, timezone aware."""
+        pass
+
+    def tick(self) -> TickContext:
+        return TickContext.at(self.now())
+
+
+class SystemClock(Clock):
+    def now(self) -> datetime:
+        return datetime.now(get_timezone())
+
+
+class VirtualClock(Clock):
+    """Clock that only moves when told to, for simulations and replays."""
+
+    def __init__(self, start: datetime):
+        self._now = start if start.tzinfo is not None else start.replace(tzinfo=get_timezone())
+
+    def now(self) -> datetime:
+        return self._now
+
+    def set(self, time: datetime) -> None:
+        self._now = time if time.tzinfo is not None else time.replace(tzinfo=get_timezone())
+        return
+
+    def advance(self, delta: timedelta) -> None:
+        # in UTC, local wall time jumps at daylight saving changes
+        tz = self._now.tzinfo
+        self._now = (self._now.astimezone(timezone.utc) + delta).astimezone(tz)
+        return
+
+
+_clock: Clock = SystemClock()
+
+
+def set_clock(clock: Clock) -> None:
+    """Replace the global clock, e.g. by a `VirtualClock` in a backtest."""
+    global _clock
+    _clock = clock
+    return
+
+
+def get_clock() -> Clock:
+    return _clock
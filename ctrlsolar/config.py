@@ -5,66 +5,166 @@ import os
 import yaml
 from typing import Any, Optional, Type, cast
 
+def _parse_panels(raw_panels: Any) -> list[dict[str, Any]]:
+    if not isinstance(raw_panels, list):
+        raise ValueError("Expected 'panels' to be a list of dictionaries.")
+
+    typed_raw_panels = cast(list[Any], raw_panels)
+    if not all(isinstance(panel, dict) for panel in typed_raw_panels):
+        raise ValueError("Each item in 'panels' must be a dictionary.")
+
+    return cast(list[dict[str, Any]], typed_raw_panels)
+
+
+def _parse_sensor(raw_sensor: Optional[dict[str, Any]]) -> Optional[dict[str, Any]]:
+    if raw_sensor is None:
+        return None
+
+    return {**raw_sensor, "type": MAPPINGS[raw_sensor["type"]]}
+
+
+@dataclass
+class BatteryConfig:
+    serial: str
+    panels: list[dict[str, Any]]
+    latitude: float
+    longitude: float
+    power_min: int
+    power_max: int
+    energy_sensor: Optional[dict[str, Any]] = None
+    power_sensor: Optional[dict[str, Any]] = None
+    grid_sensor: Optional[dict[str, Any]] = None
+
+
 @dataclass
 class Config:
     panels: list[dict[str, Any]]
     battery_sn: str
+    batteries: list[BatteryConfig] = field(default_factory=lambda: [])
     power_min: int = 200
     power_max: int = 800
+    power_deadband_w: float = 10
     power_check_topic: Optional[str] = None
 
     latitude: float = 42.46903090913205
     longitude: float = -71.35063628495487
     timezone: str = "America/New_York"
+    weather_cache_dir: Optional[str] = None
+    forecast_horizon_h: int = 48
+    forecast_resolution_min: int = 60
 
     mqtt_host: str = "homeassistant.local"
     mqtt_port: int = 1883
     mqtt_username: str = field(default_factory=lambda: os.getenv("MQTT_USERNAME", ""))
     mqtt_password: str = field(default_factory=lambda: os.getenv("MQTT_PASSWORD", ""))
 
+    runtime: str = "thread"
+    planner: str = "heuristic"
     update_interval_s: int = 300
+    event_driven: bool = False
+    trigger_threshold_w: float = 100
+    min_update_interval_s: int = 30
     ha_autodiscovery: bool = False
 
     energy_sensor: Optional[dict[str, Any]] = None
     power_sensor: Optional[dict[str, Any]] = None
+    tracking_interval_s: float = 5
+    tracking_kp: float = 0.3
+    tracking_ki: float = 0.05
+    tracking_max_step_w: float = 50
+    grid_sensor: Optional[dict[str, Any]] = None
+    zero_export_interval_s: float = 5
+    zero_export_threshold_w: float = 20
+    grid_target_w: float = 0
+    zero_export_gain: float = 0.7
 
     @classmethod
     def from_yaml(cls, file_path: str):
         with open(file_path, "r", encoding="utf-8") as file:
             config: dict[str, Any] = yaml.safe_load(file) or {}
             
-        raw_panels = config.get("panels", [])
-        if not isinstance(raw_panels, list):
-            raise ValueError("Expected 'panels' to be a list of dictionaries.")
-        
-        typed_raw_panels = cast(list[Any], raw_panels)
-        if not all(isinstance(panel, dict) for panel in typed_raw_panels):
-            raise ValueError("Each item in 'panels' must be a dictionary.")
-
-        panels = cast(list[dict[str, Any]], typed_raw_panels)
+        panels = _parse_panels(config.get("panels", []))
+        latitude = float(config.get("latitude", cls.latitude))
+        longitude = float(config.get("longitude", cls.longitude))
+        power_min = int(config.get("power_min", cls.power_min))
+        power_max = int(config.get("power_max", cls.power_max))
 
         # load optionals
         optional = cast(dict[str, Any], config.get("optional") or {})
-        energy_sensor = optional.get("energy_sensor", None)
-        if energy_sensor is not None:
-            energy_sensor["type"] = MAPPINGS[energy_sensor["type"]]
-        
-        power_sensor = optional.get("power_sensor", None)
-        if power_sensor is not None:
-            power_sensor["type"] = MAPPINGS[power_sensor["type"]]
+        energy_sensor = _parse_sensor(optional.get("energy_sensor", None))
+        power_sensor = _parse_sensor(optional.get("power_sensor", None))
+        grid_sensor = _parse_sensor(optional.get("grid_sensor", None))
+
+        # fleet mode: a list of batteries, each with its own panels, falling back to the global settings
+        raw_batteries = config.get("batteries")
+        if raw_batteries is None:
+            raw_batteries = [{"battery_sn": config.get("battery_sn"), "panels": panels, "optional": optional}]
+        elif any(sensor is not None for sensor in (energy_sensor, power_sensor, grid_sensor)):
+            raise ValueError(
+                "Sensors in the global 'optional' are not used with 'batteries', "
+                "set them in the 'optional' of each battery."
+            )
+        if not isinstance(raw_batteries, list) or not raw_batteries:
+            raise ValueError("Expected 'batteries' to be a non-empty list of dictionaries.")
+
+        batteries: list[BatteryConfig] = []
+        for battery in cast(list[dict[str, Any]], raw_batteries):
+            # sensors measure a single inverter output, so they are configured per battery
+            battery_optional = cast(dict[str, Any], battery.get("optional") or {})
+            battery_panels = _parse_panels(battery.get("panels", panels))
+            if not battery_panels:
+                raise ValueError(f"Battery {battery.get('battery_sn')} has no panels, set 'panels' for it or globally.")
+            batteries.append(BatteryConfig(
+                serial=str(battery["battery_sn"]),
+                panels=battery_panels,
+                latitude=float(battery.get("latitude", latitude)),
+                longitude=float(battery.get("longitude", longitude)),
+                power_min=int(battery.get("power_min", power_min)),
+                power_max=int(battery.get("power_max", power_max)),
+                energy_sensor=_parse_sensor(battery_optional.get("energy_sensor", None)),
+                power_sensor=_parse_sensor(battery_optional.get("power_sensor", None)),
+                grid_sensor=_parse_sensor(battery_optional.get("grid_sensor", None)),
+            ))
+
+        runtime = str(config.get("runtime", cls.runtime))
+        if runtime not in ("thread", "asyncio"):
+            raise ValueError("Expected 'runtime' to be either 'thread' or 'asyncio'.")
+
+        planner = str(config.get("planner", cls.planner))
+        if planner not in ("heuristic", "optimal"):
+            raise ValueError("Expected 'planner' to be either 'heuristic' or 'optimal'.")
 
         return cls(
             panels=panels,
-            battery_sn=str(config.get("battery_sn")),
-            power_min=int(config.get("power_min", cls.power_min)),
-            power_max=int(config.get("power_max", cls.power_max)),
-            latitude=float(config.get("latitude", cls.latitude)),
-            longitude=float(config.get("longitude", cls.longitude)),
+            battery_sn=batteries[0].serial,
+            batteries=batteries,
+            power_min=power_min,
+            power_max=power_max,
+            power_deadband_w=float(config.get("power_deadband_w", cls.power_deadband_w)),
+            latitude=latitude,
+            longitude=longitude,
             timezone=str(config.get("timezone", cls.timezone)),
+            weather_cache_dir=config.get("weather_cache_dir", cls.weather_cache_dir),
+            forecast_horizon_h=int(config.get("forecast_horizon_h", cls.forecast_horizon_h)),
+            forecast_resolution_min=int(config.get("forecast_resolution_min", cls.forecast_resolution_min)),
             mqtt_host=str(config.get("host", cls.mqtt_host)),
             mqtt_port=int(config.get("port", cls.mqtt_port)),
+            runtime=runtime,
+            planner=planner,
             update_interval_s=int(config.get("update_interval_s", cls.update_interval_s)), 
+            event_driven=bool(config.get("event_driven", cls.event_driven)),
+            trigger_threshold_w=float(config.get("trigger_threshold_w", cls.trigger_threshold_w)),
+            min_update_interval_s=int(config.get("min_update_interval_s", cls.min_update_interval_s)),
             ha_autodiscovery=bool(config.get("ha_autodiscovery", cls.ha_autodiscovery)),
             energy_sensor=energy_sensor,
-            power_sensor=power_sensor
+            power_sensor=power_sensor,
+            tracking_interval_s=float(config.get("tracking_interval_s", cls.tracking_interval_s)),
+            tracking_kp=float(config.get("tracking_kp", cls.tracking_kp)),
+            tracking_ki=float(config.get("tracking_ki", cls.tracking_ki)),
+            tracking_max_step_w=float(config.get("tracking_max_step_w", cls.tracking_max_step_w)),
+            grid_sensor=grid_sensor,
+            zero_export_interval_s=float(config.get("zero_export_interval_s", cls.zero_export_interval_s)),
+            zero_export_threshold_w=float(config.get("zero_export_threshold_w", cls.zero_export_threshold_w)),
+            grid_target_w=float(config.get("grid_target_w", cls.grid_target_w)),
+            zero_export_gain=float(config.get("zero_export_gain", cls.zero_export_gain)),
         )
\ No newline at end of file
@@ -1,5 +1,9 @@
 from ctrlsolar.controller.energy import EnergyController
+from ctrlsolar.controller.tracking import PowerTracker
+from ctrlsolar.controller.zeroexport import ZeroExportController
 
 __all__ = [
     "EnergyController",
+    "PowerTracker",
+    "ZeroExportController",
 ]
\ No newline at end of file
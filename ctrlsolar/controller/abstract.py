@@ -1,4 +1,6 @@
 from abc import ABC, abstractmethod
+from ctrlsolar.clock import TickContext
+from typing import Optional
 
 class Controller(ABC):
     name: str 
@@ -7,5 +9,15 @@ class Controller(ABC):
         pass
 
     @abstractmethod
-    def update(self) -> None:
-        return
\ No newline at end of file
+    def update(self, context: Optional[TickContext] = None) -> None:
+        """Run one control step at the time of `context`, or of the global clock if not given."""
+        return
+
+
+class OutputController(Controller):
+    """Fast loop that owns the output power setpoint of a battery between planner updates."""
+
+    @abstractmethod
+    def set_target(self, target_W: float) -> None:
+        """Output power in [W] planned for the current slot."""
+        return
@@ -1,10 +1,11 @@
-from datetime import datetime
 from ctrlsolar.panels.abstract import Weather, Panel
-from ctrlsolar.battery.abstract import DCCoupledBattery
-from ctrlsolar.controller.abstract import Controller
-from ctrlsolar.controller.forecast import EnergyForecast
+from ctrlsolar.battery.abstract import BatterySnapshot, DCCoupledBattery
+from ctrlsolar.controller.abstract import Controller, OutputController
+from ctrlsolar.controller.forecast import EnergyForecast, ForecastCache
 from ctrlsolar.controller.monitor import EnergyMonitor
-from ctrlsolar.localization import get_timezone
+from ctrlsolar.controller.planner import DayPlanner, Plan
+from ctrlsolar.controller.schedule import Schedule
+from ctrlsolar.clock import TickContext, get_clock
 from ctrlsolar.mqtt.mqtt import get_mqtt
 from ctrlsolar.mqtt.abstract import Sensor
 from ctrlsolar.mqtt.topics import TOPICS
@@ -25,14 +26,19 @@ class EnergyController(Controller):
         panels: Panel,
         p_min: float,
         p_max: float = 800,
-        energy_sensor: Optional[Type[Sensor]] = None
+        energy_sensor: Optional[Type[Sensor]] = None,
+        forecast_cache: Optional[ForecastCache] = None,
+        tracker: Optional[OutputController] = None,
+        planner: Optional[DayPlanner] = None,
     ):
         self._battery = battery
         self._deviceid = battery.serial_number
+        self.name = f"{self.name} ({self._deviceid})"
         self._forecast = EnergyForecast(
             weather=weather,
             panels=panels,
-            device_id=self._battery.serial_number
+            device_id=self._battery.serial_number,
+            cache=forecast_cache,
         )
         self._monitor = EnergyMonitor(
             battery=battery, 
@@ -40,9 +46,11 @@ class EnergyController(Controller):
         )
         self._p_min = p_min
         self._p_max = p_max
+        self._tracker = tracker
+        self._planner = planner
+        self._plan: Plan | None = None
 
-        self._battery_hours = []
-        self._production_hours = []
+        self._schedule: Schedule | None = None
 
         return
     
@@ -53,43 +61,62 @@ class EnergyController(Controller):
         )
         return
 
-    def evaluate_day_schedule(self) -> None:
-        energy = self._forecast.hourly_production_estimates()
-        prod_start = [x > self._p_min for x in energy].index(True)
-        prod_end = 24 - [x < self._p_min for x in energy[::-1]].index(False)
+    def evaluate_day_schedule(self) -> Schedule:
+        """Split the forecast horizon into production and battery slots.
 
-        self._production_hours = [*range(prod_start, prod_end)]
-        self._battery_hours = [h for h in range(24) if h not in self._production_hours]
+        Slots are counted from 00:00 today, so the battery phase after sunset
+        extends into the next day until its production period starts. The
+        schedule is only rebuilt when the forecast or its first day changes,
+        then only for the days whose forecast changed.
+        """
+        series = self._forecast.production_series()
+        key = (self._forecast.cache.key, self._p_min)
+        first_day = series.times[0].astype("datetime64[D]").item()
+        if self._schedule is None or not self._schedule.matches(key, first_day):
+            self._schedule = Schedule.build(series, self._p_min, key, previous=self._schedule)
 
-        return
+        return self._schedule
+
+    @property
+    def schedule(self) -> Schedule:
+        return self.evaluate_day_schedule() if self._schedule is None else self._schedule
+
+    def is_production_slot(self, slot: int) -> bool:
+        return self.schedule.is_production_slot(slot)
+
+    def is_battery_slot(self, slot: int) -> bool:
+        return self.schedule.is_battery_slot(slot)
+
+    def hours_until_production(self, slot: int) -> float:
+        """Battery hours from `slot` until the next production period, or the end of the forecast."""
+        return self.schedule.hours_until_production(slot)
 
-    def evaluate_production_power_target(self) -> int | None:
-        if any_is_none(self._battery.panel_power, self._battery.energy_missing):
+    def evaluate_production_power_target(self, slot: int, state: Optional[BatterySnapshot] = None) -> int | None:
+        state = state if state is not None else self._battery.snapshot()
+        if any_is_none(state.panel_power, state.energy_missing):
             logger.warning("Found `None` in sensors. Skipping update!")
             return
         
-        panel_power = cast(float, self._battery.panel_power)
-        missing_Wh = cast(float, self._battery.energy_missing)
+        panel_power = cast(float, state.panel_power)
+        missing_Wh = cast(float, state.energy_missing)
         target_W = None
 
-        prod_remaining_h = self._forecast.remaining_production_hours_today(
-            cutoff_energy_kWh=self._p_min * 1
-        )  # *1h
-        if prod_remaining_h == 0:
-            prod_remaining_h = 1
-        if prod_remaining_h < 0:
-            logger.info("Production has already seized. Skipping.")
-            return 
+        prod_remaining_slots = self._forecast.remaining_production_slots(
+            slot, cutoff_power_W=self._p_min
+        )
+        if prod_remaining_slots == 0:
+            prod_remaining_slots = 1
+        prod_remaining_h = prod_remaining_slots * self.schedule.slot_hours
 
-        prod_remaining_Wh = self._forecast.remaining_energy_production_today(
-            remaining_hours=prod_remaining_h
+        prod_remaining_Wh = self._forecast.remaining_energy_production(
+            slot, n_slots=prod_remaining_slots
         )
-        next_hour_expected_Wh = self._forecast.next_hour_production_estimate()
+        current_slot_expected_W = self._forecast.slot_power_estimate(slot)
 
         target_W = min(
             (prod_remaining_Wh - missing_Wh) / prod_remaining_h,    # required to ensure batteryies are full
             self._p_max,                                            # the max allowed
-            next_hour_expected_Wh / 1,  # /1h                       # the average of the current hour
+            current_slot_expected_W,                                # the average of the current slot
             panel_power                                             # the maximum available
         )
 
@@ -97,50 +124,102 @@ class EnergyController(Controller):
 
         return target_W
 
-    def evaluate_battery_power_target(self) -> int | None:
-        if any_is_none(self._battery.energy_charged, self._battery.discharge_limit):
+    def evaluate_battery_power_target(self, slot: int, state: Optional[BatterySnapshot] = None) -> int | None:
+        state = state if state is not None else self._battery.snapshot()
+        if any_is_none(state.energy_charged, state.discharge_limit):
             logger.warning("Found `None` in sensors. Skipping update!")
             return 
         
-        energy_charged = cast(float, self._battery.energy_charged)
-        discharge_limit = cast(float, self._battery.discharge_limit)
+        energy_charged = cast(float, state.energy_charged)
+        discharge_limit = cast(float, state.discharge_limit)
 
         charge = (
             energy_charged
-            - discharge_limit * self._battery.capacity
+            - discharge_limit * state.capacity
         )
         
-        target_W = charge / len(self._battery_hours)
+        battery_hours = self.hours_until_production(slot)
+        target_W = charge / battery_hours
         logger.info(
-            f"Maxmimum sustainable discharge power until next production period is {target_W:.2f} W."
+            f"Maxmimum sustainable discharge power for {battery_hours:.2f} h until next production period is {target_W:.2f} W."
         )
         
-        target_W = max(target_W, self._p_min)
+        target_W = min(max(target_W, self._p_min), self._p_max)
         logger.info(f"Evaluated power result is {target_W:.2f} W.")
         target_W = int((target_W // 10) * 10)
 
         return target_W
     
-    def _update_subs(self):
-        self._forecast.update()
-        self._monitor.update()
+    def evaluate_planned_power_target(self, slot: int, state: Optional[BatterySnapshot] = None) -> int | None:
+        planner = cast(DayPlanner, self._planner)
+        state = state if state is not None else self._battery.snapshot()
+        if any_is_none(state.energy_charged, state.discharge_limit):
+            logger.warning("Found `None` in sensors. Skipping update!")
+            return
+
+        # a missing charge limit is reported as 0
+        charge_limit = state.charge_limit or 1.0
+        series = self._forecast.production_series()
+        plan = planner.plan(
+            production=series.energy[slot:],
+            slot_hours=series.slot_hours,
+            energy=cast(float, state.energy_charged),
+            capacity=state.capacity,
+            charge_limit=charge_limit,
+            discharge_limit=cast(float, state.discharge_limit),
+            production_slots=self.schedule.production[slot:],
+        )
+        self._plan = plan
+        if plan.full_at is not None:
+            logger.info(
+                f"Planned {plan.target:.2f} W, battery full in {plan.full_at * self.schedule.slot_hours:.2f} h."
+            )
+        else:
+            logger.info(f"Planned {plan.target:.2f} W, no production period within the forecast.")
+
+        return int((plan.target // 10) * 10)
+
+    @property
+    def plan(self) -> Plan | None:
+        return self._plan
+
+    def _update_subs(self, context: TickContext, state: BatterySnapshot):
+        self._forecast.update(context)
+        self._monitor.update(context, state)
         return 
 
-    def update(self):
-        hour = datetime.now(get_timezone()).hour
-        self.evaluate_day_schedule()
+    def update(self, context: Optional[TickContext] = None):
+        context = context if context is not None else get_clock().tick()
+        now = context.now
+        # the forecast is read once, every estimate of this update uses the same series
+        series = self._forecast.production_series(context)
+        schedule = self.evaluate_day_schedule()
+        slot = series.slot(now)
+        context = context.with_slot(slot)
+        # all battery values of this update come from the same state message
+        state = self._battery.snapshot()
+        age = state.age()
+        if age is not None:
+            logger.debug(f"Battery state received {age:.1f} s ago.")
+        in_horizon = 0 <= slot < len(schedule)
+
+        if in_horizon and self._planner is not None:
+            logger.info(
+                f"Slot {slot} ({now:%H:%M}), which is {'battery' if self.is_battery_slot(slot) else 'production'} mode."
+            )
+            target_W = self.evaluate_planned_power_target(slot, state)
 
-        if hour in self._battery_hours:
+        elif in_horizon and self.is_battery_slot(slot):
             logger.info(
-                f"Hour {hour}/24, which is battery mode."
+                f"Slot {slot} ({now:%H:%M}), which is battery mode."
             )
-            target_W = self.evaluate_battery_power_target()
+            target_W = self.evaluate_battery_power_target(slot, state)
 
-        elif hour in self._production_hours:
+        elif in_horizon and self.is_production_slot(slot):
             logger.info(
-                f"Hour {hour}/24, which is production mode."
+                f"Slot {slot} ({now:%H:%M}), which is production mode."
             )
-            target_W = self.evaluate_production_power_target()
+            target_W = self.evaluate_production_power_target(slot, state)
 
         else:
             logger.warning(
@@ -148,15 +227,25 @@ class EnergyController(Controller):
             )
             target_W = self._fallback
 
-        if self._battery.online:
+        if state.online:
             if target_W is not None:
                 target_W = int(max(target_W, self._p_min))
                 logger.info(f"Power-target is evaluated to {target_W:.2f} W. Updated maximum power to {target_W} W.")
-                print(target_W)
-                self._battery.output_power = target_W
+                if self._tracker is not None:
+                    # the inner loop owns the setpoint, the plan is its target
+                    self._tracker.set_target(target_W)
+                else:
+                    self._battery.output_power = target_W
                 self.publish_set_power(target_W)
+
+            status = self._battery.output_power_status
+            if status.depth > 0:
+                logger.info(
+                    f"Setpoint {status.confirmed} W confirmed, {status.in_flight} W in flight, "
+                    f"{status.pending} W pending ({status.coalesced} coalesced so far)."
+                )
         else:
             logger.info(f"Battery is offline! Skipping update.")
 
-        self._update_subs()
+        self._update_subs(context, state)
         return
@@ -1,12 +1,107 @@
-from ctrlsolar.panels.abstract import Weather, Panel
+from ctrlsolar.panels.abstract import Weather, Panel, ProductionSeries
+from ctrlsolar.panels.panels import PanelGroup, predicted_production_batch
 from ctrlsolar.controller.abstract import Controller
-from ctrlsolar.localization import get_timezone
+from ctrlsolar.clock import TickContext, get_clock
 from ctrlsolar.mqtt.mqtt import get_mqtt
 from ctrlsolar.mqtt.topics import (
     HOURLY_FORECAST_ATTRIBUTES_TOPIC_TEMPLATE,
     HOURLY_FORECAST_STATE_TOPIC_TEMPLATE,
 )
-from datetime import datetime
+from datetime import datetime, timedelta
+from typing import Optional, cast
+import numpy as np
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class ForecastCache:
+    """Memoizes the production forecast of a panel setup.
+
+    The estimate is only recomputed when the weather forecast is refreshed
+    (`Weather.version`) or the panel configuration (`Panel.config_key`) changes.
+    """
+
+    def __init__(self, weather: Weather, panels: Panel, batch: Optional["ForecastBatch"] = None):
+        self._weather = weather
+        self._panels = panels
+        self._batch = batch
+        self._key: tuple[object, ...] | None = None
+        self._series: ProductionSeries | None = None
+        self.hits: int = 0
+        self.misses: int = 0
+
+    @property
+    def key(self) -> tuple[object, ...] | None:
+        return self._key
+
+    def get(self) -> ProductionSeries:
+        _ = self._weather.get()     # triggers a refresh of the weather data if expired
+        key = (self._weather.version, self._panels.config_key)
+        if key == self._key and self._series is not None:
+            self.hits += 1
+            return self._series
+
+        self.misses += 1
+        logger.debug(f"Forecast cache miss for weather version {self._weather.version}. Recomputing.")
+        if self._batch is not None:
+            self._batch.refresh()
+            if key == self._key and self._series is not None:
+                return self._series
+
+        self._store(key, self._panels.predicted_production(self._weather))
+        return cast(ProductionSeries, self._series)
+
+    def _store(self, key: tuple[object, ...], series: ProductionSeries) -> None:
+        series.energy.flags.writeable = False
+        self._series = series
+        self._key = key
+        return
+
+    def _is_stale(self) -> bool:
+        return (self._weather.version, self._panels.config_key) != self._key
+
+    def invalidate(self) -> None:
+        self._key = None
+        return
+
+
+class ForecastBatch:
+    """Production forecasts of several devices sharing one weather forecast.
+
+    When one member misses, all stale members are recomputed in a single pass
+    over the union of their panel orientations.
+    """
+
+    def __init__(self, weather: Weather):
+        self._weather = weather
+        self._members: list[ForecastCache] = []
+        self._lock = threading.Lock()
+
+    def add(self, panels: Panel) -> ForecastCache:
+        cache = ForecastCache(weather=self._weather, panels=panels, batch=self)
+        self._members.append(cache)
+        return cache
+
+    def refresh(self) -> None:
+        with self._lock:
+            _ = self._weather.get()
+            stale = [cache for cache in self._members if cache._is_stale()]
+            if not stale:
+                return
+
+            key = self._weather.version
+            groups = [
+                cache._panels if isinstance(cache._panels, PanelGroup) else PanelGroup([cache._panels])
+                for cache in stale
+            ]
+            for cache, series in zip(stale, predicted_production_batch(groups, self._weather)):
+                cache._store((key, cache._panels.config_key), series)
+
+            logger.debug(f"Recomputed {len(stale)} forecasts for weather version {key} in one batch.")
+        return
+
 
 class EnergyForecast(Controller):
     def __init__(
@@ -14,42 +109,88 @@ class EnergyForecast(Controller):
         weather: Weather,
         panels: Panel,
         device_id: str,
+        cache: Optional[ForecastCache] = None,
     ):
+        """Production estimates of a panel setup.
+
+        Within a tick, all estimates come from one production series, fetched by the
+        first call of `production_series` with the tick's context. Until the next tick,
+        calls without a context keep using it.
+        """
         self._weather = weather
         self._panels = panels
         self._device_id = device_id
+        self._cache = cache if cache is not None else ForecastCache(weather=weather, panels=panels)
+        self._tick: Optional[tuple[datetime, ProductionSeries]] = None
+
+    @property
+    def cache(self) -> ForecastCache:
+        return self._cache
+
+    def production_series(self, context: Optional[TickContext] = None) -> ProductionSeries:
+        """Estimates for the whole forecast horizon, per forecast slot."""
+        if self._tick is not None and (context is None or context.now == self._tick[0]):
+            return self._tick[1]
+
+        series = self._cache.get()
+        if context is not None:
+            self._tick = (context.now, series)
+        return series
+
+    def current_slot(self, context: Optional[TickContext] = None) -> int:
+        if context is not None and context.slot is not None:
+            return context.slot
+        now = context.now if context is not None else get_clock().now()
+        return self.production_series(context).slot(now)
 
     def hourly_production_estimates(self) -> list[float,]:
-        return list(self._panels.predicted_production_by_hour(self._weather).values())
+        """Estimates for the whole forecast horizon, indexed by hours since 00:00 of the first forecast day."""
+        return self.production_series().hourly().tolist()
 
-    def next_hour_production_estimate(self) -> float:
-        hour = datetime.now(get_timezone()).hour
-        return self._panels.predicted_production_by_hour(self._weather)[hour]
+    def today_production_estimates(self) -> list[float,]:
+        return self.hourly_production_estimates()[:24]
+
+    def remaining_today(self, context: TickContext) -> dict[int, float]:
+        """Expected energy in [Wh] per hour of the day, from the slot of `context.now` until midnight.
+
+        Right after midnight the forecast may still start on the previous day, its slots are left out.
+        """
+        series = self.production_series(context)
+        start = max(series.slot(context.now), 0)
+        end = max(series.slot(datetime.combine(context.date + timedelta(days=1), datetime.min.time())), start)
+        hours = series.times[start:end].astype("datetime64[h]").astype(np.int64) % 24
+        energy: dict[int, float] = {}
+        for hour, value in zip(hours.tolist(), series.energy[start:end].tolist()):
+            energy[hour] = energy.get(hour, 0.0) + value
+        return energy
+
+    def slot_power_estimate(self, slot: int) -> float:
+        """Average power in [W] expected during `slot`."""
+        return float(self.production_series().power[slot])
 
     def daily_production_estimate(self) -> float:
-        p_dcs = sum(self.hourly_production_estimates())
+        p_dcs = sum(self.today_production_estimates())
         return p_dcs
 
-    def remaining_energy_production_today(self, remaining_hours: int) -> float:
-        hour = datetime.now(get_timezone()).hour
-        energy = sum(self.hourly_production_estimates()[hour : hour + remaining_hours])
-        return energy
+    def remaining_energy_production(self, slot: int, n_slots: int) -> float:
+        energy = self.production_series().energy[slot : slot + n_slots]
+        return float(energy.sum())
 
-    def remaining_production_hours_today(self, cutoff_energy_kWh: float) -> int:
-        hour = datetime.now(get_timezone()).hour
-        energy = self.hourly_production_estimates()[hour:]
-        index = [x < cutoff_energy_kWh for x in energy].index(True)
-        return index
+    def remaining_production_slots(self, slot: int, cutoff_power_W: float) -> int:
+        """Number of slots from `slot` on until the expected power drops below `cutoff_power_W`."""
+        power = self.production_series().power[slot:]
+        below = np.flatnonzero(power < cutoff_power_W)
+        return int(below[0]) if below.size > 0 else len(power)
 
-    def _publish(self):
+    def _publish(self, context: TickContext):
         mqtt = get_mqtt()
         energy = {
             hour: round(value, 2)
-            for hour, value in enumerate(self.hourly_production_estimates())
+            for hour, value in self.remaining_today(context).items()
         }
         mqtt.publish(
             HOURLY_FORECAST_STATE_TOPIC_TEMPLATE.format(device_id=self._device_id),
-            datetime.now(get_timezone()).date().isoformat(),
+            context.date.isoformat(),
         )
         mqtt.publish(
             HOURLY_FORECAST_ATTRIBUTES_TOPIC_TEMPLATE.format(device_id=self._device_id),
@@ -57,7 +198,9 @@ class EnergyForecast(Controller):
         )
         return
     
-    def update(self):
-        _ = self.hourly_production_estimates()
-        self._publish()
-        return
\ No newline at end of file
+    def update(self, context: Optional[TickContext] = None):
+        context = context if context is not None else get_clock().tick()
+        _ = self.production_series(context)
+        self._publish(context)
+        logger.debug(f"Forecast cache: {self._cache.hits} hits, {self._cache.misses} misses.")
+        return
@@ -1,10 +1,9 @@
-from ctrlsolar.battery.abstract import DCCoupledBattery
+from ctrlsolar.battery.abstract import BatterySnapshot, DCCoupledBattery
 from ctrlsolar.controller.abstract import Controller
 from ctrlsolar.mqtt.abstract import Sensor
 from ctrlsolar.mqtt.mqtt import get_mqtt
-from ctrlsolar.localization import get_timezone
+from ctrlsolar.clock import TickContext, get_clock
 from ctrlsolar.utils import any_is_none
-from datetime import datetime
 from typing import Optional, Type, cast
 import logging
 from ctrlsolar.mqtt.topics import (
@@ -25,13 +24,13 @@ class EnergyMonitor(Controller):
         self._previous_ac_energy = None
         self._previous_solar_energy = None
         self._hour: int = 0
-        self._day = datetime.now(get_timezone()).day
+        self._day = get_clock().now().day
         self._ac_energy_tracker = dict(zip(range(24), 24 * [0.0]))
         self._solar_energy_tracker = dict(zip(range(24), 24 * [0.0]))
 
-    def _reset_energy_tracker(self):
-        day = datetime.now(get_timezone()).day
-        hour = datetime.now(get_timezone()).hour
+    def _reset_energy_tracker(self, context: TickContext, energy_out: float | None):
+        day = context.now.day
+        hour = context.hour
         if day != self._day:
             self._ac_energy_tracker = dict(zip(range(24), 24 * [0.0]))
             self._solar_energy_tracker = dict(zip(range(24), 24 * [0.0]))
@@ -44,7 +43,7 @@ class EnergyMonitor(Controller):
 
         if self._previous_ac_energy is None:
             # only called at init
-            self._previous_solar_energy = self._solar_energy.energy_out
+            self._previous_solar_energy = energy_out
 
         if self._ac_energy is not None:
             if self._previous_ac_energy is None:
@@ -52,17 +51,18 @@ class EnergyMonitor(Controller):
 
         return
 
-    def update(self):
-        self._reset_energy_tracker()
-        # TODO: Make a better abstraction for the sensor property
-        if any_is_none(self._solar_energy.energy_out, self._previous_solar_energy):  # type: ignore
+    def update(self, context: Optional[TickContext] = None, state: Optional[BatterySnapshot] = None):
+        context = context if context is not None else get_clock().tick()
+        state = state if state is not None else self._solar_energy.snapshot()
+        self._reset_energy_tracker(context, state.energy_out)
+        if any_is_none(state.energy_out, self._previous_solar_energy):
             logger.warning("Skipping update!")
             return
 
-        solar_energy = self._solar_energy.energy_out
+        solar_energy = cast(float, state.energy_out)
         previous_solar_energy = cast(float, self._previous_solar_energy)
 
-        hour = datetime.now(get_timezone()).hour
+        hour = context.hour
         delta = solar_energy - previous_solar_energy
 
         if delta < 0:
@@ -82,7 +82,7 @@ class EnergyMonitor(Controller):
             prod_energy = cast(float, self._ac_energy.value)
             previous_ac_energy = cast(float, self._previous_ac_energy)
 
-            hour = datetime.now(get_timezone()).hour
+            hour = context.hour
             delta = prod_energy - previous_ac_energy
 
             if delta < 0:
@@ -94,14 +94,14 @@ class EnergyMonitor(Controller):
                 self._ac_energy_tracker[hour] += delta
                 self._previous_ac_energy = prod_energy
 
-        self._publish()
+        self._publish(context)
         return
 
-    def _publish(self):
+    def _publish(self, context: TickContext):
         mqtt = get_mqtt()
         mqtt.publish(
             HOURLY_SOLAR_PRODUCTION_STATE_TOPIC_TEMPLATE.format(device_id=self._deviceid),
-            datetime.now(get_timezone()).date().isoformat(),
+            context.date.isoformat(),
         )
         mqtt.publish(
             HOURLY_SOLAR_PRODUCTION_ATTRIBUTES_TOPIC_TEMPLATE.format(
@@ -113,7 +113,7 @@ class EnergyMonitor(Controller):
         if self._ac_energy is not None:
             mqtt.publish(
                 HOURLY_AC_PRODUCTION_STATE_TOPIC_TEMPLATE.format(device_id=self._deviceid),
-                datetime.now(get_timezone()).date().isoformat(),
+                context.date.isoformat(),
             )
             mqtt.publish(
                 HOURLY_AC_PRODUCTION_ATTRIBUTES_TOPIC_TEMPLATE.format(
@@ -0,0 +1,141 @@
+from dataclasses import dataclass
+from typing import Optional
+import numpy as np
+import logging
+
+logger = logging.getLogger(__name__)
+
+__all__ = ["Plan", "DayPlanner", "taut_string"]
+
+
+def taut_string(lower: np.ndarray, upper: np.ndarray) -> np.ndarray:
+    """Shortest path from (0, 0) to (n, end) that stays within `lower` and `upper`.
+
+    `lower` and `upper` are the bounds at the points 0..n, with `lower[0] <= 0 <= upper[0]`
+    and `lower[n] == upper[n] == end`. The path minimizes the sum of any strictly convex
+    function of its increments, e.g. the sum of squares.
+
+    Returns:
+        np.ndarray: Value of the path at the points 0..n.
+    """
+    n = len(lower) - 1
+    path = np.empty(n + 1, dtype=float)
+    path[0] = 0.0
+    start, value = 0, 0.0
+    while start < n:
+        steps = np.arange(1, n - start + 1, dtype=float)
+        slope_lo = np.maximum.accumulate((lower[start + 1 :] - value) / steps)
+        slope_hi = np.minimum.accumulate((upper[start + 1 :] - value) / steps)
+        conflict = np.flatnonzero(slope_lo > slope_hi + 1e-9)
+        if conflict.size == 0:
+            # straight to the end point
+            path[start + 1 :] = value + steps * slope_hi[-1]
+            break
+
+        jj = int(conflict[0])
+        if slope_lo[jj] > slope_lo[jj - 1]:
+            # a lower bound rose above the steepest line under the upper bounds, bend at the upper bound
+            k = int(np.flatnonzero(slope_hi[:jj] == slope_hi[jj - 1])[0])
+            slope = slope_hi[jj - 1]
+        else:
+            k = int(np.flatnonzero(slope_lo[:jj] == slope_lo[jj - 1])[0])
+            slope = slope_lo[jj - 1]
+
+        path[start + 1 : start + k + 2] = value + steps[: k + 1] * slope
+        start, value = start + k + 1, path[start + k + 1]
+
+    return path
+
+
+@dataclass(frozen=True)
+class Plan:
+    power: np.ndarray       # output setpoint in [W] per slot, starting at the current slot
+    energy: np.ndarray      # expected battery energy in [Wh] at the start of every slot and after the last
+    full_at: Optional[int]  # slot offset at the end of the next production period
+
+    @property
+    def target(self) -> float:
+        return float(self.power[0]) if self.power.size > 0 else float("nan")
+
+
+class DayPlanner:
+    def __init__(self, p_min: float, p_max: float):
+        """Plans the output power over the forecast horizon.
+
+        The battery energy is a tube between the discharge and the charge limit.
+        Every production period has to end with a full battery and no solar energy
+        may be lost to a full battery before. Within these bounds, the cumulative
+        output is the taut string through the tube: the flattest possible output,
+        which maximizes the self-consumption of a constant household load of any
+        size. With a `load` profile, the output follows the load as close as possible.
+
+        Solved in O(n) numpy passes per bend of the string, well below a millisecond
+        for 24-192 slots. The power limits are applied to the string afterwards.
+
+        Args:
+            p_min (float): Minimum output power in [W].
+            p_max (float): Maximum output power in [W].
+        """
+        self.p_min = p_min
+        self.p_max = p_max
+
+    def plan(
+        self,
+        production: np.ndarray,
+        slot_hours: float,
+        energy: float,
+        capacity: float,
+        charge_limit: float = 1.0,
+        discharge_limit: float = 0.0,
+        production_slots: Optional[np.ndarray] = None,
+        load: Optional[np.ndarray] = None,
+    ) -> Plan:
+        """Plan from the current slot on.
+
+        Args:
+            production (np.ndarray): Expected solar energy in [Wh] per slot, starting at the current slot.
+            slot_hours (float): Length of a slot in [h].
+            energy (float): Energy stored in the battery now in [Wh].
+            capacity (float): Battery capacity in [Wh].
+            charge_limit (float): Maximum state of charge, 0-1.
+            discharge_limit (float): Minimum state of charge, 0-1.
+            production_slots (Optional[np.ndarray]): Slots of the production periods, by default
+                all slots with more than `p_min` expected.
+            load (Optional[np.ndarray]): Expected household load in [W] per slot.
+        """
+        n = len(production)
+        e_max = charge_limit * capacity
+        e_min = discharge_limit * capacity
+        if production_slots is None:
+            production_slots = production / slot_hours > self.p_min
+        load_Wh = np.zeros(n, dtype=float) if load is None else np.asarray(load, dtype=float)[:n] * slot_hours
+
+        # cumulative output C, the battery holds energy + solar - C
+        solar = np.concatenate(([0.0], np.cumsum(production, dtype=float)))
+        lower = energy + solar - e_max
+        upper = energy + solar - e_min
+
+        # the battery is full at the end of every production period
+        ends = np.flatnonzero(production_slots[:-1] & ~production_slots[1:]) + 1
+        if production_slots.size > 0 and production_slots[-1]:
+            ends = np.append(ends, n)
+        upper[ends] = lower[ends]
+        end = int(ends[-1]) if ends.size > 0 else n
+        full_at = int(ends[0]) if ends.size > 0 else None
+
+        # the output never decreases the cumulative sum, stay feasible if the battery cannot get full
+        lower, upper = lower[: end + 1], upper[: end + 1]
+        upper = np.maximum(np.minimum.accumulate(upper[::-1])[::-1], 0.0)
+        lower = np.minimum(np.maximum.accumulate(lower), upper)
+        lower[0] = min(lower[0], 0.0)
+        lower[-1] = upper[-1]
+
+        # follow the load: the string runs through the tube shifted by the cumulative load
+        shift = np.concatenate(([0.0], np.cumsum(load_Wh[:end])))
+        path = taut_string(lower - shift, upper - shift) + shift
+
+        power = np.clip(np.diff(path) / slot_hours, self.p_min, self.p_max)
+        output = np.concatenate(([0.0], np.cumsum(power * slot_hours)))
+        stored = np.clip(energy + solar[: end + 1] - output, e_min, e_max)
+
+        return Plan(power=power, energy=stored, full_at=full_at)
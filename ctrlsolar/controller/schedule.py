@@ -0,0 +1,117 @@
+from dataclasses import dataclass
+from datetime import date
+from typing import Optional
+from ctrlsolar.panels.abstract import ProductionSeries
+import numpy as np
+import logging
+
+logger = logging.getLogger(__name__)
+
+__all__ = ["Schedule"]
+
+
+@dataclass(frozen=True)
+class Schedule:
+    """Production and battery slots of a forecast, with constant time lookups.
+
+    Tagged with the forecast it was built from, so the controller only rebuilds
+    it when the forecast or the day changes.
+    """
+    key: tuple[object, ...]     # forecast cache key and power threshold
+    date: date                  # first day of the forecast
+    production: np.ndarray      # True for slots of a production period
+    until_production: np.ndarray  # slots from a slot until the next production period, or the end
+    slot_hours: float
+    days: np.ndarray            # forecast power per day and slot, padded with -inf
+    periods: np.ndarray         # production slots per day and slot
+    p_min: float
+
+    def __len__(self) -> int:
+        return len(self.production)
+
+    def is_production_slot(self, slot: int) -> bool:
+        return bool(self.production[slot])
+
+    def is_battery_slot(self, slot: int) -> bool:
+        return not self.production[slot]
+
+    def hours_until_production(self, slot: int) -> float:
+        return float(self.until_production[slot]) * self.slot_hours
+
+    def matches(self, key: tuple[object, ...], first_day: date) -> bool:
+        return self.key == key and self.date == first_day
+
+    @classmethod
+    def build(
+        cls,
+        series: ProductionSeries,
+        p_min: float,
+        key: tuple[object, ...],
+        previous: Optional["Schedule"] = None,
+    ) -> "Schedule":
+        """Split every forecast day into its production period and battery slots.
+
+        A production period starts at the first slot above `p_min` and ends after
+        the last slot at or above it. Days whose forecast is unchanged since
+        `previous`, also after a day rollover, keep their production period.
+        """
+        power = series.power
+        n = len(power)
+        per_day = series.slots_per_day
+        n_days = -(-n // per_day)
+        days = np.full(n_days * per_day, -np.inf)
+        days[:n] = power
+        days = days.reshape(n_days, per_day)
+        first_day = series.times[0].astype("datetime64[D]").item()
+
+        rows = np.zeros((n_days, per_day), dtype=bool)
+        changed = np.ones(n_days, dtype=bool)
+        if previous is not None and previous.p_min == p_min and previous.days.shape[1] == per_day:
+            shift = (first_day - previous.date).days
+            for day in range(n_days):
+                before = day + shift
+                if 0 <= before < len(previous.days) and np.array_equal(days[day], previous.days[before]):
+                    rows[day] = previous.periods[before]
+                    changed[day] = False
+
+        if changed.any():
+            rows[changed] = _production_periods(days[changed], p_min)
+        production = rows.reshape(-1)[:n]
+
+        # index of the first production slot after every slot, n if there is none
+        index = np.where(production, np.arange(n), n)
+        next_production = np.minimum.accumulate(index[::-1])[::-1]
+        following = np.append(next_production[1:], n)
+        slots = np.arange(n)
+        until_production = np.where(following < n, following - slots, np.maximum(n - slots, 1))
+
+        logger.debug(
+            f"Built schedule with {int(production.sum())} production slots out of {n}, "
+            f"{int(changed.sum())} of {n_days} days recomputed."
+        )
+        return cls(
+            key=key,
+            date=first_day,
+            production=production,
+            until_production=until_production,
+            slot_hours=series.slot_hours,
+            days=days,
+            periods=rows,
+            p_min=p_min,
+        )
+
+
+def _production_periods(days: np.ndarray, p_min: float) -> np.ndarray:
+    """Production period of every row of `days`, as a mask of the same shape."""
+    per_day = days.shape[1]
+    above = days > p_min
+    at_least = days >= p_min
+    has_production = above.any(axis=1)
+    start = np.argmax(above, axis=1)
+    end = per_day - np.argmax(at_least[:, ::-1], axis=1)
+    offsets = np.arange(per_day)
+    return (
+        has_production[:, np.newaxis]
+        & (offsets >= start[:, np.newaxis])
+        & (offsets < end[:, np.newaxis])
+    )
@@ -0,0 +1,174 @@
+from ctrlsolar.battery.abstract import DCCoupledBattery
+from ctrlsolar.clock import TickContext
+from ctrlsolar.controller.abstract import OutputController
+from ctrlsolar.mqtt.abstract import Sensor
+from typing import Optional
+import math
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+__all__ = ["PIController", "PowerTracker"]
+
+
+class PIController:
+    def __init__(
+        self,
+        kp: float,
+        ki: float,
+        output_min: float,
+        output_max: float,
+    ):
+        """Proportional-integral controller with clamping anti-windup.
+
+        Args:
+            kp (float): Proportional gain.
+            ki (float): Integral gain in [1/s].
+            output_min (float): Lower limit of the correction.
+            output_max (float): Upper limit of the correction.
+        """
+        self.kp = kp
+        self.ki = ki
+        self.output_min = output_min
+        self.output_max = output_max
+        self.integral = 0.0
+
+    def reset(self) -> None:
+        self.integral = 0.0
+        return
+
+    def step(self, error: float, dt: float, saturated_low: bool = False, saturated_high: bool = False) -> float:
+        """Correction for `error` after `dt` seconds.
+
+        The integral is frozen while the actuator is saturated in the direction of
+        the error, so it does not wind up against a limit it cannot leave.
+        """
+        integral = self.integral + self.ki * error * dt
+        if (error > 0 and saturated_high) or (error < 0 and saturated_low):
+            integral = self.integral
+
+        self.integral = min(max(integral, self.output_min), self.output_max)
+        output = self.kp * error + self.integral
+        return min(max(output, self.output_min), self.output_max)
+
+
+class PowerTracker(OutputController):
+    name: str = "PowerTracker"
+
+    def __init__(
+        self,
+        battery: DCCoupledBattery,
+        power_sensor: Sensor,
+        p_min: float,
+        p_max: float,
+        kp: float = 0.3,
+        ki: float = 0.05,
+        max_correction_W: float = 200,
+        max_step_W: float = 50,
+        max_age_s: float = 30,
+    ):
+        """Fast inner loop that makes the measured AC output follow the planned target.
+
+        The planner (e.g. `EnergyController`) sets the target every few minutes, this
+        loop runs every few seconds and adjusts the battery output setpoint, so that
+        inverter losses and deviations of the battery from its setpoint are corrected.
+
+        Args:
+            battery (DCCoupledBattery): Battery whose output power is controlled.
+            power_sensor (Sensor): Measured AC output power in [W].
+            p_min (float): Minimum output power setpoint in [W].
+            p_max (float): Maximum output power setpoint in [W].
+            kp (float): Proportional gain.
+            ki (float): Integral gain in [1/s].
+            max_correction_W (float): Maximum deviation of the setpoint from the target in [W].
+            max_step_W (float): Maximum change of the setpoint per update in [W].
+            max_age_s (float): Measurements older than this are not used for control.
+        """
+        self._battery = battery
+        self._sensor = power_sensor
+        self.name = f"{self.name} ({battery.serial_number})"
+        self._p_min = p_min
+        self._p_max = p_max
+        self._pi = PIController(kp, ki, output_min=-max_correction_W, output_max=max_correction_W)
+        self._max_step_W = max_step_W
+        self._max_age_s = max_age_s
+        self._lock = threading.Lock()
+        self._target_W: Optional[float] = None
+        self._setpoint_W: Optional[float] = None
+        self._limited: int = 0      # sign of the last setpoint cut by the power or rate limits
+        self._last_update: Optional[float] = None
+
+    @property
+    def target(self) -> Optional[float]:
+        return self._target_W
+
+    @property
+    def setpoint(self) -> Optional[float]:
+        return self._setpoint_W
+
+    def set_target(self, target_W: float) -> None:
+        """Set the AC output power to track, applied immediately."""
+        with self._lock:
+            self._target_W = target_W
+            if self._setpoint_W is None:
+                self._setpoint_W = target_W
+            # keep the learned offset, the proportional part follows on the next update
+            self._apply(target_W + self._pi.integral)
+        return
+
+    def _measured_power(self, window_s: float) -> Optional[float]:
+        age = self._sensor.age
+        if age is None or age > self._max_age_s:
+            return None
+
+        # only numeric readings count, "unavailable" or NaN must not reach the setpoint
+        mean = self._sensor.history.mean(max(window_s, 1.0))
+        if mean is not None:
+            return mean
+        last = self._sensor.history.last
+        return last if last is not None and math.isfinite(last) else None
+
+    def _apply(self, requested_W: float) -> None:
+        setpoint_W = min(max(requested_W, self._p_min), self._p_max)
+        if self._setpoint_W is not None:
+            step = min(max(setpoint_W - self._setpoint_W, -self._max_step_W), self._max_step_W)
+            setpoint_W = self._setpoint_W + step
+
+        self._limited = (requested_W > setpoint_W) - (requested_W < setpoint_W)
+        self._setpoint_W = setpoint_W
+        self._battery.output_power = int(round(setpoint_W))
+        return
+
+    def update(self, context: Optional[TickContext] = None) -> None:
+        now = time.monotonic()
+        dt = now - self._last_update if self._last_update is not None else 0.0
+        self._last_update = now
+
+        with self._lock:
+            if self._target_W is None or self._setpoint_W is None:
+                return
+
+            if not self._battery.online:
+                self._pi.reset()
+                return
+
+            measured_W = self._measured_power(dt)
+            if measured_W is None:
+                logger.debug("No recent AC power measurement, holding setpoint.")
+                return
+
+            error = self._target_W - measured_W
+            correction = self._pi.step(
+                error,
+                dt,
+                saturated_low=self._limited < 0,
+                saturated_high=self._limited > 0,
+            )
+            logger.debug(
+                f"Target {self._target_W:.0f} W, measured {measured_W:.0f} W, correction {correction:.0f} W."
+            )
+            self._apply(self._target_W + correction)
+
+        return
@@ -0,0 +1,106 @@
+from ctrlsolar.mqtt.abstract import Sensor
+from typing import Any, Optional
+import asyncio
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+__all__ = ["ChangeTrigger"]
+
+
+class ChangeTrigger:
+    """Wakes the control loop when watched sensors change significantly.
+
+    Numeric sensors fire when their reading moves by at least `threshold`
+    from the value seen at the last update. Sensors watched without a threshold
+    (e.g. availability) fire on any change. Consecutive updates are at least
+    `min_interval_s` apart.
+    """
+
+    def __init__(self, min_interval_s: float = 30):
+        self.min_interval_s = min_interval_s
+        self._event = threading.Event()
+        self._async_event: asyncio.Event | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._lock = threading.Lock()
+        self._watches: list[tuple[Sensor, Optional[float]]] = []
+        self._references: dict[int, Any] = {}
+        self._last_update = -float("inf")
+        self.reason: str | None = None
+        self.fired: int = 0
+
+    def watch(self, sensor: Sensor, threshold: Optional[float] = None, name: str = "") -> None:
+        key = len(self._watches)
+        self._watches.append((sensor, threshold))
+        self._references[key] = sensor.value
+        label = name or getattr(sensor, "topic", type(sensor).__name__)
+        sensor.add_listener(lambda value: self._on_value(key, label, threshold, value))
+        return
+
+    def _on_value(self, key: int, label: str, threshold: Optional[float], value: Any) -> None:
+        with self._lock:
+            reference = self._references[key]
+            if threshold is None or not isinstance(value, (int, float)) or not isinstance(reference, (int, float)):
+                changed = value != reference
+            else:
+                changed = abs(value - reference) >= threshold
+
+            if changed and not self._event.is_set():
+                self.reason = f"{label}: {reference} -> {value}"
+                self._event.set()
+                if self._loop is not None and self._async_event is not None:
+                    self._loop.call_soon_threadsafe(self._async_event.set)
+
+        return
+
+    def arm(self) -> None:
+        """Mark an update as done: take the current readings as new references."""
+        with self._lock:
+            for key, (sensor, _) in enumerate(self._watches):
+                self._references[key] = sensor.value
+            self._last_update = time.monotonic()
+            self.reason = None
+            self._event.clear()
+            if self._async_event is not None:
+                self._async_event.clear()
+
+        return
+
+    def wait(self, timeout: float) -> bool:
+        """Block until a watched sensor fires or `timeout` passes.
+
+        Returns `True` if the update was triggered by a sensor.
+        """
+        if not self._event.wait(timeout):
+            return False
+
+        holdoff = self._last_update + self.min_interval_s - time.monotonic()
+        if holdoff > 0:
+            time.sleep(holdoff)
+
+        self.fired += 1
+        logger.info(f"Update triggered by sensor change ({self.reason}).")
+        return True
+
+    async def wait_async(self, timeout: float) -> bool:
+        """Awaitable variant of `wait` for the asyncio runtime."""
+        if self._async_event is None:
+            self._loop = asyncio.get_running_loop()
+            self._async_event = asyncio.Event()
+            if self._event.is_set():
+                self._async_event.set()
+
+        try:
+            await asyncio.wait_for(self._async_event.wait(), timeout=timeout)
+        except asyncio.TimeoutError:
+            return False
+
+        holdoff = self._last_update + self.min_interval_s - time.monotonic()
+        if holdoff > 0:
+            await asyncio.sleep(holdoff)
+
+        self.fired += 1
+        logger.info(f"Update triggered by sensor change ({self.reason}).")
+        return True
@@ -0,0 +1,113 @@
+from ctrlsolar.battery.abstract import DCCoupledBattery
+from ctrlsolar.clock import TickContext
+from ctrlsolar.controller.abstract import OutputController
+from ctrlsolar.mqtt.abstract import Sensor
+from typing import Optional
+import math
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+__all__ = ["ZeroExportController"]
+
+
+class ZeroExportController(OutputController):
+    name: str = "ZeroExportController"
+
+    def __init__(
+        self,
+        battery: DCCoupledBattery,
+        grid_sensor: Sensor,
+        p_min: float,
+        p_max: float,
+        grid_target_W: float = 0,
+        gain: float = 0.7,
+        settle_s: float = 2,
+        max_age_s: float = 15,
+    ):
+        """Follows the household consumption to keep the grid exchange near zero.
+
+        The output power is raised while power is imported and lowered while it is
+        exported. The target of the planner (e.g. `EnergyController`) is the upper
+        limit, so the battery still reaches its end-of-day state of charge: in
+        production mode it is the most the battery can give away and still get
+        full, in battery mode it is the sustainable discharge power.
+
+        Args:
+            battery (DCCoupledBattery): Battery whose output power is controlled.
+            grid_sensor (Sensor): Power at the grid meter in [W], positive for import.
+            p_min (float): Minimum output power setpoint in [W].
+            p_max (float): Maximum output power setpoint in [W].
+            grid_target_W (float): Grid power to hold, slightly positive avoids export.
+            gain (float): Fraction of the grid power corrected per update, below 1 to
+                tolerate the delay until the inverter output and meter settle.
+            settle_s (float): Only meter readings taken this long after a setpoint change
+                are used, earlier ones do not show its effect yet.
+            max_age_s (float): Meter readings older than this are not used for control.
+        """
+        self._battery = battery
+        self._sensor = grid_sensor
+        self.name = f"{self.name} ({battery.serial_number})"
+        self._p_min = p_min
+        self._p_max = p_max
+        self.grid_target_W = grid_target_W
+        self.gain = gain
+        self._settle_s = settle_s
+        self._max_age_s = max_age_s
+        self._lock = threading.Lock()
+        self._limit_W: Optional[float] = None
+        self._setpoint_W: Optional[float] = None
+        self._changed_at = -float("inf")
+
+    @property
+    def limit(self) -> Optional[float]:
+        return self._limit_W
+
+    @property
+    def setpoint(self) -> Optional[float]:
+        return self._setpoint_W
+
+    def set_target(self, target_W: float) -> None:
+        """Set the planned output, used as upper limit of the consumption following."""
+        with self._lock:
+            self._limit_W = min(max(target_W, self._p_min), self._p_max)
+            if self._setpoint_W is None or self._setpoint_W > self._limit_W:
+                self._apply(self._limit_W)
+        return
+
+    def _apply(self, setpoint_W: float) -> None:
+        if self._setpoint_W is None or round(setpoint_W) != round(self._setpoint_W):
+            self._changed_at = time.monotonic()
+        self._setpoint_W = setpoint_W
+        self._battery.output_power = int(round(setpoint_W))
+        return
+
+    def update(self, context: Optional[TickContext] = None) -> None:
+        with self._lock:
+            if self._limit_W is None or self._setpoint_W is None:
+                return
+
+            if not self._battery.online:
+                return
+
+            age = self._sensor.age
+            grid_W = self._sensor.value
+            if age is None or age > self._max_age_s or not isinstance(grid_W, (int, float)) or math.isnan(grid_W):
+                logger.debug("No recent grid meter reading, holding setpoint.")
+                return
+
+            measured_at = self._sensor.history.last_timestamp
+            if measured_at is not None and measured_at < self._changed_at + self._settle_s:
+                return
+
+            setpoint_W = self._setpoint_W + self.gain * (grid_W - self.grid_target_W)
+            setpoint_W = min(max(setpoint_W, self._p_min), self._limit_W)
+            logger.debug(
+                f"Grid {grid_W:.0f} W, setpoint {self._setpoint_W:.0f} W -> {setpoint_W:.0f} W "
+                f"(limit {self._limit_W:.0f} W)."
+            )
+            self._apply(setpoint_W)
+
+        return
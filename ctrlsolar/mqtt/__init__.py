@@ -1,7 +1,21 @@
-from ctrlsolar.mqtt.mqtt import Mqtt, MqttConsumer, MqttSensor
+from ctrlsolar.mqtt.mqtt import Mqtt, MqttConsumer, MqttSensor, TopicTrie
+from ctrlsolar.mqtt.outbox import CommandQueue, PublishResult, SetpointStatus
+from ctrlsolar.mqtt.demux import DecodedMessage, Field, FieldSensor, JsonTopicDemux
+from ctrlsolar.mqtt.replay import MqttRecorder, RecordedMessage, ReplayMqtt
 
 __all__ = [
     "Mqtt",
     "MqttConsumer",
     "MqttSensor",
+    "TopicTrie",
+    "CommandQueue",
+    "PublishResult",
+    "SetpointStatus",
+    "DecodedMessage",
+    "Field",
+    "FieldSensor",
+    "JsonTopicDemux",
+    "MqttRecorder",
+    "RecordedMessage",
+    "ReplayMqtt",
 ]
\ No newline at end of file
@@ -1,23 +1,60 @@
 from abc import ABC, abstractmethod
 from collections import deque
-from typing import Any
+from typing import Any, Callable
+from ctrlsolar.mqtt.buffer import RingBuffer
+from ctrlsolar.mqtt.outbox import SetpointStatus
 
 
 class Sensor(ABC):
     def __init__(self, buffer_len: int = 1000):
         self._buffer = deque(buffer_len * [None], maxlen=buffer_len)
+        self._history = RingBuffer(buffer_len)
+        self._last: Any = None
+        self._listeners: list[Callable[[Any], None]] = []
+
+    def _record(self, value: Any) -> None:
+        """Store a new reading. Numeric readings are also kept in the timestamped history."""
+        self._buffer.append(value)
+        self._history.append(value)
+        self._last = value
+        for listener in self._listeners:
+            listener(value)
+        return
+
+    def add_listener(self, callback: Callable[[Any], None]) -> None:
+        """Call `callback` with every new reading, on the thread that receives it."""
+        self._listeners.append(callback)
+        return
 
     @property
     @abstractmethod
     def value(self) -> Any:
         pass
 
+    @property
+    def history(self) -> RingBuffer:
+        return self._history
+
+    @property
+    def age(self) -> float | None:
+        """Seconds since the last reading, `None` if nothing was received yet."""
+        return self._history.age()
+
     @property
     def buffer(self) -> list[Any]:
+        """The last `buffer_len` readings as received, oldest first, padded with `None`.
+
+        Statistics over the numeric readings are cheaper from `history`.
+        """
         return list(self._buffer)
 
 
 class Consumer(ABC):
     @abstractmethod
     def set(self, value: Any):
-        pass
\ No newline at end of file
+        pass
+
+    @property
+    @abstractmethod
+    def status(self) -> SetpointStatus:
+        pass
@@ -0,0 +1,135 @@
+import asyncio
+import logging
+import socket
+from typing import Any, Callable, Optional
+import paho.mqtt.client as mqtt
+from ctrlsolar.mqtt.mqtt import Mqtt
+
+logger = logging.getLogger(__name__)
+
+__all__ = ["AsyncMqttLoop"]
+
+
+class AsyncMqttLoop:
+    """Drives the paho client of a `Mqtt` instance from an asyncio event loop.
+
+    Replaces paho's background thread (`loop_start`): socket reads and writes are
+    registered with the running event loop, so message callbacks and sensor
+    updates run on the loop thread, without a network thread of their own.
+    `Mqtt`, `MqttSensor` and `MqttConsumer` keep their synchronous API.
+    """
+
+    def __init__(self, mqtt_client: Mqtt, reconnect_delay_s: float = 5.0):
+        self.mqtt = mqtt_client
+        self.reconnect_delay_s = reconnect_delay_s
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._misc_task: Optional[asyncio.Task[None]] = None
+        self._connected = asyncio.Event()
+        self._closing = False
+
+        client = self.mqtt.client
+        client.on_socket_open = self._on_socket_open
+        client.on_socket_close = self._on_socket_close
+        client.on_socket_register_write = self._on_socket_register_write
+        client.on_socket_unregister_write = self._on_socket_unregister_write
+        client.on_connect = self._on_connect
+        client.on_disconnect = self._on_disconnect
+
+    def _on_socket_open(self, client: mqtt.Client, userdata: Any, sock: socket.socket) -> None:
+        self._in_loop(self._running_loop().add_reader, sock, self._read)
+        return
+
+    def _on_socket_close(self, client: mqtt.Client, userdata: Any, sock: socket.socket) -> None:
+        loop = self._running_loop()
+        self._in_loop(loop.remove_reader, sock)
+        self._in_loop(loop.remove_writer, sock)
+        return
+
+    def _on_socket_register_write(self, client: mqtt.Client, userdata: Any, sock: socket.socket) -> None:
+        self._in_loop(self._running_loop().add_writer, sock, self._write)
+        return
+
+    def _on_socket_unregister_write(self, client: mqtt.Client, userdata: Any, sock: socket.socket) -> None:
+        self._in_loop(self._running_loop().remove_writer, sock)
+        return
+
+    def _in_loop(self, callback: Callable[..., Any], *args: Any) -> None:
+        # (re)connects run in a worker thread, the event loop must only be changed from its own thread
+        loop = self._running_loop()
+        try:
+            on_loop = asyncio.get_running_loop() is loop
+        except RuntimeError:
+            on_loop = False
+
+        if on_loop:
+            callback(*args)
+        else:
+            loop.call_soon_threadsafe(callback, *args)
+        return
+
+    def _on_connect(self, client: mqtt.Client, userdata: Any, flags: Any, reason_code: Any, properties: Any) -> None:
+        logger.info(f"Connected to MQTT broker {self.mqtt.broker}:{self.mqtt.port}.")
+        self.mqtt._on_connect(client, userdata, flags, reason_code, properties)
+        self._connected.set()
+        return
+
+    def _on_disconnect(self, client: mqtt.Client, userdata: Any, flags: Any, reason_code: Any, properties: Any) -> None:
+        self._connected.clear()
+        if not self._closing:
+            logger.warning(f"Disconnected from MQTT broker ({reason_code}).")
+        return
+
+    def _read(self) -> None:
+        self.mqtt.client.loop_read()
+        return
+
+    def _write(self) -> None:
+        self.mqtt.client.loop_write()
+        return
+
+    def _running_loop(self) -> asyncio.AbstractEventLoop:
+        if self._loop is None:
+            raise RuntimeError("AsyncMqttLoop is not connected.")
+        return self._loop
+
+    async def connect(self, timeout_s: float = 10.0) -> None:
+        """Connect to the broker and wait for the CONNACK."""
+        self._loop = asyncio.get_running_loop()
+        self._closing = False
+        # DNS lookup and TCP handshake block, keep them off the event loop
+        await asyncio.to_thread(self.mqtt.client.connect, self.mqtt.broker, self.mqtt.port)
+        self._misc_task = asyncio.create_task(self._misc_loop(), name="mqtt-misc")
+        try:
+            await asyncio.wait_for(self._connected.wait(), timeout=timeout_s)
+        except asyncio.TimeoutError:
+            raise RuntimeError("Connection to MQTT broker could not be established.")
+
+        return
+
+    async def _misc_loop(self) -> None:
+        """Keepalive handling and reconnects, which paho's thread would do otherwise."""
+        while not self._closing:
+            result = self.mqtt.client.loop_misc()
+            if result == mqtt.MQTT_ERR_NO_CONN and not self._closing:
+                await asyncio.sleep(self.reconnect_delay_s)
+                try:
+                    await asyncio.to_thread(self.mqtt.client.reconnect)
+                except OSError as e:
+                    logger.warning(f"Reconnect to MQTT broker failed: {e}")
+                continue
+
+            await asyncio.sleep(1)
+
+        return
+
+    async def disconnect(self) -> None:
+        self._closing = True
+        self.mqtt.disconnect()
+        if self._misc_task is not None:
+            self._misc_task.cancel()
+            try:
+                await self._misc_task
+            except asyncio.CancelledError:
+                pass
+        self._misc_task = None
+        return
@@ -0,0 +1,199 @@
+from bisect import bisect_left
+from typing import Any, Callable, Optional
+import numpy as np
+import operator
+import threading
+import time
+
+__all__ = ["RingBuffer"]
+
+
+class RingBuffer:
+    """Fixed-size buffer of float64 samples with monotonic timestamps.
+
+    Every sample is written twice (at `i` and `i + size`), so the most recent
+    samples are always a contiguous slice and can be returned as read-only views
+    without copying. Running sums make the mean over any window O(1) once the
+    window bounds are found by binary search. They restart with every pass over
+    the buffer, so they stay as precise as the samples over any uptime.
+    Monotonic stacks of the samples that are the minimum (maximum) of some window
+    make `min` and `max` a binary search as well, at amortized O(1) per sample.
+    Non-numeric samples are stored as NaN.
+
+    The buffer supports a single writer (e.g. the MQTT network thread) and
+    concurrent readers.
+    """
+
+    def __init__(self, size: int = 1000):
+        if size < 1:
+            raise ValueError("RingBuffer size must be positive.")
+        self.size = size
+        self._values = np.full(2 * size, np.nan, dtype=np.float64)
+        self._times = np.full(2 * size, np.nan, dtype=np.float64)
+        self._sums = np.zeros(2 * size, dtype=np.float64)       # running sum including the sample
+        self._counts = np.zeros(2 * size, dtype=np.int64)       # running count of valid samples
+        self._sum = 0.0
+        self._valid = 0
+        self._count = 0
+        self._minima = _Extremes(operator.lt)
+        self._maxima = _Extremes(operator.gt)
+
+    def __len__(self) -> int:
+        return min(self._count, self.size)
+
+    def append(self, value: Any, timestamp: Optional[float] = None) -> None:
+        i = self._count % self.size
+        if i == 0:
+            self._sum = 0.0
+            self._valid = 0
+
+        sample = _to_float(value)
+        if not np.isnan(sample):
+            self._sum += sample
+            self._valid += 1
+
+        t = time.monotonic() if timestamp is None else timestamp
+        for j in (i, i + self.size):
+            self._values[j] = sample
+            self._times[j] = t
+            self._sums[j] = self._sum
+            self._counts[j] = self._valid
+
+        # publish the sample only after it is completely written
+        self._count += 1
+        for extremes in (self._minima, self._maxima):
+            extremes.push(self._count - 1, sample, oldest=self._count - self.size)
+        return
+
+    def _bounds(self, n: Optional[int] = None) -> tuple[int, int]:
+        count = self._count
+        head = count % self.size + self.size
+        length = min(count, self.size) if n is None else min(n, count, self.size)
+        return head - length, head
+
+    @staticmethod
+    def _readonly(array: np.ndarray) -> np.ndarray:
+        view = array.view()
+        view.flags.writeable = False
+        return view
+
+    def values(self, n: Optional[int] = None) -> np.ndarray:
+        """The last `n` (default: all) samples, oldest first, as a read-only view."""
+        start, end = self._bounds(n)
+        return self._readonly(self._values[start:end])
+
+    def timestamps(self, n: Optional[int] = None) -> np.ndarray:
+        start, end = self._bounds(n)
+        return self._readonly(self._times[start:end])
+
+    def _window(self, seconds: float, now: Optional[float] = None) -> tuple[int, int]:
+        start, end = self._bounds()
+        t0 = (time.monotonic() if now is None else now) - seconds
+        first = start + int(np.searchsorted(self._times[start:end], t0, side="left"))
+        return first, end
+
+    def window(self, seconds: float, now: Optional[float] = None) -> np.ndarray:
+        """Samples received within the last `seconds`, as a read-only view."""
+        start, end = self._window(seconds, now)
+        return self._readonly(self._values[start:end])
+
+    @property
+    def last(self) -> float | None:
+        if self._count == 0:
+            return None
+        return float(self._values[self._bounds(1)[0]])
+
+    @property
+    def last_timestamp(self) -> float | None:
+        if self._count == 0:
+            return None
+        return float(self._times[self._bounds(1)[0]])
+
+    def age(self, now: Optional[float] = None) -> float | None:
+        """Seconds since the last sample, `None` if nothing was received yet."""
+        last = self.last_timestamp
+        if last is None:
+            return None
+        return (time.monotonic() if now is None else now) - last
+
+    def mean(self, seconds: float, now: Optional[float] = None) -> float | None:
+        start, end = self._window(seconds, now)
+        if start >= end:
+            return None
+
+        # the running sums restart at index `size`, the previous pass ends just before
+        total, n_valid = 0.0, 0
+        for first, last in ((start, min(end, self.size)), (max(start, self.size), end)):
+            if first < last:
+                segment_sum, segment_count = self._segment(first, last)
+                total += segment_sum
+                n_valid += segment_count
+
+        if n_valid == 0:
+            return None
+        return float(total / n_valid)
+
+    def _segment(self, start: int, end: int) -> tuple[float, int]:
+        """Sum and number of valid samples in `[start, end)`, within one pass over the buffer."""
+        first = self._values[start]
+        sum_before = self._sums[start] - (0.0 if np.isnan(first) else first)
+        count_before = self._counts[start] - (0 if np.isnan(first) else 1)
+        return float(self._sums[end - 1] - sum_before), int(self._counts[end - 1] - count_before)
+
+    def _window_start(self, seconds: float, now: Optional[float] = None) -> int:
+        """Sample number of the first sample within the last `seconds`."""
+        count = self._count
+        head = count % self.size + self.size
+        start = head - min(count, self.size)
+        t0 = (time.monotonic() if now is None else now) - seconds
+        first = start + int(np.searchsorted(self._times[start:head], t0, side="left"))
+        return count - (head - first)
+
+    def min(self, seconds: float, now: Optional[float] = None) -> float | None:
+        return self._minima.find(self._window_start(seconds, now))
+
+    def max(self, seconds: float, now: Optional[float] = None) -> float | None:
+        return self._maxima.find(self._window_start(seconds, now))
+
+
+class _Extremes:
+    """Samples that are the extreme of the window from them to the newest sample.
+
+    Their values are ordered, so the extreme of the window starting at any sample
+    is the first of them at or after it.
+    """
+
+    def __init__(self, before: Callable[[float, float], bool]):
+        self._before = before
+        self._numbers: list[int] = []
+        self._values: list[float] = []
+        self._head = 0
+        self._lock = threading.Lock()
+
+    def push(self, number: int, value: float, oldest: int) -> None:
+        with self._lock:
+            if not np.isnan(value):
+                while len(self._numbers) > self._head and not self._before(self._values[-1], value):
+                    self._numbers.pop()
+                    self._values.pop()
+                self._numbers.append(number)
+                self._values.append(value)
+
+            # samples overwritten in the buffer
+            while self._head < len(self._numbers) and self._numbers[self._head] < oldest:
+                self._head += 1
+            if self._head > 64 and 2 * self._head > len(self._numbers):
+                del self._numbers[: self._head], self._values[: self._head]
+                self._head = 0
+        return
+
+    def find(self, start: int) -> float | None:
+        with self._lock:
+            i = bisect_left(self._numbers, start, lo=self._head)
+            return self._values[i] if i < len(self._numbers) else None
+
+
+def _to_float(value: Any) -> float:
+    if isinstance(value, (int, float, np.number)):
+        return float(value)
+    return np.nan
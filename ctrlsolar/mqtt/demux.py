@@ -0,0 +1,115 @@
+from dataclasses import dataclass
+from typing import Any, Callable, Optional
+import json
+import logging
+import time
+from ctrlsolar.mqtt.abstract import Sensor
+from ctrlsolar.mqtt.mqtt import get_mqtt
+
+logger = logging.getLogger(__name__)
+
+__all__ = ["DecodedMessage", "Field", "FieldSensor", "JsonTopicDemux", "get_demux"]
+
+
+@dataclass(frozen=True)
+class Field:
+    """Declarative description of a value inside a JSON payload.
+
+    Args:
+        key (str | tuple[str, ...]): Key of the value, a tuple addresses nested objects.
+        scale (float): Factor applied after `cast`.
+        default (Any): Value used if the key is missing, `null` or cannot be cast.
+        cast (Callable[[Any], Any]): Conversion of the raw value, e.g. `float` or `int`.
+    """
+    key: str | tuple[str, ...]
+    scale: float = 1
+    default: Any = None
+    cast: Callable[[Any], Any] = float
+
+    def extract(self, data: Any) -> Any:
+        keys = (self.key,) if isinstance(self.key, str) else self.key
+        value = data
+        for key in keys:
+            if not isinstance(value, dict) or key not in value:
+                return self.default
+            value = value[key]
+
+        if value is None:
+            return self.default
+
+        try:
+            value = self.cast(value)
+        except (TypeError, ValueError):
+            logger.warning(f"Could not convert {value!r} of field `{self.key}`. Using default.")
+            return self.default
+
+        return value * self.scale if self.scale != 1 else value
+
+
+@dataclass(frozen=True)
+class DecodedMessage:
+    data: Any               # decoded JSON payload
+    received_at: float      # time.monotonic() at reception
+
+
+class FieldSensor(Sensor):
+    """Sensor fed by a `JsonTopicDemux` with a single field of the payload."""
+
+    def __init__(self, topic: str, field: Field, *args: Any, **kwargs: Any):
+        super().__init__(*args, **kwargs)
+        self.topic = topic
+        self.field = field
+
+    def _push(self, value: Any) -> None:
+        self._record(value)
+        return
+
+    @property
+    def value(self) -> Any:
+        return self._last
+
+
+class JsonTopicDemux:
+    """Decodes the JSON payload of one topic once and dispatches the fields to its sensors."""
+
+    def __init__(self, topic: str, via: Optional[str] = None):
+        self.topic = topic
+        self._sensors: list[FieldSensor] = []
+        self._last: Optional[DecodedMessage] = None
+        get_mqtt().subscribe(topic, self._on_message, via=via)
+
+    def sensor(self, field: Field, *args: Any, **kwargs: Any) -> FieldSensor:
+        sensor = FieldSensor(self.topic, field, *args, **kwargs)
+        self._sensors.append(sensor)
+        # a retained message may have arrived with the subscription, before the sensor existed
+        if self._last is not None:
+            sensor._push(field.extract(self._last.data))
+        return sensor
+
+    @property
+    def last(self) -> Optional[DecodedMessage]:
+        """The last message as a whole, replaced at once, so all its fields belong together."""
+        return self._last
+
+    def _on_message(self, payload: str) -> None:
+        try:
+            data = json.loads(payload)
+        except ValueError:
+            logger.warning(f"Received invalid JSON on `{self.topic}`. Ignoring message.")
+            return
+
+        # before the sensors, their listeners may already read the message
+        self._last = DecodedMessage(data=data, received_at=time.monotonic())
+        for sensor in self._sensors:
+            sensor._push(sensor.field.extract(data))
+
+        return
+
+
+def get_demux(topic: str, via: Optional[str] = None) -> JsonTopicDemux:
+    """The demultiplexer of `topic` on the current MQTT client, shared by all devices reading from it."""
+    demuxes = get_mqtt().demuxes
+    if topic not in demuxes:
+        demuxes[topic] = JsonTopicDemux(topic, via=via)
+
+    return demuxes[topic]
@@ -5,8 +5,17 @@ import json
 # Library for specific device implementations
 # List of devices:
 # - Shelly1PM (via MQTT)
+# - Shelly Pro 3EM (via MQTT)
+# - any sensor publishing plain numbers
 
-__all__ = ["Shelly1PM_Energy", "Shelly1PM_Power"]
+__all__ = ["Shelly1PM_Energy", "Shelly1PM_Power", "ShellyPro3EM_Power", "Generic_Power"]
+
+
+def _to_float(payload: str) -> float | None:
+    try:
+        return float(payload)
+    except ValueError:
+        return None     # e.g. "unavailable"
 
 
 class Shelly1PM_Energy(MqttSensor):
@@ -36,7 +45,31 @@ class Shelly1PM_Power(MqttSensor):
             ],
         )
 
+
+class ShellyPro3EM_Power(MqttSensor):
+    # total active power of all phases at the grid meter, positive for import
+    def __init__(self, topic: str):
+        super().__init__(
+            topic=f"{topic}/status/em:0",
+            filter=[
+                lambda y: (lambda x: float(x) if x is not None else 0)(  # type: ignore
+                    json.loads(y)["total_act_power"]  # type: ignore
+                )
+            ],
+        )
+
+
+class Generic_Power(MqttSensor):
+    # plain numeric payload in [W], e.g. from a Home Assistant MQTT statestream
+    def __init__(self, topic: str):
+        super().__init__(
+            topic=topic,
+            filter=[_to_float],
+        )
+
 MAPPINGS: dict[str, Type[MqttSensor]] = {
     "Shelly1PM_Energy": Shelly1PM_Energy, 
     "Shelly1PM_Power": Shelly1PM_Power,
+    "ShellyPro3EM_Power": ShellyPro3EM_Power,
+    "Generic_Power": Generic_Power,
 }
\ No newline at end of file
@@ -1,10 +1,107 @@
-from typing import Optional, Callable, Any
+from typing import TYPE_CHECKING, Optional, Callable, Any
+from dataclasses import dataclass
+from collections import OrderedDict
+import hashlib
 import json
 import paho.mqtt.client as mqtt
 import logging
+import threading
 from ctrlsolar.mqtt.abstract import Sensor, Consumer
+from ctrlsolar.mqtt.outbox import CommandQueue, PublishResult, SetpointStatus
+
+if TYPE_CHECKING:
+    from ctrlsolar.mqtt.demux import JsonTopicDemux
 
 logger = logging.getLogger(__name__)
+
+_Handler = Callable[[str, str], None]
+
+
+class _TopicNode:
+    __slots__ = ("children", "handlers")
+
+    def __init__(self):
+        self.children: dict[str, _TopicNode] = {}
+        self.handlers: list[_Handler] = []
+
+
+class TopicTrie:
+    """Routes topics to handlers registered for MQTT topic filters.
+
+    Filters may contain the `+` (single level) and `#` (remaining levels)
+    wildcards. Matching walks the topic level by level, so its cost depends on
+    the depth of the topic, not on the number of registered filters.
+    """
+
+    def __init__(self):
+        self._root = _TopicNode()
+
+    def insert(self, topic_filter: str, handler: _Handler) -> None:
+        levels = topic_filter.split("/")
+        for ii, level in enumerate(levels):
+            if level == "#" and ii != len(levels) - 1:
+                raise ValueError(f"Invalid topic filter `{topic_filter}`: `#` must be the last level.")
+            if level not in ("+", "#") and ("+" in level or "#" in level):
+                raise ValueError(f"Invalid topic filter `{topic_filter}`: wildcards must fill a whole level.")
+
+        node = self._root
+        for level in levels:
+            node = node.children.setdefault(level, _TopicNode())
+        node.handlers.append(handler)
+        return
+
+    def match(self, topic: str) -> list[_Handler]:
+        levels = topic.split("/")
+        handlers: list[_Handler] = []
+        nodes = [self._root]
+        for depth, level in enumerate(levels):
+            # wildcards do not match topics starting with `$` (e.g. `$SYS`)
+            wildcards = not (depth == 0 and level.startswith("$"))
+            next_nodes: list[_TopicNode] = []
+            for node in nodes:
+                if wildcards and "#" in node.children:
+                    handlers.extend(node.children["#"].handlers)
+                if level in node.children:
+                    next_nodes.append(node.children[level])
+                if wildcards and "+" in node.children:
+                    next_nodes.append(node.children["+"])
+            nodes = next_nodes
+            if not nodes:
+                return handlers
+
+        for node in nodes:
+            handlers.extend(node.handlers)
+            # `a/#` also matches `a`
+            if "#" in node.children:
+                handlers.extend(node.children["#"].handlers)
+
+        return handlers
+
+
+def topic_matches(topic_filter: str, topic: str) -> bool:
+    """Whether `topic` matches a single filter, with the rules of `TopicTrie`."""
+    filter_levels = topic_filter.split("/")
+    levels = topic.split("/")
+    if levels[0].startswith("$") and filter_levels[0] in ("+", "#"):
+        return False
+
+    for depth, level in enumerate(filter_levels):
+        if level == "#":
+            return True
+        if depth >= len(levels) or (level != "+" and level != levels[depth]):
+            return False
+
+    return len(filter_levels) == len(levels)
+
+
+@dataclass
+class PublishStats:
+    published: int = 0
+    skipped: int = 0
+    bytes_published: int = 0
+    bytes_saved: int = 0
+
+
 class Mqtt:
     def __init__(
         self,
@@ -18,8 +115,21 @@ class Mqtt:
         self.client = mqtt.Client(
             callback_api_version=mqtt.CallbackAPIVersion.VERSION2
         )
-        self.subscriptions = {}
+        self.subscriptions: set[str] = set()      # filters subscribed at the broker
+        self._routes = TopicTrie()
+        self.demuxes: dict[str, "JsonTopicDemux"] = {}   # one per topic, bound to this client
+        self.stats = PublishStats()
+        self._retained_digests: dict[str, bytes] = {}
+        self._deadbands: dict[str, float] = {}
+        self._last_values: dict[str, float] = {}
+        self._retained: dict[str, str] = {}      # last retained payload per received topic
+        self._retained_lock = threading.Lock()
         self.client.on_message = self._on_message
+        self.client.on_connect = self._on_connect
+        self.client.on_publish = self._on_publish
+        self._ack_lock = threading.Lock()
+        self._ack_callbacks: dict[int, Callable[[], None]] = {}
+        self._early_acks: OrderedDict[int, None] = OrderedDict()
         if username is not None:
             self.client.username_pw_set(username, password)
 
@@ -27,28 +137,153 @@ class Mqtt:
         self.client.connect(self.broker, self.port)
         self.client.loop_start()
 
-    def publish(self, topic: str, payload: Any, qos: int = 1, retain: bool = True):
+    def set_deadband(self, topic: str, deadband: float) -> None:
+        """Only publish numeric payloads on `topic` that differ by at least `deadband` from the last one sent."""
+        self._deadbands[topic] = deadband
+        return
+
+    def _skip(self, topic: str, payload: Any, data: bytes, retain: bool) -> Optional[PublishResult]:
+        """Reason to not send `payload`, `None` if it has to be sent."""
+        if retain and self._retained_digests.get(topic) == hashlib.blake2b(data, digest_size=16).digest():
+            return PublishResult.DUPLICATE
+
+        deadband = self._deadbands.get(topic)
+        if deadband is not None and isinstance(payload, (int, float)) and topic in self._last_values:
+            if abs(payload - self._last_values[topic]) < deadband:
+                return PublishResult.DEADBAND
+
+        return None
+
+    def publish(
+        self,
+        topic: str,
+        payload: Any,
+        qos: int = 1,
+        retain: bool = True,
+        force: bool = False,
+        on_ack: Optional[Callable[[], None]] = None,
+    ) -> PublishResult:
+        """Publish `payload`, unless it is a retained duplicate or within the deadband of `topic`.
+
+        `on_ack` is called once the broker acknowledged the message (PUBACK for QoS 1),
+        possibly on the network thread. It is not called for skipped messages.
+        Returns `PublishResult.SENT` if the message was handed to the client, otherwise
+        why it was skipped.
+        """
         if isinstance(payload, (dict, list)):
             payload = json.dumps(payload)
 
-        self.client.publish(topic, payload, qos=qos, retain=retain)
+        data = payload if isinstance(payload, bytes) else str(payload).encode()
+        skip = None if force else self._skip(topic, payload, data, retain)
+        if skip is not None:
+            self.stats.skipped += 1
+            self.stats.bytes_saved += len(data)
+            logger.debug(f"Skipped publish on `{topic}` ({skip.value}).")
+            return skip
+
+        info = self._send(topic, payload, qos=qos, retain=retain)
+        if on_ack is not None:
+            self._track(info.mid, on_ack)
+        self.stats.published += 1
+        self.stats.bytes_published += len(data)
+        if retain:
+            self._retained_digests[topic] = hashlib.blake2b(data, digest_size=16).digest()
+        if isinstance(payload, (int, float)):
+            self._last_values[topic] = payload
+        return PublishResult.SENT
+
+    def _send(self, topic: str, payload: Any, qos: int, retain: bool) -> mqtt.MQTTMessageInfo:
+        return self.client.publish(topic, payload, qos=qos, retain=retain)
+
+    def _track(self, mid: int, on_ack: Callable[[], None]) -> None:
+        # the acknowledgement may already have arrived on the network thread
+        with self._ack_lock:
+            acked = mid in self._early_acks
+            if acked:
+                del self._early_acks[mid]
+            else:
+                self._ack_callbacks[mid] = on_ack
+
+        if acked:
+            on_ack()
+        return
+
+    def _on_publish(self, client, userdata, mid, reason_code=None, properties=None):
+        with self._ack_lock:
+            callback = self._ack_callbacks.pop(mid, None)
+            if callback is None:
+                self._early_acks[mid] = None
+                while len(self._early_acks) > 100:
+                    self._early_acks.popitem(last=False)
+
+        if callback is not None:
+            callback()
         return
 
     def disconnect(self):
         self.client.disconnect()
 
-    def subscribe(self, topic: str, callback: Callable[[str], None]):
-        if topic not in self.subscriptions:
-            self.subscriptions[topic] = []
-            self.client.subscribe(topic)
+    def subscribe(
+        self,
+        topic: str,
+        callback: Callable[[str], None],
+        via: Optional[str] = None,
+        pass_topic: bool = False,
+    ):
+        """Call `callback` with the payload of every message matching `topic`.
+
+        Args:
+            topic (str): Topic or topic filter with `+`/`#` wildcards.
+            callback (Callable): Called with the payload, or with topic and payload if `pass_topic`.
+            via (Optional[str]): Wildcard filter to subscribe at the broker instead of `topic`.
+                Many devices can share one broker subscription this way, messages are routed locally.
+            pass_topic (bool): Pass the topic of the message as first argument.
+        """
+        broker_filter = via if via is not None else topic
+        if via is not None and not topic_matches(via, topic):
+            raise ValueError(f"Topic `{topic}` is not covered by `{via}`.")
+
+        handler = callback if pass_topic else (lambda _topic, payload: callback(payload))  # type: ignore
+        self._routes.insert(topic, handler)  # type: ignore
+        if broker_filter not in self.subscriptions:
+            # the broker sends the retained messages of the new subscription
+            self.subscriptions.add(broker_filter)
+            self._subscribe_broker(broker_filter)
+            return
+
+        # the broker sent them once, to the first route of the shared subscription
+        with self._retained_lock:
+            retained = [(t, p) for t, p in self._retained.items() if topic_matches(topic, t)]
+        for retained_topic, payload in retained:
+            handler(retained_topic, payload)
 
-        self.subscriptions[topic].append(callback)
+    def _subscribe_broker(self, topic_filter: str) -> None:
+        self.client.subscribe(topic_filter)
+        return
+
+    def _on_connect(self, client, userdata, flags, reason_code, properties=None):
+        # a restarted broker or a clean session lost what was sent before, send everything again
+        self._retained_digests.clear()
+        self._last_values.clear()
+        # subscriptions do not survive a new session
+        for topic_filter in self.subscriptions:
+            self._subscribe_broker(topic_filter)
+        return
 
     def _on_message(self, client, userdata, message):
-        topic = message.topic
-        payload = message.payload.decode()
-        for cb in self.subscriptions.get(topic, []):
-            cb(payload)
+        self._dispatch(message.topic, message.payload.decode(), retain=bool(message.retain))
+
+    def _dispatch(self, topic: str, payload: str, retain: bool = False) -> None:
+        with self._retained_lock:
+            if retain and payload == "":
+                self._retained.pop(topic, None)
+            elif retain or topic in self._retained:
+                # live messages arrive without the flag, but replace the retained one at the broker
+                self._retained[topic] = payload
+
+        for handler in self._routes.match(topic):
+            handler(topic, payload)
+        return
 
 
 class MqttSensor(Sensor):
@@ -57,40 +292,44 @@ class MqttSensor(Sensor):
         topic: str,
         filter: Optional[list[Callable]] = None,
         *args,
+        via: Optional[str] = None,
         **kwargs,
     ):
         super().__init__(*args, **kwargs)
         self.topic = topic
         self.filter = filter
         mqtt = get_mqtt()
-        mqtt.subscribe(topic, self._on_message)
+        mqtt.subscribe(topic, self._on_message, via=via)
 
     def _on_message(self, payload: str):
         if self.filter is not None:
             for cc in self.filter:
                 payload = cc(payload)
 
-        self._buffer.append(payload)
+        self._record(payload)
         return
 
     @property
     def value(self):
-        if not self._buffer:
-            return None
-
-        message = self._buffer[-1]
-        return message
+        return self._last
 
 
 class MqttConsumer(Consumer):
-    def __init__(self, topic: str):
+    def __init__(self, topic: str, deadband: Optional[float] = None, reassert_s: Optional[float] = 300):
         self.mqtt = get_mqtt()
         self.topic = topic
+        if deadband is not None:
+            self.mqtt.set_deadband(topic, deadband)
+        self.queue = CommandQueue(self.mqtt, topic, reassert_s=reassert_s)
 
     def set(self, value: str | int | float):
-        self.mqtt.publish(self.topic, value)
+        self.queue.put(value)
         return
 
+    @property
+    def status(self) -> SetpointStatus:
+        return self.queue.status
+
 # Mqtt singleton to be used
 _mqtt: Mqtt | None = None
 
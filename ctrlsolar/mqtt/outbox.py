@@ -0,0 +1,154 @@
+from dataclasses import dataclass
+from collections import deque
+from enum import Enum
+from typing import TYPE_CHECKING, Any, Optional
+import logging
+import threading
+import time
+
+if TYPE_CHECKING:
+    from ctrlsolar.mqtt.mqtt import Mqtt
+
+logger = logging.getLogger(__name__)
+
+__all__ = ["CommandQueue", "PublishResult", "SetpointStatus"]
+
+_EMPTY = object()
+
+
+class PublishResult(Enum):
+    """Outcome of `Mqtt.publish`, true only if the message was sent."""
+    SENT = "sent"
+    DUPLICATE = "duplicate"     # retained payload the broker already holds
+    DEADBAND = "deadband"       # numeric payload within the deadband of the last one sent
+
+    def __bool__(self) -> bool:
+        return self is PublishResult.SENT
+
+
+@dataclass(frozen=True)
+class SetpointStatus:
+    confirmed: Any              # last value acknowledged by the broker
+    pending: Any                # newest value waiting for the in-flight one, `None` if none
+    in_flight: Any              # value sent but not yet acknowledged, `None` if none
+    depth: int                  # number of values in flight or pending
+    coalesced: int              # number of values replaced by newer ones before being sent
+    latency_s: Optional[float]  # mean acknowledgement latency of the recent commands
+
+
+class CommandQueue:
+    """Latest-value-wins outbound queue for a command topic.
+
+    At most one command is in flight. Values set while waiting for its
+    acknowledgement replace each other, and only the newest is sent once the
+    acknowledgement arrives. A command that stays unacknowledged for longer than
+    `ack_timeout_s` no longer blocks newer values.
+
+    Unchanged values and values within the deadband of the topic are skipped,
+    but a command is sent at least every `reassert_s`, so a device that lost its
+    setpoint (e.g. after a reset) gets it again.
+    """
+
+    def __init__(
+        self,
+        mqtt: "Mqtt",
+        topic: str,
+        qos: int = 1,
+        retain: bool = True,
+        ack_timeout_s: float = 30,
+        reassert_s: Optional[float] = 300,
+    ):
+        self.mqtt = mqtt
+        self.topic = topic
+        self.qos = qos
+        self.retain = retain
+        self.ack_timeout_s = ack_timeout_s
+        self.reassert_s = reassert_s
+        self._lock = threading.Lock()
+        self._pending: Any = _EMPTY
+        self._in_flight: Optional[tuple[int, Any, float]] = None   # token, value, sent at
+        self._token = 0
+        self._confirmed: Any = None
+        self._coalesced = 0
+        self._latencies: deque[float] = deque(maxlen=20)
+        self._last_sent = -float("inf")
+
+    def put(self, value: Any) -> None:
+        with self._lock:
+            if self._in_flight is not None:
+                _, _, sent_at = self._in_flight
+                if time.monotonic() - sent_at < self.ack_timeout_s:
+                    if self._pending is not _EMPTY:
+                        self._coalesced += 1
+                    self._pending = value
+                    return
+
+                logger.warning(
+                    f"Command on `{self.topic}` unacknowledged for {self.ack_timeout_s:.0f} s. Sending newer value."
+                )
+
+            self._pending = _EMPTY
+            token = self._start(value)
+
+        self._publish(token, value)
+        return
+
+    def _start(self, value: Any) -> int:
+        self._token += 1
+        self._in_flight = (self._token, value, time.monotonic())
+        return self._token
+
+    def _publish(self, token: int, value: Any) -> None:
+        # only one command is in flight, publishes never overlap
+        force = self.reassert_s is not None and time.monotonic() - self._last_sent >= self.reassert_s
+        result = self.mqtt.publish(
+            self.topic, value, qos=self.qos, retain=self.retain, force=force,
+            on_ack=lambda: self._on_ack(token),
+        )
+        if result is PublishResult.SENT:
+            self._last_sent = time.monotonic()
+        elif result is PublishResult.DUPLICATE:
+            # the broker already holds this value
+            self._on_ack(token, confirmed=True, measured=False)
+        elif result is PublishResult.DEADBAND:
+            # never sent, the device keeps the last confirmed value
+            self._on_ack(token, confirmed=False, measured=False)
+        return
+
+    def _on_ack(self, token: int, confirmed: bool = True, measured: bool = True) -> None:
+        with self._lock:
+            if self._in_flight is None or self._in_flight[0] != token:
+                return
+
+            _, value, sent_at = self._in_flight
+            if measured:
+                self._latencies.append(time.monotonic() - sent_at)
+            if confirmed:
+                self._confirmed = value
+            self._in_flight = None
+
+            if self._pending is _EMPTY:
+                return
+
+            value = self._pending
+            self._pending = _EMPTY
+            token = self._start(value)
+
+        self._publish(token, value)
+        return
+
+    @property
+    def status(self) -> SetpointStatus:
+        with self._lock:
+            in_flight = self._in_flight[1] if self._in_flight is not None else None
+            pending = self._pending if self._pending is not _EMPTY else None
+            depth = int(self._in_flight is not None) + int(self._pending is not _EMPTY)
+            latency = sum(self._latencies) / len(self._latencies) if self._latencies else None
+            return SetpointStatus(
+                confirmed=self._confirmed,
+                pending=pending,
+                in_flight=in_flight,
+                depth=depth,
+                coalesced=self._coalesced,
+                latency_s=latency,
+            )
@@ -0,0 +1,233 @@
+import argparse
+import gzip
+import itertools
+import json
+import logging
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, IO, Optional, Sequence
+import paho.mqtt.client as mqtt
+from ctrlsolar.mqtt.mqtt import Mqtt, topic_matches
+
+logger = logging.getLogger(__name__)
+
+__all__ = ["RecordedMessage", "MqttRecorder", "ReplayMqtt", "read_recording"]
+
+
+@dataclass(frozen=True)
+class RecordedMessage:
+    t: float            # seconds since the first message of the recording
+    topic: str
+    payload: str
+    retain: bool = False
+
+
+def _open(path: str, mode: str) -> IO[str]:
+    if path.endswith(".gz"):
+        return gzip.open(path, mode + "t", encoding="utf-8")  # type: ignore
+    return open(path, mode, encoding="utf-8")
+
+
+def read_recording(path: str) -> list[RecordedMessage]:
+    """Read a recording written by `MqttRecorder`, times relative to its first message."""
+    rows: list[tuple[float, str, str]] = []
+    with _open(path, "r") as f:
+        for line in f:
+            if line.strip():
+                timestamp, topic, payload = json.loads(line)
+                rows.append((timestamp, topic, payload))
+
+    if not rows:
+        return []
+
+    start = rows[0][0]
+    return [RecordedMessage(t=timestamp - start, topic=topic, payload=payload) for timestamp, topic, payload in rows]
+
+
+class MqttRecorder:
+    def __init__(self, mqtt_client: Mqtt, path: str, topics: Sequence[str] = ("#",)):
+        """Append the traffic on `topics` to `path`, one JSON array `[unix_time, topic, payload]` per line.
+
+        Paths ending in `.gz` are gzip compressed. Subscribe before connecting the client
+        to also capture the retained messages sent by the broker on connect.
+
+        Args:
+            mqtt_client (Mqtt): Client to record from.
+            path (str): File to append to.
+            topics (Sequence[str]): Topic filters to record.
+        """
+        self.mqtt = mqtt_client
+        self.path = path
+        self.topics = topics
+        self.count = 0
+        self._file: Optional[IO[str]] = None
+        self._lock = threading.Lock()
+        self._subscribed = False
+
+    def start(self) -> None:
+        with self._lock:
+            if self._file is None:
+                self._file = _open(self.path, "a")
+
+        if not self._subscribed:
+            for topic in self.topics:
+                self.mqtt.subscribe(topic, self._on_message, pass_topic=True)
+            self._subscribed = True
+        return
+
+    def stop(self) -> None:
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+        return
+
+    def _on_message(self, topic: str, payload: str) -> None:
+        line = json.dumps([round(time.time(), 3), topic, payload], separators=(",", ":"))
+        with self._lock:
+            if self._file is None:
+                return
+            self._file.write(line + "\n")
+            self.count += 1
+            if self.count % 100 == 0:
+                self._file.flush()
+        return
+
+
+class ReplayMqtt(Mqtt):
+    """In-process stand-in for the broker connection that replays a recording.
+
+    Implements the `Mqtt` interface, so sensors, consumers, devices and controllers
+    work unchanged. `connect()` replays the recording on a background thread, like
+    paho delivers messages. For deterministic runs, call `advance()` or `play()`
+    instead. Publishes are acknowledged immediately, delivered to matching
+    subscriptions and captured in `published`.
+    """
+
+    def __init__(
+        self,
+        recording: str | Sequence[RecordedMessage] = (),
+        speed: float = 1.0,
+    ):
+        """
+        Args:
+            recording (str | Sequence[RecordedMessage]): Path of a recording or the messages to replay.
+            speed (float): Replay speed relative to real time, `0` replays as fast as possible.
+        """
+        super().__init__(host="replay", port=0)
+        self.messages = read_recording(recording) if isinstance(recording, str) else list(recording)
+        self.speed = speed
+        self.position = 0.0         # replay time of the last delivered message in [s]
+        self.published: list[RecordedMessage] = []
+        self.retained: dict[str, str] = {}
+        self._index = 0
+        self._mids = itertools.count(1)
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._finished = threading.Event()
+
+    def connect(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+
+        self._stop.clear()
+        self._finished.clear()
+        self._thread = threading.Thread(target=self._replay, name="mqtt-replay", daemon=True)
+        self._thread.start()
+
+    def disconnect(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self._thread = None
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """Block until the replay finished. Returns `False` on timeout."""
+        return self._finished.wait(timeout)
+
+    def advance(self, seconds: float) -> int:
+        """Deliver the messages of the next `seconds` of the recording. Returns the number delivered."""
+        until = self.position + seconds
+        delivered = 0
+        while self._index < len(self.messages) and self.messages[self._index].t <= until:
+            self._deliver_next()
+            delivered += 1
+
+        self.position = max(self.position, until)
+        return delivered
+
+    def play(self) -> int:
+        """Deliver the rest of the recording at once."""
+        delivered = len(self.messages) - self._index
+        while self._index < len(self.messages):
+            self._deliver_next()
+        return delivered
+
+    def _deliver_next(self) -> None:
+        message = self.messages[self._index]
+        self._index += 1
+        self.position = message.t
+        self._dispatch(message.topic, message.payload)
+        return
+
+    def _replay(self) -> None:
+        start = time.monotonic() - (self.position / self.speed if self.speed > 0 else 0.0)
+        while self._index < len(self.messages) and not self._stop.is_set():
+            if self.speed > 0:
+                delay = start + self.messages[self._index].t / self.speed - time.monotonic()
+                if delay > 0 and self._stop.wait(delay):
+                    break
+            self._deliver_next()
+
+        if self._index == len(self.messages):
+            logger.info(f"Replayed {len(self.messages)} messages.")
+            self._finished.set()
+        return
+
+    def _subscribe_broker(self, topic_filter: str) -> None:
+        # like a broker, hand the retained messages to the new subscription
+        for retained_topic, payload in list(self.retained.items()):
+            if topic_matches(topic_filter, retained_topic):
+                self._dispatch(retained_topic, payload, retain=True)
+        return
+
+    def _send(self, topic: str, payload: Any, qos: int, retain: bool) -> mqtt.MQTTMessageInfo:
+        data = payload.decode() if isinstance(payload, bytes) else str(payload)
+        self.published.append(RecordedMessage(t=self.position, topic=topic, payload=data, retain=retain))
+        if retain:
+            self.retained[topic] = data
+
+        self._dispatch(topic, data, retain=retain)
+        info = mqtt.MQTTMessageInfo(next(self._mids))
+        info.rc = mqtt.MQTT_ERR_SUCCESS
+        self._on_publish(None, None, info.mid)
+        return info
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Record MQTT traffic for replay")
+    parser.add_argument("--host", required=True, help="MQTT broker")
+    parser.add_argument("--port", type=int, default=1883)
+    parser.add_argument("--username", default=None)
+    parser.add_argument("--password", default=None)
+    parser.add_argument("--output", required=True, help="Recording to append to, `.gz` for compression")
+    parser.add_argument(
+        "--topic", action="append", default=None, help="Topic filter to record, may be repeated (default: `#`)"
+    )
+    args = parser.parse_args()
+
+    client = Mqtt(args.host, username=args.username, password=args.password, port=args.port)
+    recorder = MqttRecorder(client, args.output, topics=args.topic or ["#"])
+    recorder.start()
+    client.connect()
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        client.disconnect()
+        recorder.stop()
+        logger.info(f"Recorded {recorder.count} messages to {args.output}.")
@@ -1,8 +1,11 @@
-from ctrlsolar.panels.panels import GenericPanel, PanelGroup
+from ctrlsolar.panels.abstract import ProductionSeries
+from ctrlsolar.panels.panels import GenericPanel, PanelGroup, create_panels
 from ctrlsolar.panels.weather import OpenMeteoWeather
 
 __all__ = [
     "GenericPanel", 
     "PanelGroup",
+    "create_panels",
     "OpenMeteoWeather",
+    "ProductionSeries",
 ]
\ No newline at end of file
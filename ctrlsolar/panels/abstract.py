@@ -1,13 +1,72 @@
 from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+import numpy as np
 import pandas as pd
 
 
 class Weather(ABC):
+    resolution: timedelta  # length of one forecast slot
+
     @abstractmethod
     def get(self) -> pd.DataFrame:
         pass    
 
+    @property
+    @abstractmethod
+    def version(self) -> int:
+        """Counter that changes whenever the data returned by `get` changes."""
+        pass
+
+
+@dataclass(frozen=True)
+class ProductionSeries:
+    """Expected energy per forecast slot.
+
+    Slots are indexed from 00:00 of the first forecast day, `times` holds the
+    (naive, local) start of every slot.
+    """
+    times: np.ndarray       # datetime64[ns]
+    energy: np.ndarray      # in [Wh] per slot
+    resolution: timedelta
+
+    @property
+    def slot_hours(self) -> float:
+        return self.resolution / timedelta(hours=1)
+
+    @property
+    def slots_per_day(self) -> int:
+        return int(timedelta(days=1) / self.resolution)
+
+    @property
+    def power(self) -> np.ndarray:
+        """Average power in [W] per slot."""
+        return self.energy / self.slot_hours
+
+    def slot(self, time: datetime) -> int:
+        """Index of the slot containing the local `time`."""
+        offset = np.datetime64(time.replace(tzinfo=None), "ns") - self.times[0]
+        return int(offset // np.timedelta64(self.resolution))
+
+    def hourly(self) -> np.ndarray:
+        """Energy in [Wh] per hour."""
+        per_hour = max(int(timedelta(hours=1) / self.resolution), 1)
+        n_hours = len(self.energy) // per_hour
+        return self.energy[: n_hours * per_hour].reshape(n_hours, per_hour).sum(axis=1)
+
+
 class Panel(ABC):
     @abstractmethod
+    def predicted_production(self, weather: Weather) -> ProductionSeries:
+        pass
+
     def predicted_production_by_hour(self, weather: Weather) -> dict[int, float]:
-        pass
\ No newline at end of file
+        """Expected energy in [Wh] per hour, keyed by hours since 00:00 of the first forecast day."""
+        energy = self.predicted_production(weather).hourly().tolist()
+        return dict(zip(range(len(energy)), energy))
+
+    @property
+    @abstractmethod
+    def config_key(self) -> tuple[object, ...]:
+        """Hashable description of the panel configuration."""
+        pass
@@ -0,0 +1,141 @@
+from typing import Any, Callable, Iterator, Optional
+from dataclasses import dataclass
+from ctrlsolar.clock import get_clock
+import hashlib
+import json
+import logging
+import os
+import tempfile
+
+logger = logging.getLogger(__name__)
+
+__all__ = ["WeatherCache", "CacheEntry"]
+
+
+@dataclass(frozen=True)
+class CacheEntry:
+    data: dict[str, Any]
+    fetched_at: float  # unix timestamp of the download, by the global clock
+
+    @property
+    def age_s(self) -> float:
+        return get_clock().now().timestamp() - self.fetched_at
+
+
+class WeatherCache:
+    """File-backed cache for raw weather API responses.
+
+    Entries are stored as one JSON file per key in `directory`. A key is any
+    JSON-serializable dict (e.g. latitude, longitude, date and variables).
+    Entries older than `ttl_s` are considered expired, but stay on disk so they
+    can still be served as a fallback when a download fails. Entries older than
+    `keep_s` (default: a day's worth of TTLs) are deleted whenever a new one is stored.
+    Ages are measured with the global clock.
+    """
+
+    def __init__(self, directory: str, ttl_s: float = 3600, keep_s: Optional[float] = None):
+        self.directory = directory
+        self.ttl_s = ttl_s
+        self.keep_s = keep_s if keep_s is not None else 24 * ttl_s
+        os.makedirs(self.directory, exist_ok=True)
+
+    def _path(self, key: dict[str, Any]) -> str:
+        digest = hashlib.sha1(json.dumps(key, sort_keys=True).encode()).hexdigest()
+        return os.path.join(self.directory, f"{digest}.json")
+
+    def load(self, key: dict[str, Any], allow_expired: bool = False) -> Optional[CacheEntry]:
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as file:
+                content = json.load(file)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable weather cache file {path}: {e}")
+            return None
+
+        if content.get("key") != key:
+            return None
+
+        entry = CacheEntry(data=content["data"], fetched_at=float(content["fetched_at"]))
+        if not allow_expired and entry.age_s > self.ttl_s:
+            return None
+
+        return entry
+
+    def _files(self) -> list[str]:
+        """Paths of all entries, most recently written first."""
+        paths: list[tuple[float, str]] = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(".json"):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                paths.append((os.stat(path).st_mtime, path))
+            except OSError:
+                continue     # removed concurrently
+
+        return [path for _, path in sorted(paths, reverse=True)]
+
+    def entries(self) -> Iterator[tuple[dict[str, Any], CacheEntry]]:
+        """All readable entries with their keys, expired or not, most recently written first.
+
+        Files are only parsed as the iteration reaches them, callers looking for
+        the newest match can stop early.
+        """
+        for path in self._files():
+            try:
+                with open(path, "r", encoding="utf-8") as file:
+                    content = json.load(file)
+                yield content["key"], CacheEntry(data=content["data"], fetched_at=float(content["fetched_at"]))
+            except (OSError, ValueError, KeyError) as e:
+                logger.warning(f"Ignoring unreadable weather cache file {path}: {e}")
+
+        return
+
+    def store(
+        self,
+        key: dict[str, Any],
+        data: dict[str, Any],
+        keep: Optional[Callable[[dict[str, Any]], bool]] = None,
+    ) -> CacheEntry:
+        """Write an entry, then delete the entries older than `keep_s` or whose key fails `keep`."""
+        entry = CacheEntry(data=data, fetched_at=get_clock().now().timestamp())
+        content = {"key": key, "fetched_at": entry.fetched_at, "data": data}
+
+        # write to a temporary file first, so a crash never leaves a truncated entry
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as file:
+                json.dump(content, file)
+            os.replace(tmp_path, self._path(key))
+        except OSError as e:
+            logger.warning(f"Failed to write weather cache: {e}")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+        self._prune(keep, current=self._path(key))
+        return entry
+
+    def _prune(self, keep: Optional[Callable[[dict[str, Any]], bool]], current: str) -> None:
+        now = get_clock().now().timestamp()
+        for path in self._files():
+            if path == current:
+                continue
+
+            try:
+                with open(path, "r", encoding="utf-8") as file:
+                    content = json.load(file)
+                stale = now - float(content["fetched_at"]) > self.keep_s or (
+                    keep is not None and not keep(content["key"])
+                )
+            except (OSError, ValueError, KeyError):
+                stale = True    # unreadable, it would be ignored anyway
+
+            if stale:
+                try:
+                    os.remove(path)
+                except OSError as e:
+                    logger.warning(f"Failed to delete weather cache file {path}: {e}")
+
+        return
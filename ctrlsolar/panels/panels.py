@@ -1,11 +1,45 @@
 from pvlib.irradiance import get_total_irradiance   # type:ignore
-from ctrlsolar.panels.abstract import Panel, Weather
+from ctrlsolar.panels.abstract import Panel, ProductionSeries, Weather
+from datetime import timedelta
 import numpy as np
+import pandas as pd
 import logging
-from typing import Optional, Sequence
+from typing import Any, Optional, Sequence
 
 logger = logging.getLogger(__name__)
 
+
+def poa_global_matrix(
+    tilts: np.ndarray,
+    azimuths: np.ndarray,
+    weather: pd.DataFrame,
+) -> np.ndarray:
+    """Plane-of-array irradiance for N orientations over T time steps in one pass.
+
+    Args:
+        tilts (np.ndarray): Surface tilts in degree, shape (N,).
+        azimuths (np.ndarray): Surface azimuths in degree, shape (N,).
+        weather (pd.DataFrame): Weather data as returned by `Weather.get`.
+
+    Returns:
+        np.ndarray: `poa_global` in [W/m^2], shape (N, T).
+    """
+    poa = get_total_irradiance( # type: ignore
+        surface_tilt=tilts[:, np.newaxis],
+        surface_azimuth=azimuths[:, np.newaxis],
+        solar_zenith=weather["apparent_zenith"].to_numpy(dtype=float),
+        solar_azimuth=weather["azimuth"].to_numpy(dtype=float),
+        dni=weather["DNI"].to_numpy(dtype=float),
+        ghi=weather["GHI"].to_numpy(dtype=float),
+        dhi=weather["DHI"].to_numpy(dtype=float),
+    )
+    return np.asarray(poa["poa_global"], dtype=float)
+
+
+def _hour_of_day(forecast: pd.DataFrame) -> np.ndarray:
+    return np.asarray(pd.DatetimeIndex(forecast["times"]).hour)
+
+
 class GenericPanel(Panel):
     def __init__(
         self,
@@ -22,6 +56,7 @@ class GenericPanel(Panel):
             azimuth (float): Azimuth direction of panel in degree, 0 = North, 90 = East, 180 = South, 270 = West
             area (float): Size of the panel in [m^2]
             efficiency (float): Efficiency of the panel, 0-1.
+            calibration (Optional[list[float]]): Correction factor for every hour of the day.
         """
         self.tilt = tilt
         self.azimuth = azimuth
@@ -29,33 +64,135 @@ class GenericPanel(Panel):
         self.efficiency = efficiency
         self.calibration = calibration if calibration is not None else 24 * [1]
 
-    def predicted_production_by_hour(self, weather: Weather) -> dict[int, float]:
-        weather_today = weather.get()
-        poa = get_total_irradiance( # type: ignore
-            surface_tilt=self.tilt,
-            surface_azimuth=self.azimuth,
-            solar_zenith=weather_today["apparent_zenith"],
-            solar_azimuth=weather_today["azimuth"],
-            dni=weather_today["DNI"],
-            ghi=weather_today["GHI"],
-            dhi=weather_today["DHI"],
+    @property
+    def config_key(self) -> tuple[object, ...]:
+        return (self.tilt, self.azimuth, self.area, self.efficiency, tuple(self.calibration))
+
+    def predicted_production(self, weather: Weather) -> ProductionSeries:
+        forecast = weather.get()
+        poa = poa_global_matrix(
+            np.array([self.tilt], dtype=float), np.array([self.azimuth], dtype=float), forecast
+        )[0]
+        slot_hours = weather.resolution / timedelta(hours=1)
+        energy = poa * self.area * self.efficiency * slot_hours     # in Wh
+        energy = np.asarray(self.calibration, dtype=float)[_hour_of_day(forecast)] * energy
+
+        return ProductionSeries(
+            times=forecast["times"].to_numpy(dtype="datetime64[ns]"),
+            energy=energy,
+            resolution=weather.resolution,
         )
-        energy = poa["poa_global"] * self.area * self.efficiency    # type: ignore # in Wh
-        energy = self.calibration * energy                          # type: ignore
-        energy = [float(x) for x in energy.tolist()]                # type: ignore
-        energy_by_hour = dict(zip(range(24), energy))
 
-        return energy_by_hour
-    
+
 class PanelGroup(Panel):
     def __init__(self, panels: Sequence[Panel,]):
         self._panels = panels
+        self._layout_key: tuple[object, ...] | None = None
+        self._layout: tuple[np.ndarray, np.ndarray, np.ndarray] | None = None
+        self._others: list[Panel] = []
+
+    @property
+    def config_key(self) -> tuple[object, ...]:
+        return tuple(x.config_key for x in self._panels)
+
+    def _flatten(self) -> tuple[list[GenericPanel], list[Panel]]:
+        generic: list[GenericPanel] = []
+        others: list[Panel] = []
+        for panel in self._panels:
+            if isinstance(panel, GenericPanel):
+                generic.append(panel)
+            elif isinstance(panel, PanelGroup):
+                sub_generic, sub_others = panel._flatten()
+                generic.extend(sub_generic)
+                others.extend(sub_others)
+            else:
+                others.append(panel)
+
+        return generic, others
+
+    def _build_layout(self) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Merge panels of equal orientation into one effective area x efficiency per hour."""
+        key = self.config_key
+        if self._layout is not None and key == self._layout_key:
+            return self._layout
+
+        generic, self._others = self._flatten()
+        weights: dict[tuple[float, float], np.ndarray] = {}
+        for panel in generic:
+            orientation = (float(panel.tilt), float(panel.azimuth))
+            weight = panel.area * panel.efficiency * np.asarray(panel.calibration, dtype=float)
+            if orientation in weights:
+                weights[orientation] = weights[orientation] + weight
+            else:
+                weights[orientation] = weight
+
+        orientations = list(weights.keys())
+        tilts = np.array([x[0] for x in orientations], dtype=float)
+        azimuths = np.array([x[1] for x in orientations], dtype=float)
+        weight_matrix = (
+            np.vstack(list(weights.values())) if weights else np.zeros((0, 24), dtype=float)
+        )
+
+        logger.debug(
+            f"Merged {len(generic)} panels into {len(orientations)} orientations."
+        )
+        self._layout = (tilts, azimuths, weight_matrix)
+        self._layout_key = key
+        return self._layout
+
+    def predicted_production(self, weather: Weather) -> ProductionSeries:
+        return predicted_production_batch([self], weather)[0]
+
+
+def create_panels(panels: Sequence[dict[str, Any]]) -> PanelGroup:
+    """Panel group of the `panels` entries of the configuration."""
+    return PanelGroup([
+        GenericPanel(
+            tilt=float(panel["tilt"]),
+            azimuth=float(panel["azimuth"]),
+            area=float(panel["area"]),
+            efficiency=float(panel["efficiency"]),
+            calibration=panel.get("calibration"),
+        ) for panel in panels])
+
+
+def predicted_production_batch(
+    groups: Sequence[PanelGroup], weather: Weather
+) -> list[ProductionSeries]:
+    """Production forecasts of several panel groups under the same weather.
+
+    Irradiance is computed once for the union of all orientations, so panel
+    groups of many devices at one location cost a single pvlib call.
+    """
+    forecast = weather.get()
+    times = forecast["times"].to_numpy(dtype="datetime64[ns]")
+    hours = _hour_of_day(forecast)
+    slot_hours = weather.resolution / timedelta(hours=1)
+
+    layouts = [group._build_layout() for group in groups]
+    index: dict[tuple[float, float], int] = {}
+    rows: list[np.ndarray] = []
+    for tilts, azimuths, _ in layouts:
+        rows.append(np.array(
+            [index.setdefault((t, a), len(index)) for t, a in zip(tilts.tolist(), azimuths.tolist())],
+            dtype=int,
+        ))
+
+    poa = np.zeros((0, len(forecast)), dtype=float)
+    if index:
+        orientations = np.array(list(index.keys()), dtype=float)
+        poa = poa_global_matrix(orientations[:, 0], orientations[:, 1], forecast)
+
+    result: list[ProductionSeries] = []
+    for group, (_, _, weights), group_rows in zip(groups, layouts, rows):
+        energy = np.zeros(len(forecast), dtype=float)
+        if group_rows.size > 0:
+            slot_weights = weights[:, hours] * slot_hours
+            energy += np.einsum("nt,nt->t", poa[group_rows], slot_weights)    # in Wh
 
-    def predicted_production_by_hour(self, weather: Weather) -> dict[int, float]:
-        energy = [list(x.predicted_production_by_hour(weather).values()) for x in self._panels]
-        energy = np.sum(np.column_stack(energy), axis=-1, keepdims=False).tolist()
-        energy_by_hour = dict(zip(range(24), energy))
+        for panel in group._others:
+            energy += panel.predicted_production(weather).energy
 
-        return energy_by_hour
+        result.append(ProductionSeries(times=times, energy=energy, resolution=weather.resolution))
 
-        
\ No newline at end of file
+    return result
@@ -0,0 +1,136 @@
+from pvlib.location import Location # type:ignore
+from datetime import timedelta
+from typing import Optional, cast
+import numpy as np
+import pandas as pd
+import logging
+import os
+import tempfile
+
+logger = logging.getLogger(__name__)
+
+__all__ = ["SolarPositionTable"]
+
+_COLUMNS: tuple[str, ...] = ("apparent_zenith", "azimuth")
+
+
+class SolarPositionTable:
+    """Precomputed solar position of a location for whole years.
+
+    Solar position only depends on location and time, so it is computed once per
+    calendar year at a fixed `resolution` and looked up by index afterwards. With
+    `cache_dir` set, each yearly table is stored as `.npy` and memory-mapped on
+    later runs. Timestamps that do not fall on the grid are computed directly.
+    """
+
+    def __init__(
+        self,
+        location: Location,
+        resolution: timedelta = timedelta(hours=1),
+        cache_dir: Optional[str] = None,
+    ):
+        self.location = location
+        self.resolution = resolution
+        self.cache_dir = cache_dir
+        self._step_ns = int(resolution.total_seconds() * 1e9)
+        self._tables: dict[int, tuple[int, np.ndarray]] = {}
+        if self.cache_dir is not None:
+            os.makedirs(self.cache_dir, exist_ok=True)
+
+    def _path(self, year: int) -> str:
+        name = (
+            f"solpos_{self.location.latitude:.4f}_{self.location.longitude:.4f}_"
+            f"{self.location.altitude:.0f}_{year}_{int(self.resolution.total_seconds())}s.npy"
+        )
+        return os.path.join(cast(str, self.cache_dir), name)
+
+    def _grid(self, year: int) -> pd.DatetimeIndex:
+        start = pd.Timestamp(year=year, month=1, day=1, tz="UTC")
+        end = pd.Timestamp(year=year + 1, month=1, day=1, tz="UTC")
+        # one day of margin on both sides covers every UTC offset
+        return pd.date_range(
+            start - pd.Timedelta(days=1), end + pd.Timedelta(days=1),
+            freq=self.resolution, inclusive="left",
+        )
+
+    def _compute(self, times: pd.DatetimeIndex) -> np.ndarray:
+        solpos = self.location.get_solarposition(times)
+        return np.column_stack([solpos[c].to_numpy(dtype=float) for c in _COLUMNS])
+
+    def table(self, year: int) -> tuple[int, np.ndarray]:
+        """Return the first grid timestamp in [ns since epoch, UTC] and the (T, 2) table of `year`."""
+        if year in self._tables:
+            return self._tables[year]
+
+        grid = self._grid(year)
+        start_ns = int(grid[0].value)
+        values: np.ndarray | None = None
+        if self.cache_dir is not None:
+            path = self._path(year)
+            if os.path.exists(path):
+                try:
+                    values = np.load(path, mmap_mode="r")
+                    if values.shape != (len(grid), len(_COLUMNS)):
+                        values = None
+                except (OSError, ValueError) as e:
+                    logger.warning(f"Ignoring unreadable solar position table {path}: {e}")
+                    values = None
+
+        if values is None:
+            logger.info(f"Precomputing solar position table for {year}.")
+            values = self._compute(grid)
+            if self.cache_dir is not None:
+                values = self._store(self._path(year), values)
+
+        self._tables[year] = (start_ns, values)
+        return self._tables[year]
+
+    def _store(self, path: str, values: np.ndarray) -> np.ndarray:
+        # a unique temporary file, other processes may build the same table at the same time
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp.npy")
+        try:
+            with os.fdopen(fd, "wb") as file:
+                np.save(file, values)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"Failed to write solar position table {path}: {e}")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return values
+
+        return np.load(path, mmap_mode="r")
+
+    def localize(self, times: pd.DatetimeIndex) -> pd.DatetimeIndex:
+        """Interpret naive timestamps as local time of the location and convert to UTC."""
+        if times.tz is None:
+            times = times.tz_localize(
+                self.location.tz,
+                ambiguous=np.zeros(len(times), dtype=bool),
+                nonexistent="shift_forward",
+            )
+        return times.tz_convert("UTC")
+
+    def lookup(self, times: pd.DatetimeIndex) -> pd.DataFrame:
+        """Return `apparent_zenith` and `azimuth` for `times`, indexed like `times`."""
+        utc = self.localize(times)
+        ns = utc.as_unit("ns").asi8
+        result = np.full((len(ns), len(_COLUMNS)), np.nan, dtype=float)
+        missing = np.ones(len(ns), dtype=bool)
+
+        for year in np.unique(utc.year):
+            start_ns, values = self.table(int(year))
+            in_year = np.asarray(utc.year == year)
+            offset = ns - start_ns
+            index = offset // self._step_ns
+            hit = (
+                in_year & (offset % self._step_ns == 0)
+                & (index >= 0) & (index < values.shape[0])
+            )
+            result[hit] = values[index[hit]]
+            missing &= ~hit
+
+        if missing.any():
+            result[missing] = self._compute(utc[missing])
+
+        return pd.DataFrame(result, index=times, columns=list(_COLUMNS))
+
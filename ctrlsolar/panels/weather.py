@@ -1,14 +1,34 @@
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import pandas as pd
 from pvlib.location import Location # type:ignore
 from datetime import datetime, timedelta
+from dataclasses import dataclass
 import logging
-from typing import TypedDict, cast
+import threading
+from typing import Any, Optional, TypedDict, cast
 from ctrlsolar.panels.abstract import Weather
+from ctrlsolar.panels.cache import WeatherCache
+from ctrlsolar.panels.solarposition import SolarPositionTable
+from ctrlsolar.clock import get_clock
 from ctrlsolar.localization import get_timezone
 
 logger = logging.getLogger(__name__)
 
+# Open-Meteo parameter name of the time series per supported resolution
+_RESOLUTIONS: dict[timedelta, str] = {
+    timedelta(hours=1): "hourly",
+    timedelta(minutes=15): "minutely_15",
+}
+
+_VARIABLES: tuple[str, ...] = (
+    "diffuse_radiation",
+    "direct_normal_irradiance",
+    "global_tilted_irradiance",
+    "shortwave_radiation",
+)
+
 
 class _OpenMeteoHourly(TypedDict):
     time: list[str]
@@ -18,8 +38,25 @@ class _OpenMeteoHourly(TypedDict):
     shortwave_radiation: list[float]
 
 
-class _OpenMeteoResponse(TypedDict):
+class _OpenMeteoResponse(TypedDict, total=False):
     hourly: _OpenMeteoHourly
+    minutely_15: _OpenMeteoHourly
+
+
+@dataclass(frozen=True)
+class _Snapshot:
+    forecast: pd.DataFrame
+    age: datetime       # time of the download, or of the last failed attempt
+    date: str           # first day covered by the forecast
+    end_date: str       # last day covered by the forecast
+    version: int
+    requested: tuple[str, str] = ("", "")   # date range asked for by the last refresh
+
+
+def _starting_on(hourly: _OpenMeteoHourly, date: str) -> _OpenMeteoHourly:
+    """Drop the time steps of `hourly` before `date`, local times are ISO strings."""
+    keep = [ii for ii, time in enumerate(hourly["time"]) if time[:10] >= date]
+    return cast(_OpenMeteoHourly, {name: [values[ii] for ii in keep] for name, values in hourly.items()})
 
 
 class OpenMeteoWeather(Weather):
@@ -29,34 +66,176 @@ class OpenMeteoWeather(Weather):
         longitude: float,
         timezone: str,
         update_every: timedelta = timedelta(hours=1),
+        horizon: timedelta = timedelta(hours=48),
+        resolution: timedelta = timedelta(hours=1),
+        cache_dir: Optional[str] = None,
+        base_url: str = "https://api.open-meteo.com/v1/forecast",
+        timeout: tuple[float, float] = (5.0, 20.0),
+        retries: int = 3,
+        backoff_s: float = 2.0,
     ):
+        """Irradiance forecast from Open-Meteo.
+
+        The forecast starts at 00:00 of the current day and covers at least `horizon`
+        from now. All days are fetched with a single request.
+
+        Args:
+            latitude (float): Latitude of the site in degree.
+            longitude (float): Longitude of the site in degree.
+            timezone (str): Timezone of the site, e.g. "Europe/Berlin".
+            update_every (timedelta): Refresh interval of the forecast.
+            horizon (timedelta): Minimum look-ahead of the forecast from now.
+            resolution (timedelta): Length of a forecast slot, either 1 hour or 15 minutes.
+            cache_dir (Optional[str]): If set, downloaded forecasts and solar position tables
+                are persisted in this directory. Forecasts are used on startup and whenever
+                a download fails.
+            base_url (str): Forecast API endpoint.
+            timeout (tuple[float, float]): Connect and read timeout of a request in [s].
+            retries (int): Number of retries of a failed request.
+            backoff_s (float): Backoff factor between retries in [s], doubled on every retry.
+        """
         self.latitude = latitude
         self.longitude = longitude
         self.timezone = timezone
         self.location = Location(latitude, longitude, tz=timezone)
         self.update_every = update_every
-        self._forecast: pd.DataFrame | None = None
-        self._forecast_age: datetime | None = None
+        self.horizon = horizon
+        if resolution not in _RESOLUTIONS:
+            raise ValueError(
+                f"Unsupported forecast resolution {resolution}, expected one of {list(_RESOLUTIONS)}."
+            )
+        self.resolution = resolution
+        self.base_url = base_url
+        self.timeout = timeout
+        self.solar_position = SolarPositionTable(
+            self.location, resolution=resolution, cache_dir=cache_dir
+        )
+        self._cache = (
+            WeatherCache(cache_dir, ttl_s=update_every.total_seconds())
+            if cache_dir is not None else None
+        )
 
-    def _get_forecast(self, date: str):
+        retry = Retry(
+            total=retries,
+            backoff_factor=backoff_s,
+            status_forcelist=(429, 500, 502, 503, 504),
+            allowed_methods=frozenset({"GET"}),
+        )
+        self._session = requests.Session()
+        self._session.mount("https://", HTTPAdapter(max_retries=retry, pool_maxsize=2))
+        self._session.mount("http://", HTTPAdapter(max_retries=retry, pool_maxsize=2))
+
+        self._snapshot: _Snapshot | None = None
+        self._refresh_lock = threading.Lock()
+        self._prefetch_thread: threading.Thread | None = None
+        self._prefetch_stop = threading.Event()
+        # set while a background thread or task keeps the forecast up to date
+        self.background_refresh: bool = False
+
+    @property
+    def version(self) -> int:
+        snapshot = self._snapshot
+        return snapshot.version if snapshot is not None else 0
+
+    def _date_range(self, now: datetime) -> tuple[str, str]:
+        return now.strftime("%Y-%m-%d"), (now + self.horizon).strftime("%Y-%m-%d")
+
+    def _cache_key(self, date: str, end_date: str) -> dict[str, Any]:
+        return {
+            "latitude": round(self.latitude, 4),
+            "longitude": round(self.longitude, 4),
+            "timezone": self.timezone,
+            "start_date": date,
+            "end_date": end_date,
+            _RESOLUTIONS[self.resolution]: list(_VARIABLES),
+        }
+
+    def _newest_on_disk(self, date: str) -> tuple[_OpenMeteoHourly, float] | None:
+        """The most recent forecast on disk that covers `date`, cut to start on that day."""
+        if self._cache is None:
+            return None
+
+        # entries come newest first, only the files before the first match are parsed
+        for key, entry in self._cache.entries():
+            if self._is_site(key) and key.get("start_date", "") <= date <= key.get("end_date", ""):
+                return _starting_on(cast(_OpenMeteoHourly, entry.data), date), entry.fetched_at
+
+        return None
+
+    def _is_site(self, key: dict[str, Any]) -> bool:
+        """Whether a cache key belongs to this site and variables, for any dates."""
+        dates = ("start_date", "end_date")
+        site = self._cache_key("", "")
+        return {k: v for k, v in key.items() if k not in dates} == {k: v for k, v in site.items() if k not in dates}
+
+    def _download(self, date: str, end_date: str) -> _OpenMeteoHourly:
         weather_url = (
-            f"https://api.open-meteo.com/v1/forecast?"
+            f"{self.base_url}?"
             f"latitude={self.latitude}&longitude={self.longitude}&"
-            "hourly=diffuse_radiation,direct_normal_irradiance,global_tilted_irradiance,shortwave_radiation&"
-            f"timezone={self.timezone}&start_date={date}&end_date={date}"
+            f"{_RESOLUTIONS[self.resolution]}={','.join(_VARIABLES)}&"
+            f"timezone={self.timezone}&start_date={date}&end_date={end_date}"
         )
 
-        response: requests.Response = requests.get(weather_url)
+        response: requests.Response = self._session.get(weather_url, timeout=self.timeout)
+        response.raise_for_status()
         data = cast(_OpenMeteoResponse, response.json())
-        hourly: _OpenMeteoHourly = data["hourly"]
+        return data[_RESOLUTIONS[self.resolution]]  # type: ignore
+
+    def _fetch(self, date: str, end_date: str) -> tuple[_OpenMeteoHourly, datetime] | None:
+        """Return the raw forecast and its download time, preferring a fresh disk entry.
 
+        Returns `None` if the download failed, but the forecast in memory still covers `date`.
+        """
+        key = self._cache_key(date, end_date)
+        snapshot = self._snapshot
+        current_dates = snapshot.requested if snapshot is not None else None
+        if self._cache is not None and current_dates != (date, end_date):
+            entry = self._cache.load(key)
+            if entry is not None:
+                logger.info(f"Loaded weather forecast for {date} from disk cache.")
+                return (
+                    cast(_OpenMeteoHourly, entry.data),
+                    datetime.fromtimestamp(entry.fetched_at, get_timezone()),
+                )
+
+        try:
+            hourly = self._download(date, end_date)
+        except (requests.RequestException, ValueError, KeyError) as e:
+            logger.warning(f"Failed to download weather forecast: {e}")
+            # e.g. yesterday's forecast still covers today after midnight
+            newest = self._newest_on_disk(date)
+            if newest is not None:
+                hourly, fetched_at = newest
+                logger.warning(
+                    f"Serving last good forecast from disk cache "
+                    f"({(get_clock().now().timestamp() - fetched_at) / 60:.0f} min old)."
+                )
+                return hourly, get_clock().now()
+
+            if snapshot is not None and snapshot.date <= date <= snapshot.end_date:
+                logger.warning("Keeping previous forecast.")
+                return None
+
+            raise
+
+        if self._cache is not None:
+            # forecasts of this site that end before today are of no use anymore, not even as a fallback
+            self._cache.store(
+                key,
+                cast(dict[str, Any], hourly),
+                keep=lambda other: not self._is_site(other) or other.get("end_date", "") >= date,
+            )
+
+        return hourly, get_clock().now()
+
+    def _to_frame(self, hourly: _OpenMeteoHourly) -> pd.DataFrame:
         times: pd.DatetimeIndex = pd.to_datetime(hourly["time"])
         dhi: pd.Series[float] = pd.Series(hourly["diffuse_radiation"], index=times)
         dni: pd.Series[float] = pd.Series(hourly["direct_normal_irradiance"], index=times)
         gti: pd.Series[float] = pd.Series(hourly["global_tilted_irradiance"], index=times)
         ghi: pd.Series[float] = pd.Series(hourly["shortwave_radiation"], index=times)
 
-        solpos = self.location.get_solarposition(times)
+        solpos = self.solar_position.lookup(times)
         df: pd.DataFrame = pd.DataFrame(
             {
                 "times": times,
@@ -71,15 +250,118 @@ class OpenMeteoWeather(Weather):
 
         return df
 
+    def _refresh(self, now: datetime, lead: timedelta = timedelta(0)) -> None:
+        date, end_date = self._date_range(now)
+        with self._refresh_lock:
+            # a concurrent caller may have refreshed while we waited for the lock, do not download twice
+            if not self._is_expired(self._snapshot, now, lead=lead):
+                return
+
+            result = self._fetch(date, end_date)
+            snapshot = self._snapshot
+            if result is None:
+                snapshot = cast(_Snapshot, snapshot)
+                forecast, version = snapshot.forecast, snapshot.version
+                if snapshot.date != date:
+                    # the forecast has to start at 00:00 of the current day
+                    forecast = forecast[forecast["times"] >= pd.Timestamp(date)]
+                    version += 1
+                self._snapshot = _Snapshot(
+                    forecast=forecast,
+                    age=get_clock().now(),
+                    date=date,
+                    end_date=snapshot.end_date,
+                    version=version,
+                    requested=(date, end_date),
+                )
+                return
+
+            hourly, fetched_at = result
+            # swap the whole snapshot at once, readers never see a partial update
+            self._snapshot = _Snapshot(
+                forecast=self._to_frame(hourly),
+                age=fetched_at,
+                date=date,
+                end_date=hourly["time"][-1][:10] if hourly["time"] else date,
+                version=(snapshot.version if snapshot is not None else 0) + 1,
+                requested=(date, end_date),
+            )
+        return
+
+    def _is_expired(self, snapshot: _Snapshot | None, now: datetime, lead: timedelta = timedelta(0)) -> bool:
+        if snapshot is None:
+            return True
+        # a failed refresh keeps a shorter forecast, it is retried once it is old, not on every call
+        if snapshot.requested != self._date_range(now):
+            return True
+        return now - snapshot.age > self.update_every - lead
+
     def get(self) -> pd.DataFrame:
-        today = datetime.now(get_timezone()).today().strftime("%Y-%m-%d")
+        now = get_clock().now()
+        snapshot = self._snapshot
+
+        # while refreshed in the background, only block if there is nothing to serve at all
+        if snapshot is None or (not self.background_refresh and self._is_expired(snapshot, now)):
+            self._refresh(now)
+            snapshot = cast(_Snapshot, self._snapshot)
+
+        return snapshot.forecast
+
+    def refresh_if_due(self, lead: timedelta = timedelta(0)) -> float:
+        """Refresh the forecast if it expires within `lead`.
+
+        Returns the seconds until the next refresh is due. Raises if the download fails
+        and there is nothing to fall back to.
+        """
+        now = get_clock().now()
+        if self._is_expired(self._snapshot, now, lead=lead):
+            self._refresh(now, lead=lead)
+
+        snapshot = cast(_Snapshot, self._snapshot)
+        midnight = datetime.combine(
+            now.date() + timedelta(days=1), datetime.min.time(), tzinfo=now.tzinfo
+        )
+        horizon_rollover = datetime.combine(
+            (now + self.horizon).date() + timedelta(days=1), datetime.min.time(), tzinfo=now.tzinfo
+        ) - self.horizon
+        due = min(snapshot.age + self.update_every - lead, midnight, horizon_rollover)
+        return max((due - now).total_seconds(), 1.0)
+
+    def start_prefetch(self, lead: timedelta = timedelta(minutes=5)) -> None:
+        """Refresh the forecast in a background thread, `lead` ahead of its expiry."""
+        if self._prefetch_thread is not None and self._prefetch_thread.is_alive():
+            return
+
+        self._prefetch_stop.clear()
+        self._prefetch_thread = threading.Thread(
+            target=self._prefetch_loop,
+            args=(lead,),
+            name="weather-prefetch",
+            daemon=True,
+        )
+        self.background_refresh = True
+        self._prefetch_thread.start()
+        return
+
+    def stop_prefetch(self) -> None:
+        self._prefetch_stop.set()
+        if self._prefetch_thread is not None:
+            self._prefetch_thread.join(timeout=self.timeout[0] + self.timeout[1])
+        self._prefetch_thread = None
+        self.background_refresh = False
+        return
 
-        if self._forecast is None or self._forecast_age is None:
-            self._forecast = self._get_forecast(date=today)
-            self._forecast_age = datetime.now(get_timezone())
+    def _prefetch_loop(self, lead: timedelta) -> None:
+        retry_s = 60.0
+        while not self._prefetch_stop.is_set():
+            try:
+                wait_s = self.refresh_if_due(lead)
+                retry_s = 60.0
+            except Exception as e:
+                logger.warning(f"Background weather refresh failed, retrying in {retry_s:.0f} s: {e}")
+                wait_s = retry_s
+                retry_s = min(2 * retry_s, self.update_every.total_seconds())
 
-        if datetime.now(get_timezone()) - self._forecast_age > self.update_every:
-            self._forecast = self._get_forecast(date=today)
-            self._forecast_age = datetime.now(get_timezone())
+            self._prefetch_stop.wait(wait_s)
 
-        return self._forecast
\ No newline at end of file
+        return
@@ -0,0 +1,316 @@
+"""Runtimes driving the controllers of ctrlsolar.
+
+asyncio: `run_controllers` runs MQTT I/O, weather refreshes and all controllers
+as tasks of a single event loop. Controller updates run in worker threads, a
+slow update does not hold up MQTT I/O or the other controllers.
+
+Threads: `run_scheduled` drives a loop on the calling thread,
+`start_controller_thread` on a thread of its own, and `update_concurrently`
+updates many controllers at once on an executor. MQTT messages arrive on
+paho's network thread meanwhile.
+
+Both follow a `TickSchedule` aligned to the forecast slots.
+"""
+import asyncio
+import logging
+import math
+import threading
+import time
+from concurrent.futures import Executor, wait
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from functools import partial
+from typing import Callable, Optional, Sequence
+from ctrlsolar.clock import TickContext, get_clock
+from ctrlsolar.controller.abstract import Controller
+from ctrlsolar.controller.trigger import ChangeTrigger
+from ctrlsolar.panels.weather import OpenMeteoWeather
+
+logger = logging.getLogger(__name__)
+
+__all__ = [
+    "ControllerTask",
+    "TickLatency",
+    "TickSchedule",
+    "run_controllers",
+    "run_scheduled",
+    "refresh_weather",
+    "start_controller_thread",
+    "update_concurrently",
+]
+
+
+@dataclass
+class TickLatency:
+    count: int = 0
+    last_s: float = 0.0
+    max_s: float = 0.0
+    total_s: float = 0.0
+
+    @property
+    def mean_s(self) -> float:
+        return self.total_s / self.count if self.count > 0 else 0.0
+
+    def record(self, seconds: float) -> None:
+        self.count += 1
+        self.last_s = seconds
+        self.max_s = max(self.max_s, seconds)
+        self.total_s += seconds
+        return
+
+
+class TickSchedule:
+    """Update times at fixed offsets in every forecast slot, independent of how long updates take.
+
+    Ticks fall on multiples of `interval_s` after the start of each slot of
+    `slot_s` seconds in local time, and always on the slot start itself, so the
+    first update of a slot sees its new target. The waits are measured with
+    `time.monotonic`, the phase does not drift with the duration of the updates.
+
+    A tick falling due while an update still runs is skipped, not queued. Only
+    the start of a new slot is caught up right away. Late and skipped ticks
+    are logged and counted.
+    """
+
+    def __init__(self, interval_s: float, slot_s: float = 3600, tolerance_s: float = 1.0, name: str = ""):
+        if interval_s <= 0 or slot_s <= 0:
+            raise ValueError(f"Tick interval and slot length must be positive, got {interval_s} and {slot_s} s.")
+        self.interval_s = interval_s
+        self.slot_s = slot_s
+        self.tolerance_s = tolerance_s
+        self.name = name
+        self.ticks: int = 0
+        self.late: int = 0
+        self.skipped: int = 0
+        self.max_late_s: float = 0.0
+        self._due: Optional[float] = None           # next tick, epoch seconds
+        self._deadline: Optional[float] = None      # next tick, time.monotonic()
+        self._started: Optional[float] = None       # running update, epoch seconds
+
+    def _phase(self, now: datetime) -> float:
+        # slots start at local multiples of `slot_s`, epoch seconds are free of daylight saving jumps
+        offset = now.utcoffset()
+        return offset.total_seconds() % self.slot_s if offset is not None else 0.0
+
+    def _slot_start(self, t: float, phase: float) -> float:
+        return math.floor((t + phase) / self.slot_s) * self.slot_s - phase
+
+    def _next_after(self, t: float, phase: float) -> float:
+        start = self._slot_start(t, phase)
+        due = start + (math.floor((t - start) / self.interval_s) + 1) * self.interval_s
+        return min(due, start + self.slot_s)
+
+    def remaining_s(self) -> float:
+        """Seconds until the next tick, 0 if it is due."""
+        if self._deadline is None or self._due is None:
+            return 0.0
+
+        remaining = self._deadline - time.monotonic()
+        # the wall clock may trail the monotonic one slightly, a slot start must not be seen in the old slot
+        behind = self._due - get_clock().now().timestamp()
+        if 0 < behind <= self.tolerance_s:
+            remaining = max(remaining, behind)
+        return max(remaining, 0.0)
+
+    def begin(self) -> None:
+        """Mark the start of an update, scheduled if its tick is due, otherwise e.g. triggered."""
+        self._started = get_clock().now().timestamp()
+        if self.remaining_s() > 0:
+            return
+
+        self.ticks += 1
+        if self._deadline is None:
+            return
+
+        late_s = time.monotonic() - self._deadline
+        if late_s > self.tolerance_s:
+            self.late += 1
+            self.max_late_s = max(self.max_late_s, late_s)
+            logger.warning(f"Tick of {self.name} started {late_s:.1f} s late.")
+        return
+
+    def finish(self) -> None:
+        """Mark the end of an update and plan the next tick."""
+        now = get_clock().now()
+        t = now.timestamp()
+        phase = self._phase(now)
+        due = self._next_after(t, phase)
+
+        if self._started is not None:
+            overrun = 0
+            tick = self._next_after(self._started, phase)
+            while tick <= t:
+                overrun += 1
+                tick = self._next_after(tick, phase)
+
+            if overrun > 0 and self._slot_start(t, phase) > self._slot_start(self._started, phase):
+                # a new slot started during the update, its first tick runs now
+                due = self._slot_start(t, phase)
+                overrun -= 1
+            if overrun > 0:
+                self.skipped += overrun
+                logger.warning(f"Update of {self.name} overran {overrun} tick(s), skipped them.")
+
+        self._due = due
+        self._deadline = time.monotonic() + (due - t)
+        self._started = None
+        return
+
+
+@dataclass
+class ControllerTask:
+    controller: Controller
+    interval_s: float
+    trigger: Optional[ChangeTrigger] = None
+    latency: TickLatency = field(default_factory=TickLatency)
+    verbose: bool = True    # fast inner loops only log failures
+    slot_s: float = 3600    # ticks are aligned to the starts of these slots
+    schedule: TickSchedule = field(init=False)
+
+    def __post_init__(self) -> None:
+        self.schedule = TickSchedule(self.interval_s, slot_s=self.slot_s, name=self.controller.name)
+
+
+def _update(task: ControllerTask, context: Optional[TickContext] = None) -> None:
+    controller = task.controller
+    if task.verbose:
+        info = f"Update started for {controller.name}."
+        logger.info(info)
+        logger.info(len(info) * "-")
+    start = time.perf_counter()
+    try:
+        controller.update(context)
+    except Exception:
+        logger.exception(f"Update of {controller.name} failed.")
+
+    task.latency.record(time.perf_counter() - start)
+    if not task.verbose:
+        return
+
+    logger.info(
+        f"Update of {controller.name} took {task.latency.last_s * 1e3:.1f} ms "
+        f"(mean {task.latency.mean_s * 1e3:.1f} ms, max {task.latency.max_s * 1e3:.1f} ms)."
+    )
+    return
+
+
+def update_concurrently(tasks: Sequence[ControllerTask], executor: Executor) -> None:
+    """Update all controllers on `executor` and wait for them to finish.
+
+    All controllers see the same time, read once for the round.
+    """
+    start = time.perf_counter()
+    context = get_clock().tick()
+    wait([executor.submit(_update, task, context) for task in tasks])
+    if len(tasks) > 1:
+        slowest = max(tasks, key=lambda task: task.latency.last_s)
+        logger.info(
+            f"Updated {len(tasks)} controllers in {(time.perf_counter() - start) * 1e3:.1f} ms, "
+            f"slowest was {slowest.controller.name} with {slowest.latency.last_s * 1e3:.1f} ms."
+        )
+    return
+
+
+def run_scheduled(
+    update: Callable[[], None],
+    schedule: TickSchedule,
+    stop: threading.Event,
+    trigger: Optional[ChangeTrigger] = None,
+    immediately: bool = True,
+) -> None:
+    """Call `update` at the ticks of `schedule`, and in between whenever `trigger` fires, until `stop` is set.
+
+    Unless `immediately`, the first update waits for the next tick.
+    """
+    if trigger is not None:
+        trigger.arm()
+    while not stop.is_set():
+        if immediately:
+            schedule.begin()
+            update()
+            schedule.finish()
+            if trigger is not None:
+                trigger.arm()
+        immediately = True
+
+        while not stop.is_set() and (remaining := schedule.remaining_s()) > 0:
+            if trigger is None:
+                stop.wait(remaining)
+            elif trigger.wait(remaining):
+                break
+
+    return
+
+
+def start_controller_thread(task: ControllerTask, stop: threading.Event) -> threading.Thread:
+    """Update `task.controller` on its own thread until `stop` is set, like `run_controllers` does."""
+    thread = threading.Thread(
+        target=run_scheduled,
+        args=(partial(_update, task), task.schedule, stop, task.trigger),
+        name=task.controller.name,
+        daemon=True,
+    )
+    thread.start()
+    return thread
+
+
+async def refresh_weather(
+    weather: OpenMeteoWeather,
+    lead: timedelta = timedelta(minutes=5),
+) -> None:
+    """Keep `weather` up to date, downloads run in a worker thread."""
+    weather.background_refresh = True
+    retry_s = 60.0
+    try:
+        while True:
+            try:
+                wait_s = await asyncio.to_thread(weather.refresh_if_due, lead)
+                retry_s = 60.0
+            except Exception as e:
+                logger.warning(f"Weather refresh failed, retrying in {retry_s:.0f} s: {e}")
+                wait_s = retry_s
+                retry_s = min(2 * retry_s, weather.update_every.total_seconds())
+
+            await asyncio.sleep(wait_s)
+    finally:
+        weather.background_refresh = False
+
+
+async def _run_controller(task: ControllerTask) -> None:
+    schedule = task.schedule
+    while True:
+        schedule.begin()
+        await asyncio.to_thread(_update, task, get_clock().tick())
+        schedule.finish()
+        if task.trigger is not None:
+            task.trigger.arm()
+
+        while (remaining := schedule.remaining_s()) > 0:
+            if task.trigger is None:
+                await asyncio.sleep(remaining)
+            elif await task.trigger.wait_async(remaining):
+                break
+
+
+async def run_controllers(
+    tasks: Sequence[ControllerTask],
+    weathers: Sequence[OpenMeteoWeather] = (),
+    startup_delay_s: float = 30,
+) -> None:
+    """Run weather refreshes and controllers until cancelled."""
+    background: list[asyncio.Task[None]] = []
+    for weather in weathers:
+        # the first forecast is loaded before any controller needs it
+        await asyncio.to_thread(weather.get)
+        background.append(asyncio.create_task(refresh_weather(weather), name="weather-refresh"))
+
+    await asyncio.sleep(startup_delay_s)
+    try:
+        async with asyncio.TaskGroup() as group:
+            for task in tasks:
+                group.create_task(_run_controller(task), name=task.controller.name)
+    finally:
+        for job in background:
+            job.cancel()
+
+    return
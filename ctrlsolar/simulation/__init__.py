@@ -0,0 +1,32 @@
+from typing import Any
+import importlib
+from ctrlsolar.simulation.battery import SimulatedBattery
+from ctrlsolar.simulation.weather import HistoricalWeather, StaticWeather, load_irradiance
+
+__all__ = [
+    "SimulatedBattery",
+    "HistoricalWeather",
+    "StaticWeather",
+    "load_irradiance",
+    "Backtest",
+    "DayResult",
+    "SweepSetup",
+    "parameter_grid",
+    "run_sweep",
+]
+
+# modules runnable with `python -m` are imported on first use, not with the package
+_LAZY: dict[str, str] = {
+    "Backtest": "ctrlsolar.simulation.backtest",
+    "DayResult": "ctrlsolar.simulation.backtest",
+    "SweepSetup": "ctrlsolar.simulation.sweep",
+    "parameter_grid": "ctrlsolar.simulation.sweep",
+    "run_sweep": "ctrlsolar.simulation.sweep",
+}
+
+
+def __getattr__(name: str) -> Any:
+    if name not in _LAZY:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+    return getattr(importlib.import_module(_LAZY[name]), name)
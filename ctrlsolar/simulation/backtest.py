@@ -0,0 +1,258 @@
+"""Replay historical weather through `EnergyController` on a virtual clock.
+
+    python -m ctrlsolar.simulation.backtest --config-file example/config.yaml \
+        --weather data/2024.csv --start 2024-01-01 --end 2024-12-31 --output backtest.csv
+"""
+from ctrlsolar.clock import VirtualClock, get_clock, set_clock
+from ctrlsolar.controller.energy import EnergyController
+from ctrlsolar.controller.planner import DayPlanner
+from ctrlsolar.localization import get_timezone, set_timezone
+from ctrlsolar.mqtt.mqtt import get_mqtt, set_mqtt
+from ctrlsolar.mqtt.replay import ReplayMqtt
+from ctrlsolar.panels import create_panels
+from ctrlsolar.panels.abstract import Panel, Weather
+from ctrlsolar.simulation.battery import SimulatedBattery
+from ctrlsolar.simulation.weather import HistoricalWeather, StaticWeather
+from dataclasses import asdict, dataclass
+from datetime import date, datetime, time, timedelta, timezone
+from typing import Optional
+import numpy as np
+import pandas as pd
+import argparse
+import logging
+
+logger = logging.getLogger(__name__)
+
+__all__ = ["Backtest", "DayResult", "use_replay_mqtt"]
+
+
+@dataclass(frozen=True)
+class DayResult:
+    date: date
+    solar_Wh: float             # produced by the panels
+    output_Wh: float            # AC output of the battery
+    load_Wh: float              # household consumption
+    self_consumed_Wh: float     # output used by the household
+    exported_Wh: float          # output fed into the grid
+    curtailed_Wh: float         # solar energy lost to a full battery
+    soc_end: float              # state of charge at midnight
+
+
+def use_replay_mqtt() -> ReplayMqtt:
+    """Return the in-process MQTT singleton of the simulation, creating it on first use."""
+    try:
+        mqtt = get_mqtt()
+    except RuntimeError:
+        mqtt = ReplayMqtt()
+        set_mqtt(mqtt)
+
+    if not isinstance(mqtt, ReplayMqtt):
+        raise RuntimeError("Backtests cannot run next to a live MQTT connection.")
+
+    return mqtt
+
+
+class Backtest:
+    def __init__(
+        self,
+        weather: HistoricalWeather,
+        panels: Panel,
+        battery: SimulatedBattery,
+        p_min: float,
+        p_max: float,
+        update_interval_s: int = 300,
+        load_W: float | pd.Series = 250.0,
+        planner: Optional[DayPlanner] = None,
+        forecast: Optional[Weather] = None,
+        forecast_panels: Optional[Panel] = None,
+        step_s: int = 60,
+    ):
+        """Steps the real `EnergyController` through historical weather.
+
+        A `VirtualClock` replaces the global clock and a `ReplayMqtt` the broker,
+        so the controller runs unchanged, as fast as it computes. The battery
+        model is advanced every `step_s` with the solar power of the actual
+        weather, the controller updates every `update_interval_s`.
+
+        Args:
+            weather (HistoricalWeather): Actual weather of the simulated period.
+            panels (Panel): Panels of the battery, used for the actual production and by default the forecast.
+            battery (SimulatedBattery): Battery model, holds the initial state of charge.
+            p_min (float): Minimum output power in [W].
+            p_max (float): Maximum output power in [W].
+            update_interval_s (int): Time between controller updates in [s], a multiple of `step_s`.
+            load_W (float | pd.Series): Household consumption in [W], constant or indexed by naive local time.
+            planner (Optional[DayPlanner]): Planner of the controller, the heuristic if not set.
+            forecast (Optional[Weather]): Forecast seen by the controller, by default `weather`
+                itself, i.e. a perfect forecast.
+            forecast_panels (Optional[Panel]): Panels seen by the controller, by default `panels`.
+                Differ from `panels` e.g. in their calibration.
+            step_s (int): Time step of the battery model in [s], a divisor of an hour.
+        """
+        if 3600 % step_s != 0:
+            raise ValueError(f"The step {step_s} s does not divide an hour.")
+        if update_interval_s % step_s != 0:
+            raise ValueError(f"Update interval {update_interval_s} s is not a multiple of the step {step_s} s.")
+
+        self.weather = weather
+        self.panels = panels
+        self.battery = battery
+        self.p_min = p_min
+        self.p_max = p_max
+        self.update_interval_s = update_interval_s
+        self.planner = planner
+        self.forecast = forecast if forecast is not None else weather
+        self.forecast_panels = forecast_panels if forecast_panels is not None else panels
+        self.step_s = step_s
+
+        if isinstance(load_W, pd.Series):
+            self._load_times = pd.DatetimeIndex(load_W.index).as_unit("ns").asi8
+            self._load_values = load_W.to_numpy(dtype=float)
+        else:
+            self._load_times = np.zeros(1, dtype=np.int64)
+            self._load_values = np.array([load_W], dtype=float)
+
+        self._solar_times: np.ndarray = np.empty(0, dtype="datetime64[ns]")
+        self._solar_W: np.ndarray = np.empty(0, dtype=float)
+
+    def _solar_power(self, local: pd.DatetimeIndex) -> np.ndarray:
+        offset = local.asi8 - self._solar_times[0].astype(np.int64)
+        slot = offset // int(self.weather.resolution.total_seconds() * 1e9)
+        valid = (slot >= 0) & (slot < len(self._solar_W))
+        return np.where(valid, self._solar_W[np.clip(slot, 0, len(self._solar_W) - 1)], 0.0)
+
+    def _load_power(self, local: pd.DatetimeIndex) -> np.ndarray:
+        index = np.searchsorted(self._load_times, local.asi8, side="right") - 1
+        return self._load_values[np.maximum(index, 0)]
+
+    def run(self, start: date, end: date) -> pd.DataFrame:
+        """Simulate the days from `start` to `end`, inclusive. Returns one row per day, see `DayResult`."""
+        if start < self.weather.first_day or end > self.weather.last_day:
+            raise ValueError(
+                f"Weather data covers {self.weather.first_day} to {self.weather.last_day}, "
+                f"cannot simulate {start} to {end}."
+            )
+
+        actual = self.weather.between(start, end + timedelta(days=1))
+        production = self.panels.predicted_production(StaticWeather(actual, self.weather.resolution))
+        self._solar_times = production.times
+        self._solar_W = production.power
+
+        mqtt = use_replay_mqtt()
+        previous = get_clock()
+        clock = VirtualClock(datetime.combine(start, time(), tzinfo=get_timezone()))
+        set_clock(clock)
+        try:
+            controller = EnergyController(
+                battery=self.battery,
+                weather=self.forecast,
+                panels=self.forecast_panels,
+                p_min=self.p_min,
+                p_max=self.p_max,
+                planner=self.planner,
+            )
+            results: list[DayResult] = []
+            while clock.now().date() <= end:
+                results.append(self._run_day(controller, clock))
+                mqtt.published.clear()
+        finally:
+            set_clock(previous)
+
+        return pd.DataFrame([asdict(result) for result in results])
+
+    def _run_day(self, controller: EnergyController, clock: VirtualClock) -> DayResult:
+        start = clock.now()
+        day = start.date()
+        midnight = datetime.combine(day + timedelta(days=1), time(), tzinfo=start.tzinfo)
+        # 23 or 25 hours at daylight saving changes
+        seconds = (midnight.astimezone(timezone.utc) - start.astimezone(timezone.utc)).total_seconds()
+        n_steps = int(seconds) // self.step_s
+        local = pd.date_range(
+            start.astimezone(timezone.utc), periods=n_steps, freq=f"{self.step_s}s"
+        ).tz_convert(start.tzinfo).tz_localize(None).as_unit("ns")
+
+        hours = self.step_s / 3600
+        step = timedelta(seconds=self.step_s)
+        updates_every = self.update_interval_s // self.step_s
+        solar_W = self._solar_power(local)
+        load_Wh = self._load_power(local) * hours
+        output_Wh = np.empty(n_steps, dtype=float)
+        curtailed = self.battery.curtailed_Wh
+
+        for n in range(n_steps):
+            if n % updates_every == 0:
+                controller.update(clock.tick())
+            output_Wh[n] = self.battery.step(float(solar_W[n]), self.step_s)
+            clock.advance(step)
+
+        solar = float(solar_W.sum()) * hours
+        exported = float(np.maximum(output_Wh - load_Wh, 0.0).sum())
+        logger.info(f"Simulated {day}: {solar:.0f} Wh solar, {exported:.0f} Wh exported.")
+        return DayResult(
+            date=day,
+            solar_Wh=solar,
+            output_Wh=float(output_Wh.sum()),
+            load_Wh=float(load_Wh.sum()),
+            self_consumed_Wh=float(np.minimum(output_Wh, load_Wh).sum()),
+            exported_Wh=exported,
+            curtailed_Wh=self.battery.curtailed_Wh - curtailed,
+            soc_end=self.battery.state_of_charge,
+        )
+
+
+def main() -> None:
+    from ctrlsolar.config import Config
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--config-file", default="example/config.yaml", help="Path to YAML config file")
+    parser.add_argument("--weather", nargs="+", required=True, help="Irradiance files, CSV or Open-Meteo JSON")
+    parser.add_argument("--start", type=date.fromisoformat, required=True)
+    parser.add_argument("--end", type=date.fromisoformat, required=True)
+    parser.add_argument("--load-w", type=float, default=250, help="Constant household load in [W]")
+    parser.add_argument("--batteries", type=int, default=1, help="Number of battery modules")
+    parser.add_argument("--soc", type=float, default=0.5, help="Initial state of charge, 0-1")
+    parser.add_argument("--output", default=None, help="CSV file for the daily results")
+    args = parser.parse_args()
+
+    config = Config.from_yaml(args.config_file)
+    set_timezone(config.timezone)
+    battery_config = config.batteries[0]
+    weather = HistoricalWeather.from_files(
+        args.weather,
+        latitude=battery_config.latitude,
+        longitude=battery_config.longitude,
+        timezone=config.timezone,
+        horizon=timedelta(hours=config.forecast_horizon_h),
+        cache_dir=config.weather_cache_dir,
+    )
+    backtest = Backtest(
+        weather=weather,
+        panels=create_panels(battery_config.panels),
+        battery=SimulatedBattery(
+            serial_number=battery_config.serial,
+            n_batteries=args.batteries,
+            state_of_charge=args.soc,
+        ),
+        p_min=battery_config.power_min,
+        p_max=battery_config.power_max,
+        update_interval_s=config.update_interval_s,
+        load_W=args.load_w,
+        planner=(
+            DayPlanner(p_min=battery_config.power_min, p_max=battery_config.power_max)
+            if config.planner == "optimal" else None
+        ),
+    )
+    results = backtest.run(args.start, args.end)
+
+    if args.output is not None:
+        results.to_csv(args.output, index=False)
+    print(results.round(3).to_string(index=False))
+    totals = results.drop(columns=["date", "soc_end"]).sum().rename(lambda c: c.removesuffix("_Wh")) / 1e3
+    print(f"\nTotal in [kWh] over {len(results)} days:")
+    print(totals.round(2).to_string())
+    return
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.WARNING)
+    main()
@@ -0,0 +1,129 @@
+from ctrlsolar.battery.abstract import DCCoupledBattery
+from ctrlsolar.mqtt.outbox import SetpointStatus
+import logging
+
+logger = logging.getLogger(__name__)
+
+__all__ = ["SimulatedBattery"]
+
+
+class SimulatedBattery(DCCoupledBattery):
+    max_power: int = 800
+
+    def __init__(
+        self,
+        serial_number: str = "SIMULATED",
+        n_batteries: int = 1,
+        capacity_per_battery: int = 2048,
+        state_of_charge: float = 0.5,
+        discharge_limit: float = 0.1,
+        charge_limit: float = 1.0,
+    ):
+        """Energy balance model of a DC coupled battery, stepped by `step`.
+
+        Solar power charges the battery, the output setpoint discharges it. The
+        output stops at the discharge limit, and solar power that does not fit
+        below the charge limit is passed through to the output, up to `max_power`.
+        Setpoints are applied immediately.
+
+        Args:
+            serial_number (str): Serial number reported to the controllers.
+            n_batteries (int): Number of battery modules, like `bat_cnt` of a Noah 2000.
+            capacity_per_battery (int): Capacity of one module in [Wh].
+            state_of_charge (float): Initial state of charge, 0-1.
+            discharge_limit (float): Minimum state of charge, 0-1.
+            charge_limit (float): Maximum state of charge, 0-1.
+        """
+        self.serial_number = serial_number
+        self._n_batteries = n_batteries
+        self._capacity_per_battery = capacity_per_battery
+        self._energy = state_of_charge * self.capacity
+        self._discharge_limit = discharge_limit
+        self._charge_limit = charge_limit
+        self._setpoint_W = 0
+        self._output_W = 0.0
+        self._panel_power_W = 0.0
+        self._energy_out = 0.0
+        self.curtailed_Wh = 0.0
+
+    @property
+    def n_batteries(self) -> int:
+        return self._n_batteries
+
+    @property
+    def capacity(self) -> int:
+        return self._n_batteries * self._capacity_per_battery
+
+    @property
+    def energy_out(self) -> float:
+        return self._energy_out
+
+    @property
+    def online(self) -> bool:
+        return True
+
+    @property
+    def state_of_charge(self) -> float:
+        return self._energy / self.capacity
+
+    @property
+    def discharge_limit(self) -> float:
+        return self._discharge_limit
+
+    @property
+    def charge_limit(self) -> float:
+        return self._charge_limit
+
+    @property
+    def output_power(self) -> float:
+        return self._output_W
+
+    @output_power.setter
+    def output_power(self, power: int | float) -> None:
+        self._setpoint_W = min(max(int(power), 0), self.max_power)
+        return
+
+    @property
+    def output_power_status(self) -> SetpointStatus:
+        return SetpointStatus(
+            confirmed=self._setpoint_W,
+            pending=None,
+            in_flight=None,
+            depth=0,
+            coalesced=0,
+            latency_s=0.0,
+        )
+
+    @property
+    def panel_power(self) -> float:
+        return self._panel_power_W
+
+    @property
+    def energy_charged(self) -> float:
+        return self._energy
+
+    @property
+    def energy_missing(self) -> float:
+        return self.capacity - self._energy
+
+    def step(self, panel_power_W: float, seconds: float) -> float:
+        """Advance the model by `seconds` at constant solar power. Returns the output energy in [Wh]."""
+        hours = seconds / 3600
+        e_min = self._discharge_limit * self.capacity
+        e_max = self._charge_limit * self.capacity
+        max_out = self.max_power * hours
+        solar = panel_power_W * hours
+
+        output = min(self._setpoint_W * hours, max(self._energy - e_min + solar, 0.0), max_out)
+        energy = self._energy + solar - output
+        if energy > e_max:
+            passed = min(energy - e_max, max_out - output)
+            output += passed
+            self.curtailed_Wh += energy - e_max - passed
+            energy = e_max
+
+        self._energy = energy
+        self._panel_power_W = panel_power_W
+        self._output_W = output / hours if hours > 0 else 0.0
+        self._energy_out += output
+        return output
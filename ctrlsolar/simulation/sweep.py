@@ -0,0 +1,236 @@
+"""Rank controller settings by backtesting them in parallel.
+
+    python -m ctrlsolar.simulation.sweep --config-file example/config.yaml --grid example/sweep.yaml \
+        --weather data/2024.csv --start 2024-01-01 --end 2024-12-31 --output sweep.csv
+"""
+from ctrlsolar.panels import create_panels
+from ctrlsolar.controller.planner import DayPlanner
+from ctrlsolar.localization import set_timezone
+from ctrlsolar.simulation.backtest import Backtest
+from ctrlsolar.simulation.battery import SimulatedBattery
+from ctrlsolar.simulation.weather import HistoricalWeather
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from datetime import date, timedelta
+from typing import Any, Optional, Sequence
+import numpy as np
+import pandas as pd
+import argparse
+import itertools
+import logging
+import math
+import os
+import tempfile
+import time
+import yaml
+
+logger = logging.getLogger(__name__)
+
+__all__ = ["PARAMETERS", "SweepSetup", "parameter_grid", "sample_grid", "run_sweep"]
+
+# settings that can be swept, `calibration` is a factor on the configured
+# calibration of every panel or a list of 24 hourly factors replacing it
+PARAMETERS: tuple[str, ...] = ("power_min", "power_max", "update_interval_s", "calibration")
+
+# metrics that are better when smaller, all others are ranked descending
+_ASCENDING: frozenset[str] = frozenset({"exported_kWh", "curtailed_kWh"})
+
+
+@dataclass(frozen=True)
+class SweepSetup:
+    """Everything but the swept settings, sent once to every worker."""
+    weather_dir: str            # weather saved by `HistoricalWeather.save`
+    latitude: float
+    longitude: float
+    timezone: str
+    horizon_h: int
+    panels: list[dict[str, Any]]
+    start: date
+    end: date
+    power_min: int
+    power_max: int
+    update_interval_s: int
+    load_W: float = 250.0
+    n_batteries: int = 1
+    state_of_charge: float = 0.5
+    planner: str = "heuristic"
+
+
+def parameter_grid(spec: dict[str, Sequence[Any]]) -> list[dict[str, Any]]:
+    """All combinations of the values in `spec`, keyed by the names in `PARAMETERS`."""
+    unknown = set(spec) - set(PARAMETERS)
+    if unknown:
+        raise ValueError(f"Cannot sweep {sorted(unknown)}, expected some of {list(PARAMETERS)}.")
+
+    names = list(spec)
+    return [dict(zip(names, values)) for values in itertools.product(*(spec[name] for name in names))]
+
+
+def sample_grid(grid: list[dict[str, Any]], n: int, seed: int = 0) -> list[dict[str, Any]]:
+    """Random search: `n` distinct candidates of `grid`."""
+    if n >= len(grid):
+        return grid
+
+    index = np.random.default_rng(seed).choice(len(grid), size=n, replace=False)
+    return [grid[ii] for ii in sorted(index)]
+
+
+def _calibrated(panels: list[dict[str, Any]], calibration: Any) -> list[dict[str, Any]]:
+    if calibration is None:
+        return panels
+    if isinstance(calibration, (int, float)):
+        return [
+            {**panel, "calibration": [float(calibration) * c for c in panel.get("calibration") or 24 * [1.0]]}
+            for panel in panels
+        ]
+    return [{**panel, "calibration": [float(c) for c in calibration]} for panel in panels]
+
+
+# state of a worker process, set once by `_init_worker`
+_setup: Optional[SweepSetup] = None
+_weather: Optional[HistoricalWeather] = None
+
+
+def _init_worker(setup: SweepSetup) -> None:
+    global _setup, _weather
+    logging.getLogger("ctrlsolar").setLevel(logging.WARNING)
+    set_timezone(setup.timezone)
+    _setup = setup
+    _weather = HistoricalWeather.load(
+        setup.weather_dir,
+        latitude=setup.latitude,
+        longitude=setup.longitude,
+        timezone=setup.timezone,
+        horizon=timedelta(hours=setup.horizon_h),
+    )
+    return
+
+
+def _run_candidate(candidate: dict[str, Any]) -> dict[str, Any]:
+    assert _setup is not None and _weather is not None, "Worker not initialized"
+    setup = _setup
+    power_min = int(candidate.get("power_min", setup.power_min))
+    power_max = int(candidate.get("power_max", setup.power_max))
+    update_interval_s = int(candidate.get("update_interval_s", setup.update_interval_s))
+
+    start = time.perf_counter()
+    backtest = Backtest(
+        weather=_weather,
+        panels=create_panels(setup.panels),
+        forecast_panels=create_panels(_calibrated(setup.panels, candidate.get("calibration"))),
+        battery=SimulatedBattery(n_batteries=setup.n_batteries, state_of_charge=setup.state_of_charge),
+        p_min=power_min,
+        p_max=power_max,
+        update_interval_s=update_interval_s,
+        load_W=setup.load_W,
+        planner=DayPlanner(p_min=power_min, p_max=power_max) if setup.planner == "optimal" else None,
+        # coarse battery steps are enough for hourly weather, only the update times need to be hit
+        step_s=math.gcd(update_interval_s, 300),
+    )
+    days = backtest.run(setup.start, setup.end)
+
+    output = float(days["output_Wh"].sum())
+    self_consumed = float(days["self_consumed_Wh"].sum())
+    return {
+        **candidate,
+        "self_consumed_kWh": self_consumed / 1e3,
+        "exported_kWh": float(days["exported_Wh"].sum()) / 1e3,
+        "curtailed_kWh": float(days["curtailed_Wh"].sum()) / 1e3,
+        "self_consumption": self_consumed / output if output > 0 else float("nan"),
+        "soc_end_mean": float(days["soc_end"].mean()),
+        "soc_end_min": float(days["soc_end"].min()),
+        "runtime_s": time.perf_counter() - start,
+    }
+
+
+def run_sweep(
+    setup: SweepSetup,
+    candidates: Sequence[dict[str, Any]],
+    workers: Optional[int] = None,
+    rank_by: str = "self_consumed_kWh",
+) -> pd.DataFrame:
+    """Backtest every candidate on a pool of `workers` processes, by default one per CPU.
+
+    The weather of `setup.weather_dir` is memory-mapped by every worker, so all
+    processes share one copy. Returns one row per candidate, best first.
+    """
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(setup,)) as pool:
+        rows = list(pool.map(_run_candidate, candidates))
+
+    results = pd.DataFrame(rows)
+    results = results.sort_values(rank_by, ascending=rank_by in _ASCENDING, kind="stable")
+    results.insert(0, "rank", np.arange(1, len(results) + 1))
+    return results.reset_index(drop=True)
+
+
+def main() -> None:
+    from ctrlsolar.config import Config
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--config-file", default="example/config.yaml", help="Path to YAML config file")
+    parser.add_argument("--grid", required=True, help="YAML file with a list of values per swept setting")
+    parser.add_argument("--weather", nargs="+", required=True, help="Irradiance files, CSV or Open-Meteo JSON")
+    parser.add_argument("--start", type=date.fromisoformat, required=True)
+    parser.add_argument("--end", type=date.fromisoformat, required=True)
+    parser.add_argument("--load-w", type=float, default=250, help="Constant household load in [W]")
+    parser.add_argument("--batteries", type=int, default=1, help="Number of battery modules")
+    parser.add_argument("--soc", type=float, default=0.5, help="Initial state of charge, 0-1")
+    parser.add_argument("--samples", type=int, default=None, help="Random search over this many candidates")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: one per CPU)")
+    parser.add_argument(
+        "--rank-by",
+        default="self_consumed_kWh",
+        choices=["self_consumed_kWh", "exported_kWh", "curtailed_kWh", "self_consumption", "soc_end_min"],
+    )
+    parser.add_argument("--output", default=None, help="CSV file for the ranked results")
+    args = parser.parse_args()
+
+    config = Config.from_yaml(args.config_file)
+    set_timezone(config.timezone)
+    battery_config = config.batteries[0]
+    with open(args.grid) as f:
+        candidates = parameter_grid(yaml.safe_load(f))
+    if args.samples is not None:
+        candidates = sample_grid(candidates, args.samples, seed=args.seed)
+
+    with tempfile.TemporaryDirectory(prefix="ctrlsolar-sweep-") as weather_dir:
+        HistoricalWeather.from_files(
+            args.weather,
+            latitude=battery_config.latitude,
+            longitude=battery_config.longitude,
+            timezone=config.timezone,
+            cache_dir=config.weather_cache_dir,
+        ).save(weather_dir)
+        setup = SweepSetup(
+            weather_dir=weather_dir,
+            latitude=battery_config.latitude,
+            longitude=battery_config.longitude,
+            timezone=config.timezone,
+            horizon_h=config.forecast_horizon_h,
+            panels=battery_config.panels,
+            start=args.start,
+            end=args.end,
+            power_min=battery_config.power_min,
+            power_max=battery_config.power_max,
+            update_interval_s=config.update_interval_s,
+            load_W=args.load_w,
+            n_batteries=args.batteries,
+            state_of_charge=args.soc,
+            planner=config.planner,
+        )
+
+        logger.info(f"Sweeping {len(candidates)} candidates on {args.workers or os.cpu_count()} processes.")
+        start = time.perf_counter()
+        results = run_sweep(setup, candidates, workers=args.workers, rank_by=args.rank_by)
+        logger.info(f"Finished in {time.perf_counter() - start:.1f} s.")
+
+    if args.output is not None:
+        results.to_csv(args.output, index=False)
+    print(results.round(3).to_string(index=False))
+    return
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
@@ -0,0 +1,232 @@
+from pvlib.location import Location # type:ignore
+from ctrlsolar.clock import get_clock
+from ctrlsolar.panels.abstract import Weather
+from ctrlsolar.panels.solarposition import SolarPositionTable
+from datetime import date, datetime, timedelta
+from typing import Any, Optional, Sequence, cast
+import numpy as np
+import pandas as pd
+import logging
+import json
+import os
+
+logger = logging.getLogger(__name__)
+
+__all__ = ["StaticWeather", "HistoricalWeather", "load_irradiance"]
+
+# column names of the Open-Meteo archive and forecast APIs
+_OPEN_METEO_COLUMNS: dict[str, str] = {
+    "shortwave_radiation": "GHI",
+    "direct_normal_irradiance": "DNI",
+    "diffuse_radiation": "DHI",
+}
+
+_COLUMNS: tuple[str, ...] = ("GHI", "DNI", "DHI")
+_DATA_COLUMNS: tuple[str, ...] = (*_COLUMNS, "apparent_zenith", "azimuth")
+
+
+def _read_csv(path: str) -> pd.DataFrame:
+    # Open-Meteo CSV exports start with a block of location metadata
+    with open(path) as f:
+        skip = next((ii for ii, line in enumerate(f) if line.split(",")[0].strip() == "time"), 0)
+
+    df = pd.read_csv(path, skiprows=skip)
+    df.columns = [str(c).split(" (")[0].strip() for c in df.columns]
+    return df
+
+
+def _read_json(path: str) -> pd.DataFrame:
+    with open(path) as f:
+        data = json.load(f)
+
+    for key in ("minutely_15", "hourly"):
+        if key in data:
+            return pd.DataFrame(data[key])
+
+    return pd.DataFrame(data)
+
+
+def load_irradiance(paths: Sequence[str]) -> pd.DataFrame:
+    """Read historical irradiance from CSV or Open-Meteo JSON files.
+
+    Files need a `time` column of naive local timestamps and the irradiance in
+    [W/m^2], either as `GHI`, `DNI` and `DHI` or with the Open-Meteo names
+    (`shortwave_radiation`, `direct_normal_irradiance`, `diffuse_radiation`).
+
+    Returns:
+        pd.DataFrame: Columns `times`, `GHI`, `DNI` and `DHI`, sorted by time without duplicates.
+    """
+    frames: list[pd.DataFrame] = []
+    for path in paths:
+        df = _read_json(path) if os.path.splitext(path)[1] == ".json" else _read_csv(path)
+        df = df.rename(columns=_OPEN_METEO_COLUMNS)
+        missing = [c for c in ("time", *_COLUMNS) if c not in df.columns]
+        if missing:
+            raise ValueError(f"Irradiance file {path} misses the columns {missing}.")
+
+        frames.append(
+            pd.DataFrame({
+                "times": pd.to_datetime(df["time"]),
+                **{c: df[c].to_numpy(dtype=float) for c in _COLUMNS},
+            })
+        )
+
+    if not frames:
+        raise ValueError("No irradiance files given.")
+
+    df = pd.concat(frames).sort_values("times").drop_duplicates("times", keep="last")
+    df[list(_COLUMNS)] = df[list(_COLUMNS)].fillna(0.0)
+    logger.info(f"Loaded {len(df)} irradiance records from {df['times'].iloc[0]} to {df['times'].iloc[-1]}.")
+    return df.reset_index(drop=True)
+
+
+def _resolution(times_ns: np.ndarray) -> timedelta:
+    steps = np.diff(times_ns)
+    if steps.size == 0:
+        raise ValueError("Historical irradiance needs at least two records.")
+    return timedelta(microseconds=int(np.median(steps)) // 1000)
+
+
+class StaticWeather(Weather):
+    """Serves a fixed weather frame, e.g. the actual weather of a simulated period."""
+
+    def __init__(self, forecast: pd.DataFrame, resolution: timedelta):
+        self.resolution = resolution
+        self._forecast = forecast
+
+    @property
+    def version(self) -> int:
+        return 1
+
+    def get(self) -> pd.DataFrame:
+        return self._forecast
+
+
+class HistoricalWeather(Weather):
+    def __init__(
+        self,
+        irradiance: pd.DataFrame,
+        latitude: float,
+        longitude: float,
+        timezone: str,
+        horizon: timedelta = timedelta(hours=48),
+        cache_dir: Optional[str] = None,
+    ):
+        """Replays historical irradiance as a perfect forecast.
+
+        Like `OpenMeteoWeather`, `get` returns the days from 00:00 of the current
+        day until `horizon` from now, where now is the time of the global clock.
+        The window, and with it `version`, only changes once per day.
+
+        Args:
+            irradiance (pd.DataFrame): Irradiance as returned by `load_irradiance`, at a fixed resolution.
+            latitude (float): Latitude of the site in degree.
+            longitude (float): Longitude of the site in degree.
+            timezone (str): Timezone of the site, e.g. "Europe/Berlin".
+            horizon (timedelta): Minimum look-ahead of the forecast from now.
+            cache_dir (Optional[str]): If set, solar position tables are persisted in this directory.
+        """
+        times = pd.DatetimeIndex(irradiance["times"]).as_unit("ns")
+        if "apparent_zenith" in irradiance.columns and "azimuth" in irradiance.columns:
+            values = irradiance[list(_DATA_COLUMNS)].to_numpy(dtype=float)
+        else:
+            location = Location(latitude, longitude, tz=timezone)
+            solpos = SolarPositionTable(location, resolution=_resolution(times.asi8), cache_dir=cache_dir).lookup(times)
+            values = np.column_stack([
+                *(irradiance[c].to_numpy(dtype=float) for c in _COLUMNS),
+                solpos["apparent_zenith"].to_numpy(),
+                solpos["azimuth"].to_numpy(),
+            ])
+        self._init(times.asi8, values, latitude, longitude, timezone, horizon)
+
+    def _init(
+        self,
+        times_ns: np.ndarray,
+        values: np.ndarray,
+        latitude: float,
+        longitude: float,
+        timezone: str,
+        horizon: timedelta = timedelta(hours=48),
+    ) -> None:
+        # the arrays are only ever sliced, so memory-mapped ones stay shared between processes
+        self.resolution = _resolution(times_ns)
+        self.latitude = latitude
+        self.longitude = longitude
+        self.timezone = timezone
+        self.horizon = horizon
+        self.location = Location(latitude, longitude, tz=timezone)
+        self._times_ns = times_ns
+        self._values = values
+        self._window: tuple[date, date] | None = None
+        self._forecast: pd.DataFrame = self._frame(0, 0)
+        self._version = 0
+        return
+
+    @classmethod
+    def from_files(cls, paths: Sequence[str], **kwargs: Any) -> "HistoricalWeather":
+        return cls(load_irradiance(paths), **kwargs)
+
+    def save(self, directory: str) -> None:
+        """Store irradiance and solar position as `.npy` files, to be memory-mapped by `load`."""
+        os.makedirs(directory, exist_ok=True)
+        np.save(os.path.join(directory, "times.npy"), np.asarray(self._times_ns))
+        np.save(os.path.join(directory, "weather.npy"), np.asarray(self._values))
+        return
+
+    @classmethod
+    def load(
+        cls,
+        directory: str,
+        latitude: float,
+        longitude: float,
+        timezone: str,
+        horizon: timedelta = timedelta(hours=48),
+    ) -> "HistoricalWeather":
+        """Memory-map a weather saved with `save`, processes loading the same files share its pages."""
+        weather = cls.__new__(cls)
+        weather._init(
+            np.load(os.path.join(directory, "times.npy"), mmap_mode="r"),
+            np.load(os.path.join(directory, "weather.npy"), mmap_mode="r"),
+            latitude,
+            longitude,
+            timezone,
+            horizon,
+        )
+        return weather
+
+    @property
+    def version(self) -> int:
+        return self._version
+
+    @property
+    def first_day(self) -> date:
+        return cast(datetime, pd.Timestamp(int(self._times_ns[0])).to_pydatetime()).date()
+
+    @property
+    def last_day(self) -> date:
+        return cast(datetime, pd.Timestamp(int(self._times_ns[-1])).to_pydatetime()).date()
+
+    def _frame(self, lo: int, hi: int) -> pd.DataFrame:
+        values = self._values[lo:hi]
+        return pd.DataFrame({
+            "times": pd.DatetimeIndex(np.asarray(self._times_ns[lo:hi]).view("datetime64[ns]")),
+            **{c: values[:, ii] for ii, c in enumerate(_DATA_COLUMNS)},
+        })
+
+    def between(self, start: date, end: date) -> pd.DataFrame:
+        """Records from 00:00 of `start` until before 00:00 of `end`, as a new frame."""
+        lo, hi = np.searchsorted(
+            self._times_ns,
+            [pd.Timestamp(start).value, pd.Timestamp(end).value],
+        )
+        return self._frame(int(lo), int(hi))
+
+    def get(self) -> pd.DataFrame:
+        now = get_clock().now()
+        window = (now.date(), (now + self.horizon).date() + timedelta(days=1))
+        if window != self._window:
+            self._forecast = self.between(*window)
+            self._window = window
+            self._version += 1
+
+        return self._forecast
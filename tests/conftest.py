@@ -0,0 +1,276 @@
+from ctrlsolar.clock import SystemClock, VirtualClock, set_clock
+from ctrlsolar.localization import set_timezone
+from ctrlsolar.mqtt.mqtt import Mqtt
+from ctrlsolar.panels.abstract import Weather
+from ctrlsolar.simulation.weather import HistoricalWeather
+from pvlib.location import Location  # type:ignore
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+from typing import Any, Iterator, Optional
+import asyncio
+import json
+import paho.mqtt.client as paho
+import math
+import threading
+import time
+import pandas as pd
+import pytest
+
+TIMEZONE = "Europe/Berlin"
+
+
+@pytest.fixture(autouse=True)
+def timezone() -> str:
+    set_timezone(TIMEZONE)
+    return TIMEZONE
+
+
+@pytest.fixture
+def clock() -> Iterator[VirtualClock]:
+    clock = VirtualClock(datetime(2024, 6, 1, 12))
+    set_clock(clock)
+    yield clock
+    set_clock(SystemClock())
+
+
+def open_meteo_series(start_date: str, end_date: str, step: timedelta = timedelta(hours=1)) -> dict[str, list[Any]]:
+    """Open-Meteo like time series of a clear day, for every day from `start_date` to `end_date`."""
+    start = datetime.fromisoformat(start_date)
+    end = datetime.fromisoformat(end_date) + timedelta(days=1)
+    times: list[str] = []
+    ghi: list[float] = []
+    t = start
+    while t < end:
+        hour = t.hour + t.minute / 60
+        times.append(t.strftime("%Y-%m-%dT%H:%M"))
+        ghi.append(max(800 * math.sin((hour - 5) / 15 * math.pi), 0.0))
+        t += step
+
+    return {
+        "time": times,
+        "diffuse_radiation": [0.3 * x for x in ghi],
+        "direct_normal_irradiance": [0.8 * x for x in ghi],
+        "global_tilted_irradiance": ghi,
+        "shortwave_radiation": ghi,
+    }
+
+
+class FixedWeather(Weather):
+    """Two clear days in Berlin, a new forecast only on `refresh`."""
+
+    def __init__(self, resolution: timedelta = timedelta(hours=1)):
+        self.resolution = resolution
+        self._version = 1
+        self.calls = 0
+        series = open_meteo_series("2024-06-01", "2024-06-02", resolution)
+        times = pd.DatetimeIndex(pd.to_datetime(series["time"]))
+        solpos = Location(52.52, 13.41, tz="Europe/Berlin").get_solarposition(times.tz_localize("Europe/Berlin"))
+        self._forecast = pd.DataFrame({
+            "times": times,
+            "GHI": series["shortwave_radiation"],
+            "DNI": series["direct_normal_irradiance"],
+            "DHI": series["diffuse_radiation"],
+            "apparent_zenith": solpos["apparent_zenith"].to_numpy(),
+            "azimuth": solpos["azimuth"].to_numpy(),
+        })
+
+    @property
+    def version(self) -> int:
+        return self._version
+
+    def get(self) -> pd.DataFrame:
+        self.calls += 1
+        return self._forecast
+
+    def refresh(self) -> None:
+        self._version += 1
+        return
+
+
+def irradiance(start_date: str, end_date: str) -> pd.DataFrame:
+    """`open_meteo_series` as returned by `load_irradiance`."""
+    series = open_meteo_series(start_date, end_date)
+    return pd.DataFrame({
+        "times": pd.to_datetime(series["time"]),
+        "GHI": series["shortwave_radiation"],
+        "DNI": series["direct_normal_irradiance"],
+        "DHI": series["diffuse_radiation"],
+    })
+
+
+def historical_weather(horizon: timedelta = timedelta(hours=24)) -> HistoricalWeather:
+    """Four clear days in Berlin, from 2024-06-01."""
+    return HistoricalWeather(irradiance("2024-06-01", "2024-06-04"), 52.52, 13.41, "Europe/Berlin", horizon=horizon)
+
+
+class OpenMeteoStandIn:
+    """Local HTTP server answering like the Open-Meteo forecast API."""
+
+    def __init__(self):
+        self.requests: list[dict[str, str]] = []
+        self.fail = False           # answer every request with 503
+        self.failures = 0           # answer this many of the next requests with 503
+        self.delay_s = 0.0
+        stand_in = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self) -> None:
+                query = {k: v[0] for k, v in parse_qs(urlparse(self.path).query).items()}
+                stand_in.requests.append(query)
+                time.sleep(stand_in.delay_s)
+                if stand_in.fail or stand_in.failures > 0:
+                    stand_in.failures = max(stand_in.failures - 1, 0)
+                    self.send_response(503)
+                    self.end_headers()
+                    return
+
+                key = "minutely_15" if "minutely_15" in query else "hourly"
+                step = timedelta(minutes=15) if key == "minutely_15" else timedelta(hours=1)
+                body = json.dumps({key: open_meteo_series(query["start_date"], query["end_date"], step)}).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                try:
+                    self.wfile.write(body)
+                except (BrokenPipeError, ConnectionResetError):
+                    pass    # the client timed out
+
+            def log_message(self, format: str, *args: Any) -> None:
+                return
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self._server.server_address[1]}/v1/forecast"
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+
+    def close(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+        return
+
+
+@pytest.fixture
+def open_meteo() -> Iterator[OpenMeteoStandIn]:
+    server = OpenMeteoStandIn()
+    yield server
+    server.close()
+
+
+class BrokerStandIn:
+    """Local MQTT 3.1.1 broker for a single client, QoS 0 and 1, without retained messages."""
+
+    def __init__(self):
+        self.published: list[tuple[str, bytes]] = []
+        self.subscribed: list[str] = []
+        self.connects = 0
+        self.port = 0
+        self._server: Optional[asyncio.Server] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+
+    async def start(self) -> None:
+        self._server = await asyncio.start_server(self._serve, "127.0.0.1", 0)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return
+
+    async def stop(self) -> None:
+        if self._writer is not None:
+            self._writer.close()
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+        return
+
+    def send(self, topic: str, payload: bytes) -> None:
+        assert self._writer is not None
+        self._writer.write(_packet(0x30, _string(topic) + payload))
+        return
+
+    def drop(self) -> None:
+        """Close the connection, like a restarting broker."""
+        assert self._writer is not None
+        self._writer.close()
+        return
+
+    async def _serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self._writer = writer
+        try:
+            while True:
+                header = (await reader.readexactly(1))[0]
+                length, shift = 0, 0
+                while True:
+                    byte = (await reader.readexactly(1))[0]
+                    length |= (byte & 0x7F) << shift
+                    shift += 7
+                    if not byte & 0x80:
+                        break
+                body = await reader.readexactly(length)
+                self._handle(header, body, writer)
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        writer.close()
+        return
+
+    def _handle(self, header: int, body: bytes, writer: asyncio.StreamWriter) -> None:
+        kind = header >> 4
+        if kind == 1:       # CONNECT
+            self.connects += 1
+            writer.write(_packet(0x20, b"\x00\x00"))
+        elif kind == 3:     # PUBLISH
+            n = int.from_bytes(body[:2], "big")
+            topic, rest = body[2 : 2 + n].decode(), body[2 + n :]
+            if (header >> 1) & 0x03:
+                writer.write(_packet(0x40, rest[:2]))
+                rest = rest[2:]
+            self.published.append((topic, rest))
+        elif kind == 8:     # SUBSCRIBE
+            pos, granted = 2, b""
+            while pos < len(body):
+                n = int.from_bytes(body[pos : pos + 2], "big")
+                self.subscribed.append(body[pos + 2 : pos + 2 + n].decode())
+                granted += body[pos + 2 + n : pos + 3 + n]
+                pos += 3 + n
+            writer.write(_packet(0x90, body[:2] + granted))
+        elif kind == 12:    # PINGREQ
+            writer.write(_packet(0xD0, b""))
+        return
+
+
+def _string(value: str) -> bytes:
+    data = value.encode()
+    return len(data).to_bytes(2, "big") + data
+
+
+def _packet(header: int, body: bytes) -> bytes:
+    length, encoded = len(body), b""
+    while True:
+        byte, length = length % 128, length // 128
+        encoded += bytes([byte | (0x80 if length > 0 else 0)])
+        if length == 0:
+            return bytes([header]) + encoded + body
+
+
+class RecordingMqtt(Mqtt):
+    """MQTT client that records publishes instead of sending them."""
+
+    def __init__(self):
+        super().__init__(host="localhost")
+        self.sent: list[tuple[str, Any, bool]] = []
+        self.subscribed: list[str] = []
+
+    def _send(self, topic: str, payload: Any, qos: int, retain: bool):
+        self.sent.append((topic, payload, retain))
+        return paho.MQTTMessageInfo(len(self.sent))
+
+    def _subscribe_broker(self, topic_filter: str) -> None:
+        self.subscribed.append(topic_filter)
+        return
+
+
+@pytest.fixture
+def mqtt(monkeypatch: pytest.MonkeyPatch) -> RecordingMqtt:
+    client = RecordingMqtt()
+    monkeypatch.setattr("ctrlsolar.mqtt.mqtt._mqtt", client)
+    return client
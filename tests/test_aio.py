@@ -0,0 +1,81 @@
+from ctrlsolar.mqtt.aio import AsyncMqttLoop
+from ctrlsolar.mqtt.mqtt import Mqtt, MqttSensor
+from conftest import BrokerStandIn
+from typing import Callable
+import asyncio
+import threading
+import pytest
+
+
+async def until(condition: Callable[[], bool], timeout_s: float = 5.0) -> None:
+    async with asyncio.timeout(timeout_s):
+        while not condition():
+            await asyncio.sleep(0.01)
+    return
+
+
+def test_messages_are_handled_on_the_loop_thread(monkeypatch):
+    async def main() -> None:
+        broker = BrokerStandIn()
+        await broker.start()
+        client = Mqtt("127.0.0.1", port=broker.port)
+        monkeypatch.setattr("ctrlsolar.mqtt.mqtt._mqtt", client)
+        mqtt_loop = AsyncMqttLoop(client)
+        await mqtt_loop.connect(timeout_s=5)
+
+        sensor = MqttSensor("noah/1/state")
+        threads: list[int] = []
+        sensor.add_listener(lambda value: threads.append(threading.get_ident()))
+        await until(lambda: broker.subscribed == ["noah/1/state"])
+
+        broker.send("noah/1/state", b"55")
+        await until(lambda: sensor.value == "55")
+        assert threads == [threading.get_ident()]
+
+        acked = asyncio.Event()
+        client.publish("noah/1/set", 300, retain=False, on_ack=acked.set)
+        await asyncio.wait_for(acked.wait(), timeout=5)
+        assert broker.published == [("noah/1/set", b"300")]
+
+        await mqtt_loop.disconnect()
+        await broker.stop()
+        return
+
+    asyncio.run(main())
+
+
+def test_reconnects_and_subscribes_again(monkeypatch):
+    async def main() -> None:
+        broker = BrokerStandIn()
+        await broker.start()
+        client = Mqtt("127.0.0.1", port=broker.port)
+        monkeypatch.setattr("ctrlsolar.mqtt.mqtt._mqtt", client)
+        mqtt_loop = AsyncMqttLoop(client, reconnect_delay_s=0.05)
+        await mqtt_loop.connect(timeout_s=5)
+        sensor = MqttSensor("noah/1/state")
+        await until(lambda: broker.subscribed == ["noah/1/state"])
+
+        broker.drop()
+        await until(lambda: broker.connects == 2 and len(broker.subscribed) == 2)
+        broker.send("noah/1/state", b"60")
+        await until(lambda: sensor.value == "60")
+
+        await mqtt_loop.disconnect()
+        await broker.stop()
+        return
+
+    asyncio.run(main())
+
+
+def test_connect_times_out_without_connack():
+    async def main() -> None:
+        server = await asyncio.start_server(lambda reader, writer: None, "127.0.0.1", 0)
+        client = Mqtt("127.0.0.1", port=server.sockets[0].getsockname()[1])
+        mqtt_loop = AsyncMqttLoop(client)
+        with pytest.raises(RuntimeError):
+            await mqtt_loop.connect(timeout_s=0.2)
+        await mqtt_loop.disconnect()
+        server.close()
+        return
+
+    asyncio.run(main())
@@ -0,0 +1,111 @@
+from ctrlsolar.battery import Noah2000
+from ctrlsolar.battery.abstract import BatterySnapshot
+import json
+
+SERIAL = "ABC123"
+STATE_TOPIC = f"homeassistant/grobro/{SERIAL}/state"
+
+
+def test_snapshot_derives_the_energies_once():
+    snapshot = BatterySnapshot.build(
+        online=True,
+        n_batteries=2,
+        capacity_per_battery=2048,
+        state_of_charge=0.25,
+        discharge_limit=0.1,
+        charge_limit=1.0,
+        output_power=300.0,
+        panel_power=None,
+        energy_out=1500.0,
+        received_at=100.0,
+    )
+    assert snapshot.capacity == 4096
+    assert (snapshot.energy_charged, snapshot.energy_missing) == (1024, 3072)
+    assert snapshot.age(now=112.5) == 12.5
+
+    unknown = BatterySnapshot.build(True, 1, 2048, None, None, None, None, None, None)
+    assert (unknown.capacity, unknown.energy_charged, unknown.energy_missing) == (2048, None, None)
+    assert unknown.age() is None
+
+
+def test_snapshot_of_one_state_message(mqtt, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("ctrlsolar.mqtt.demux.time.monotonic", lambda: now[0])
+    battery = Noah2000.from_grobro(SERIAL)
+    mqtt._dispatch(f"homeassistant/grobro/{SERIAL}/availability", "online")
+    mqtt._dispatch(STATE_TOPIC, json.dumps({
+        "tot_bat_soc_pct": 50,
+        "discharge_limit": 10,
+        "charge_limit": 90,
+        "out_power": 300,
+        "pv_tot_power": 520,
+        "bat_cnt": 1,
+        "eng_out_device": 1.5,
+    }))
+
+    snapshot = battery.snapshot()
+    assert snapshot == BatterySnapshot(
+        online=True,
+        n_batteries=1,
+        capacity=2048,
+        state_of_charge=0.5,
+        discharge_limit=0.1,
+        charge_limit=0.9,
+        output_power=300.0,
+        panel_power=520.0,
+        energy_out=1500.0,
+        energy_charged=1024.0,
+        energy_missing=1024.0,
+        received_at=1000.0,
+    )
+
+    # a second battery halves the state of charge, the energies never mix both messages
+    now[0] = 1010.0
+    mqtt._dispatch(STATE_TOPIC, json.dumps({"tot_bat_soc_pct": 25, "bat_cnt": 2}))
+    second = battery.snapshot()
+    assert (second.n_batteries, second.state_of_charge, second.capacity) == (2, 0.25, 4096)
+    assert (second.energy_charged, second.energy_missing) == (1024, 3072)
+    # fields missing from the message take their defaults, not the values of the previous one
+    assert (second.discharge_limit, second.output_power, second.energy_out) == (0, None, None)
+    assert second.received_at == 1010.0
+    assert snapshot.state_of_charge == 0.5
+
+
+def test_snapshot_is_cached_per_state_message(mqtt, monkeypatch):
+    builds = []
+    build = BatterySnapshot.build
+
+    def counting_build(*args, **kwargs):
+        builds.append(kwargs)
+        return build(*args, **kwargs)
+
+    monkeypatch.setattr(BatterySnapshot, "build", counting_build)
+    battery = Noah2000.from_grobro(SERIAL)
+    mqtt._dispatch(f"homeassistant/grobro/{SERIAL}/availability", "online")
+    mqtt._dispatch(STATE_TOPIC, json.dumps({"tot_bat_soc_pct": 80, "bat_cnt": 1}))
+
+    first = battery.snapshot()
+    assert battery.snapshot() is first
+    assert len(builds) == 1
+
+    # the next message invalidates it
+    mqtt._dispatch(STATE_TOPIC, json.dumps({"tot_bat_soc_pct": 80, "bat_cnt": 1}))
+    second = battery.snapshot()
+    assert second is not first and second.state_of_charge == first.state_of_charge
+    assert battery.snapshot() is second
+    assert len(builds) == 2
+
+    # so does a change of availability
+    mqtt._dispatch(f"homeassistant/grobro/{SERIAL}/availability", "offline")
+    offline = battery.snapshot()
+    assert not offline.online and offline.state_of_charge == 0.8
+    assert len(builds) == 3
+
+
+def test_snapshot_before_the_first_state_message(mqtt):
+    battery = Noah2000.from_grobro(SERIAL)
+    snapshot = battery.snapshot()
+    assert not snapshot.online
+    assert (snapshot.n_batteries, snapshot.capacity) == (1, 2048)
+    assert snapshot.state_of_charge is None and snapshot.energy_missing is None
+    assert snapshot.received_at is None
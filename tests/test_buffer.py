@@ -0,0 +1,96 @@
+from ctrlsolar.mqtt.abstract import Sensor
+from ctrlsolar.mqtt.buffer import RingBuffer
+import numpy as np
+import pytest
+
+
+def test_keeps_the_last_samples():
+    buffer = RingBuffer(size=4)
+    assert buffer.last is None
+    assert buffer.mean(10, now=0) is None
+
+    for ii in range(6):
+        buffer.append(ii, timestamp=float(ii))
+
+    assert len(buffer) == 4
+    assert buffer.values().tolist() == [2, 3, 4, 5]
+    assert buffer.values(2).tolist() == [4, 5]
+    assert buffer.timestamps().tolist() == [2, 3, 4, 5]
+    assert buffer.last == 5
+    assert buffer.age(now=7.5) == 2.5
+    with pytest.raises(ValueError):
+        buffer.values()[0] = 1.0
+
+
+def test_window_statistics():
+    buffer = RingBuffer(size=8)
+    for ii, value in enumerate([1.0, 5.0, "unavailable", 3.0, 7.0]):
+        buffer.append(value, timestamp=float(ii))
+
+    # samples at t >= now - seconds
+    assert buffer.window(2, now=4).size == 3
+    assert buffer.mean(2, now=4) == pytest.approx(5.0)
+    assert buffer.min(2, now=4) == 3.0
+    assert buffer.max(10, now=4) == 7.0
+
+    buffer.append(None, timestamp=5.0)
+    assert buffer.mean(0.5, now=5.2) is None
+    assert buffer.min(0.5, now=5.2) is None
+    assert buffer.mean(1, now=100) is None
+
+
+@pytest.mark.parametrize("size", [1, 3, 16])
+def test_mean_matches_numpy(size):
+    rng = np.random.default_rng(size)
+    buffer = RingBuffer(size=size)
+    samples: list[float] = []
+    for t in range(200):
+        value = float(rng.normal(500, 100)) if rng.random() > 0.1 else None
+        buffer.append(value, timestamp=float(t))
+        samples.append(np.nan if value is None else value)
+
+        seconds = float(rng.integers(0, size + 2))
+        window = np.array(samples[max(0, t + 1 - size):])[-int(seconds) - 1:]
+        expected = None if np.isnan(window).all() else np.nanmean(window)
+        assert buffer.mean(seconds, now=float(t)) == pytest.approx(expected)
+
+
+def test_mean_stays_precise():
+    # running sums restart with every pass, a long uptime of large values does not cost precision
+    buffer = RingBuffer(size=10)
+    for t in range(100_000):
+        buffer.append(1e9 + (t % 7) * 1e-3, timestamp=float(t))
+
+    expected = np.mean(buffer.values(5))
+    assert buffer.mean(4, now=99_999.0) == pytest.approx(expected, abs=1e-6)
+
+
+@pytest.mark.parametrize("size", [1, 3, 16, 100])
+def test_min_max_match_numpy(size):
+    rng = np.random.default_rng(size)
+    buffer = RingBuffer(size=size)
+    samples: list[float] = []
+    for t in range(500):
+        value = float(rng.integers(0, 20)) if rng.random() > 0.1 else None
+        buffer.append(value, timestamp=float(t))
+        samples.append(np.nan if value is None else value)
+
+        seconds = float(rng.integers(0, size + 2))
+        window = np.array(samples[max(0, t + 1 - size):])[-int(seconds) - 1:]
+        valid = window[~np.isnan(window)]
+        assert buffer.min(seconds, now=float(t)) == (valid.min() if valid.size else None)
+        assert buffer.max(seconds, now=float(t)) == (valid.max() if valid.size else None)
+
+
+def test_sensor_buffer_keeps_raw_readings():
+    class ValueSensor(Sensor):
+        @property
+        def value(self):
+            return self._last
+
+    sensor = ValueSensor(buffer_len=4)
+    assert sensor.buffer == [None] * 4
+    for value in ("on", 5, True):
+        sensor._record(value)
+    assert sensor.buffer == [None, "on", 5, True]
+    assert sensor.history.values().tolist()[1:] == [5.0, 1.0]
@@ -0,0 +1,74 @@
+from ctrlsolar.config import Config
+from ctrlsolar.mqtt.library import Generic_Power, Shelly1PM_Power
+from pathlib import Path
+from typing import Any
+import pytest
+import yaml
+
+PANEL = {"tilt": 45, "azimuth": 180, "area": 2.0, "efficiency": 0.2}
+
+
+def load(tmp_path: Path, config: dict[str, Any]) -> Config:
+    path = tmp_path / "config.yaml"
+    path.write_text(yaml.safe_dump(config))
+    return Config.from_yaml(str(path))
+
+
+def test_single_battery(tmp_path):
+    config = load(tmp_path, {
+        "battery_sn": "0PVP1",
+        "panels": [PANEL],
+        "latitude": 52.5,
+        "power_max": 600,
+        "optional": {"power_sensor": {"type": "Shelly1PM_Power", "topic": "shelly"}},
+    })
+
+    assert config.battery_sn == "0PVP1"
+    [battery] = config.batteries
+    assert (battery.serial, battery.panels, battery.latitude) == ("0PVP1", [PANEL], 52.5)
+    assert (battery.power_min, battery.power_max) == (200, 600)
+    assert battery.power_sensor == {"type": Shelly1PM_Power, "topic": "shelly"}
+    assert battery.grid_sensor is None
+
+
+def test_fleet_falls_back_to_global_settings(tmp_path):
+    east = {**PANEL, "azimuth": 90}
+    config = load(tmp_path, {
+        "panels": [PANEL],
+        "latitude": 52.5,
+        "longitude": 13.4,
+        "power_max": 600,
+        "batteries": [
+            {"battery_sn": 1},
+            {
+                "battery_sn": "2",
+                "panels": [east],
+                "longitude": 9.9,
+                "power_max": 800,
+                "optional": {"grid_sensor": {"type": "Generic_Power", "topic": "meter/power"}},
+            },
+        ],
+    })
+
+    first, second = config.batteries
+    assert config.battery_sn == "1"
+    assert (first.serial, first.panels, first.longitude, first.power_max) == ("1", [PANEL], 13.4, 600)
+    assert (second.serial, second.panels, second.longitude, second.power_max) == ("2", [east], 9.9, 800)
+    assert second.latitude == 52.5
+    assert first.grid_sensor is None
+    assert second.grid_sensor == {"type": Generic_Power, "topic": "meter/power"}
+
+
+@pytest.mark.parametrize("config", [
+    {"batteries": []},
+    {"batteries": {"battery_sn": "1"}},
+    # no panels, neither for the battery nor globally
+    {"batteries": [{"battery_sn": "1"}]},
+    # global sensors measure a single battery, they would be dropped silently
+    {"panels": [PANEL], "batteries": [{"battery_sn": "1"}], "optional": {"grid_sensor": {"type": "Generic_Power", "topic": "m"}}},
+    {"panels": [PANEL], "batteries": [{"battery_sn": "1"}], "optional": {"power_sensor": {"type": "Generic_Power", "topic": "m"}}},
+    {"panels": [PANEL], "battery_sn": "1", "runtime": "process"},
+])
+def test_rejects_invalid_configs(tmp_path, config):
+    with pytest.raises(ValueError):
+        load(tmp_path, config)
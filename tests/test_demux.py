@@ -0,0 +1,73 @@
+from ctrlsolar.mqtt.demux import Field, JsonTopicDemux, get_demux
+import json
+import pytest
+
+
+@pytest.fixture
+def loads(monkeypatch: pytest.MonkeyPatch) -> list[str]:
+    calls: list[str] = []
+    decode = json.loads
+
+    def counting_loads(payload: str):
+        calls.append(payload)
+        return decode(payload)
+
+    monkeypatch.setattr("ctrlsolar.mqtt.demux.json.loads", counting_loads)
+    return calls
+
+
+def test_payload_is_decoded_once(mqtt, loads):
+    demux = JsonTopicDemux("noah/state")
+    soc = demux.sensor(Field("soc"))
+    power = demux.sensor(Field(("battery", "power"), scale=0.1))
+    mode = demux.sensor(Field("mode", cast=str))
+
+    mqtt._dispatch("noah/state", '{"soc": 55, "battery": {"power": 1200}, "mode": "load_first"}')
+    assert len(loads) == 1
+    assert (soc.value, power.value, mode.value) == (55.0, 120.0, "load_first")
+    assert demux.last is not None and demux.last.data["soc"] == 55
+
+
+@pytest.mark.parametrize("payload, expected", [
+    ('{"other": 1}', -1),               # missing
+    ('{"soc": null}', -1),
+    ('{"soc": "n/a"}', -1),             # cannot be cast
+    ('{"soc": {"value": 1}}', -1),
+    ('[1, 2]', -1),                     # not an object
+    ('{"soc": "42"}', 42.0),
+])
+def test_field_defaults(mqtt, payload, expected):
+    demux = JsonTopicDemux("noah/state")
+    soc = demux.sensor(Field("soc", default=-1))
+    mqtt._dispatch("noah/state", payload)
+    assert soc.value == expected
+
+
+def test_malformed_payload_is_ignored(mqtt):
+    demux = JsonTopicDemux("noah/state")
+    soc = demux.sensor(Field("soc"))
+    mqtt._dispatch("noah/state", '{"soc": 55}')
+    last = demux.last
+
+    mqtt._dispatch("noah/state", '{"soc": 5')
+    assert soc.value == 55.0
+    assert demux.last is last
+    assert soc.history.values().tolist() == [55.0]
+
+
+def test_late_sensor_gets_the_last_message(mqtt):
+    demux = JsonTopicDemux("noah/state")
+    mqtt._dispatch("noah/state", '{"soc": 55}', retain=True)
+    assert demux.sensor(Field("soc")).value == 55.0
+
+
+def test_one_demux_per_topic_and_client(mqtt, loads):
+    first = get_demux("noah/1/state", via="noah/+/state")
+    assert get_demux("noah/1/state", via="noah/+/state") is first
+    assert get_demux("noah/2/state", via="noah/+/state") is not first
+    assert set(mqtt.demuxes) == {"noah/1/state", "noah/2/state"}
+    assert mqtt.subscribed == ["noah/+/state"]
+
+    soc = first.sensor(Field("soc"))
+    mqtt._dispatch("noah/1/state", '{"soc": 10}')
+    assert (soc.value, len(loads)) == (10.0, 1)
@@ -0,0 +1,72 @@
+from ctrlsolar.battery import Noah2000
+from ctrlsolar.clock import TickContext, VirtualClock, set_clock
+from ctrlsolar.controller import EnergyController
+from ctrlsolar.mqtt.topics import HOURLY_FORECAST_ATTRIBUTES_TOPIC_TEMPLATE, HOURLY_SOLAR_PRODUCTION_STATE_TOPIC_TEMPLATE
+from ctrlsolar.panels import create_panels
+from ctrlsolar.runtime import ControllerTask, update_concurrently
+from conftest import FixedWeather
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+import json
+
+PANELS = [{"tilt": 30, "azimuth": 180, "area": 2.0, "efficiency": 0.2}] * 4
+
+
+class SteppingClock(VirtualClock):
+    """Clock that moves on by `step` every time it is read."""
+
+    def __init__(self, start: datetime, step: timedelta):
+        super().__init__(start)
+        self.step = step
+        self.reads = 0
+
+    def now(self) -> datetime:
+        now = super().now()
+        self.reads += 1
+        self.advance(self.step)
+        return now
+
+
+def energy_controller(mqtt, serial: str, weather: FixedWeather) -> EnergyController:
+    battery = Noah2000.from_grobro(serial)
+    mqtt._dispatch(f"homeassistant/grobro/{serial}/availability", "online")
+    mqtt._dispatch(
+        f"homeassistant/grobro/{serial}/state",
+        json.dumps({"tot_bat_soc_pct": 60, "discharge_limit": 10, "charge_limit": 100, "bat_cnt": 1, "eng_out_device": 1.5}),
+    )
+    return EnergyController(battery, weather, create_panels(PANELS), p_min=100)
+
+
+def test_one_tick_for_the_controllers_and_their_monitors(mqtt, clock, monkeypatch):
+    weather = FixedWeather()
+    controllers = [energy_controller(mqtt, serial, weather) for serial in ("A1", "B2")]
+    contexts: list[tuple[str, TickContext]] = []
+    for controller in controllers:
+        for name in ("_forecast", "_monitor"):
+            sub = getattr(controller, name)
+
+            def update(context, *args, name=name, update=sub.update):
+                contexts.append((name, context))
+                return update(context, *args)
+
+            monkeypatch.setattr(sub, "update", update)
+
+    # every read of the clock crosses an hour, a second read within the round would show
+    stepping = SteppingClock(datetime(2024, 6, 1, 12, 50), step=timedelta(minutes=20))
+    set_clock(stepping)
+    tasks = [ControllerTask(controller, interval_s=600, verbose=False) for controller in controllers]
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        update_concurrently(tasks, executor)
+
+    assert stepping.reads == 1
+    assert sorted(name for name, _ in contexts) == ["_forecast", "_forecast", "_monitor", "_monitor"]
+    now = datetime(2024, 6, 1, 12, 50, tzinfo=clock.now().tzinfo)
+    # the forecast starts at midnight, in hourly slots
+    assert {context for _, context in contexts} == {TickContext(now=now, date=date(2024, 6, 1), hour=12, slot=12)}
+
+    # what is published belongs to the same hour and day
+    for serial in ("A1", "B2"):
+        forecast = [payload for topic, payload, _ in mqtt.sent if topic == HOURLY_FORECAST_ATTRIBUTES_TOPIC_TEMPLATE.format(device_id=serial)]
+        assert [int(hour) for hour in json.loads(forecast[-1])] == list(range(12, 24))
+        monitor = [payload for topic, payload, _ in mqtt.sent if topic == HOURLY_SOLAR_PRODUCTION_STATE_TOPIC_TEMPLATE.format(device_id=serial)]
+        assert monitor == ["2024-06-01"]
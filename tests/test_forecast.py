@@ -0,0 +1,110 @@
+from ctrlsolar.clock import TickContext
+from ctrlsolar.controller.forecast import EnergyForecast, ForecastBatch, ForecastCache
+from ctrlsolar.mqtt.topics import HOURLY_FORECAST_ATTRIBUTES_TOPIC_TEMPLATE
+from datetime import datetime
+from zoneinfo import ZoneInfo
+from ctrlsolar.panels.panels import GenericPanel, PanelGroup, create_panels, predicted_production_batch
+from conftest import FixedWeather
+import numpy as np
+import json
+import pytest
+
+
+def south_panels() -> PanelGroup:
+    return create_panels([
+        {"tilt": 45, "azimuth": 180, "area": 2.0, "efficiency": 0.2},
+        {"tilt": 45, "azimuth": 180, "area": 2.0, "efficiency": 0.2},
+    ])
+
+
+def east_west_panels() -> PanelGroup:
+    return create_panels([
+        {"tilt": 30, "azimuth": 90, "area": 1.5, "efficiency": 0.2},
+        {"tilt": 30, "azimuth": 270, "area": 1.5, "efficiency": 0.2},
+    ])
+
+
+def test_cache_counts_hits_and_misses():
+    weather = FixedWeather()
+    cache = ForecastCache(weather=weather, panels=south_panels())
+
+    first = cache.get()
+    assert cache.get() is first
+    assert (cache.hits, cache.misses) == (1, 1)
+    assert not first.energy.flags.writeable
+
+    weather.refresh()
+    assert cache.get() is not first
+    assert (cache.hits, cache.misses) == (1, 2)
+
+    cache.invalidate()
+    cache.get()
+    assert (cache.hits, cache.misses) == (1, 3)
+
+
+def test_cache_follows_panel_config():
+    weather = FixedWeather()
+    panel = GenericPanel(area=2.0, efficiency=0.2, tilt=45, azimuth=180)
+    cache = ForecastCache(weather=weather, panels=PanelGroup([panel]))
+    first = cache.get().energy.sum()
+
+    panel.efficiency = 0.1
+    assert cache.get().energy.sum() == pytest.approx(first / 2)
+    assert cache.misses == 2
+
+
+def test_batch_recomputes_all_members_at_once():
+    weather = FixedWeather()
+    batch = ForecastBatch(weather)
+    south = batch.add(south_panels())
+    east_west = batch.add(east_west_panels())
+
+    south.get()
+    # the miss of the first member computed the second one too
+    series = east_west.get()
+    assert (south.misses, east_west.misses) == (1, 0)
+    assert east_west.hits == 1
+    expected = predicted_production_batch([east_west_panels()], weather)[0]
+    np.testing.assert_allclose(series.energy, expected.energy)
+
+    weather.refresh()
+    east_west.get()
+    south.get()
+    assert (south.misses, east_west.misses) == (1, 1)
+    assert south.key == (2, south_panels().config_key)
+
+
+def test_weather_is_read_once_per_tick():
+    weather = FixedWeather()
+    forecast = EnergyForecast(weather, south_panels(), device_id="d")
+    context = TickContext.at(datetime(2024, 6, 1, 12, 0, tzinfo=ZoneInfo("Europe/Berlin")))
+
+    series = forecast.production_series(context)
+    calls = weather.calls
+    forecast.current_slot(context)
+    forecast.slot_power_estimate(12)
+    forecast.remaining_energy_production(12, 4)
+    forecast.remaining_production_slots(12, 100)
+    forecast.daily_production_estimate()
+    assert forecast.production_series() is series
+    assert weather.calls == calls
+
+    # the forecast cache checks for a new weather forecast on every tick
+    forecast.production_series(TickContext.at(datetime(2024, 6, 1, 12, 10, tzinfo=ZoneInfo("Europe/Berlin"))))
+    assert weather.calls == calls + 1
+
+
+def test_publishes_only_the_rest_of_today(mqtt):
+    # right after midnight, the forecast still starts on the previous day
+    forecast = EnergyForecast(FixedWeather(), south_panels(), device_id="d")
+    context = TickContext.at(datetime(2024, 6, 2, 0, 5, tzinfo=ZoneInfo("Europe/Berlin")))
+    forecast.update(context)
+
+    topic = HOURLY_FORECAST_ATTRIBUTES_TOPIC_TEMPLATE.format(device_id="d")
+    published = json.loads([payload for sent_topic, payload, _ in mqtt.sent if sent_topic == topic][-1])
+    hourly = forecast.hourly_production_estimates()
+    assert published == {str(hour): round(hourly[24 + hour], 2) for hour in range(24)}
+
+    forecast.update(TickContext.at(datetime(2024, 6, 2, 13, 30, tzinfo=ZoneInfo("Europe/Berlin"))))
+    published = json.loads([payload for sent_topic, payload, _ in mqtt.sent if sent_topic == topic][-1])
+    assert [int(hour) for hour in published] == list(range(13, 24))
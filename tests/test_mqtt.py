@@ -0,0 +1,139 @@
+from ctrlsolar.mqtt.mqtt import MqttSensor, TopicTrie, topic_matches
+from ctrlsolar.mqtt.outbox import PublishResult
+import pytest
+
+
+@pytest.mark.parametrize("topic_filter, topic, matches", [
+    ("a/b/c", "a/b/c", True),
+    ("a/b/c", "a/b", False),
+    ("a/+/c", "a/b/c", True),
+    ("a/+/c", "a/b/d", False),
+    ("a/+", "a/b/c", False),
+    ("a/#", "a/b/c", True),
+    ("a/#", "a", True),
+    ("#", "a/b", True),
+    ("+/+", "a/b", True),
+    ("#", "$SYS/broker", False),
+    ("+/broker", "$SYS/broker", False),
+    ("$SYS/#", "$SYS/broker", True),
+    ("a/b/#", "a/b", True),
+    ("a/+/#", "a", False),
+])
+def test_topic_matches(topic_filter, topic, matches):
+    assert topic_matches(topic_filter, topic) == matches
+
+
+def test_topic_matches_agrees_with_trie():
+    filters = ["a/+/c", "a/#", "+/#", "#", "a/b/#", "+", "+/+/+", "$SYS/+", "a//c", "/#"]
+    topics = ["a", "a/b", "a/b/c", "a//c", "/a", "$SYS/x", "b/b/c", "a/b/c/d"]
+    for topic_filter in filters:
+        trie = TopicTrie()
+        trie.insert(topic_filter, lambda topic, payload: None)
+        for topic in topics:
+            assert topic_matches(topic_filter, topic) == bool(trie.match(topic)), (topic_filter, topic)
+
+
+def test_trie_collects_all_handlers():
+    trie = TopicTrie()
+    calls: list[str] = []
+    for topic_filter in ("grobro/+/state", "grobro/#", "grobro/123/state", "other/#"):
+        trie.insert(topic_filter, lambda topic, payload, f=topic_filter: calls.append(f))
+
+    for handler in trie.match("grobro/123/state"):
+        handler("grobro/123/state", "")
+    assert sorted(calls) == ["grobro/#", "grobro/+/state", "grobro/123/state"]
+
+
+@pytest.mark.parametrize("topic_filter", ["a/#/b", "a/b+", "a#"])
+def test_trie_rejects_invalid_filters(topic_filter):
+    with pytest.raises(ValueError):
+        TopicTrie().insert(topic_filter, lambda topic, payload: None)
+
+
+def test_skips_retained_duplicates(mqtt):
+    assert mqtt.publish("a", {"x": 1}) is PublishResult.SENT
+    assert mqtt.publish("a", {"x": 1}) is PublishResult.DUPLICATE
+    assert mqtt.publish("a", {"x": 2}) is PublishResult.SENT
+    assert mqtt.publish("a", {"x": 2}, force=True) is PublishResult.SENT
+    # not retained, always sent
+    assert mqtt.publish("b", "on", retain=False)
+    assert mqtt.publish("b", "on", retain=False)
+
+    assert len(mqtt.sent) == 5
+    assert (mqtt.stats.published, mqtt.stats.skipped) == (5, 1)
+
+
+def test_skips_within_deadband(mqtt):
+    mqtt.set_deadband("power", 10)
+    assert mqtt._skip("power", 100, b"100", retain=False) is None
+
+    mqtt.publish("power", 100, retain=False)
+    assert mqtt.publish("power", 105, retain=False) is PublishResult.DEADBAND
+    assert mqtt.publish("power", 95.5, retain=False) is PublishResult.DEADBAND
+    assert mqtt.publish("power", 110, retain=False) is PublishResult.SENT
+    # measured from the last value sent, not the last one skipped
+    assert mqtt.publish("power", 99, retain=False) is PublishResult.SENT
+    # only numbers are compared
+    assert mqtt.publish("power", "off", retain=False) is PublishResult.SENT
+    assert [payload for _, payload, _ in mqtt.sent] == [100, 110, 99, "off"]
+
+
+def test_duplicate_is_checked_before_deadband(mqtt):
+    mqtt.set_deadband("power", 10)
+    mqtt.publish("power", 100)
+    assert mqtt.publish("power", 100) is PublishResult.DUPLICATE
+
+
+def test_reconnect_sends_everything_again(mqtt):
+    mqtt.set_deadband("power", 10)
+    mqtt.publish("state", "online")
+    mqtt.publish("power", 100)
+    mqtt.subscribe("grobro/+/state", lambda payload: None)
+
+    mqtt._on_connect(mqtt.client, None, None, 0)
+    assert mqtt.publish("state", "online") is PublishResult.SENT
+    assert mqtt.publish("power", 105) is PublishResult.SENT
+    assert mqtt.subscribed == ["grobro/+/state", "grobro/+/state"]
+
+
+def test_ack_callbacks(mqtt):
+    acks: list[str] = []
+    mqtt.publish("a", 1, on_ack=lambda: acks.append("a"))
+    # the acknowledgement of the second message arrives before it is tracked
+    mqtt._on_publish(mqtt.client, None, 2)
+    mqtt.publish("b", 1, on_ack=lambda: acks.append("b"))
+    assert acks == ["b"]
+
+    mqtt._on_publish(mqtt.client, None, 1)
+    assert acks == ["b", "a"]
+
+
+def test_routes_through_shared_subscription(mqtt):
+    received: list[tuple[str, str]] = []
+    mqtt.subscribe("grobro/1/state", lambda payload: received.append(("1", payload)), via="grobro/+/state")
+    mqtt.subscribe("grobro/2/state", lambda payload: received.append(("2", payload)), via="grobro/+/state")
+    assert mqtt.subscribed == ["grobro/+/state"]
+
+    mqtt._dispatch("grobro/2/state", "x")
+    mqtt._dispatch("grobro/3/state", "y")
+    assert received == [("2", "x")]
+
+    with pytest.raises(ValueError):
+        mqtt.subscribe("other/1", lambda payload: None, via="grobro/+/state")
+
+
+def test_later_routes_get_retained_messages(mqtt):
+    first = MqttSensor("grobro/1/state", via="grobro/+/state")
+    mqtt._dispatch("grobro/1/state", "1", retain=True)
+    mqtt._dispatch("grobro/2/state", "2", retain=True)
+    assert first.value == "1"
+
+    # the broker sends retained messages once per subscription, the new route gets them locally
+    second = MqttSensor("grobro/2/state", via="grobro/+/state")
+    assert second.value == "2"
+
+    # a live message replaces the retained one, an empty retained message clears it
+    mqtt._dispatch("grobro/2/state", "3")
+    assert MqttSensor("grobro/2/state", via="grobro/+/state").value == "3"
+    mqtt._dispatch("grobro/2/state", "", retain=True)
+    assert MqttSensor("grobro/2/state", via="grobro/+/state").value is None
@@ -0,0 +1,108 @@
+from ctrlsolar.mqtt.outbox import CommandQueue
+import pytest
+
+
+def acknowledge(mqtt, mid: int) -> None:
+    mqtt._on_publish(mqtt.client, None, mid)
+    return
+
+
+def test_one_command_in_flight(mqtt):
+    queue = CommandQueue(mqtt, "power")
+    queue.put(100)
+    queue.put(200)
+    queue.put(300)
+
+    assert [payload for _, payload, _ in mqtt.sent] == [100]
+    status = queue.status
+    assert (status.in_flight, status.pending, status.confirmed) == (100, 300, None)
+    assert (status.depth, status.coalesced) == (2, 1)
+
+    # only the newest value follows the acknowledgement
+    acknowledge(mqtt, 1)
+    assert [payload for _, payload, _ in mqtt.sent] == [100, 300]
+    status = queue.status
+    assert (status.in_flight, status.pending, status.confirmed, status.depth) == (300, None, 100, 1)
+
+    acknowledge(mqtt, 2)
+    status = queue.status
+    assert (status.in_flight, status.confirmed, status.depth) == (None, 300, 0)
+    assert status.latency_s is not None
+
+
+def test_unacknowledged_command_times_out(mqtt, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("ctrlsolar.mqtt.outbox.time.monotonic", lambda: now[0])
+    queue = CommandQueue(mqtt, "power", ack_timeout_s=30)
+    queue.put(100)
+    now[0] += 31
+    queue.put(200)
+    assert [payload for _, payload, _ in mqtt.sent] == [100, 200]
+
+    # the late acknowledgement of the first command does not confirm the second
+    acknowledge(mqtt, 1)
+    assert (queue.status.in_flight, queue.status.confirmed) == (200, None)
+
+
+def test_retained_duplicate_is_confirmed(mqtt):
+    queue = CommandQueue(mqtt, "power")
+    queue.put(100)
+    acknowledge(mqtt, 1)
+    queue.put(100)
+
+    assert len(mqtt.sent) == 1
+    status = queue.status
+    assert (status.in_flight, status.confirmed, status.depth) == (None, 100, 0)
+
+
+@pytest.mark.parametrize("retain", [True, False])
+def test_value_within_deadband_is_not_confirmed(mqtt, retain):
+    mqtt.set_deadband("power", 10)
+    queue = CommandQueue(mqtt, "power", retain=retain)
+    queue.put(100)
+    acknowledge(mqtt, 1)
+    queue.put(105)
+
+    # never sent, the device still runs the last confirmed value and nothing is left waiting
+    assert len(mqtt.sent) == 1
+    status = queue.status
+    assert (status.in_flight, status.confirmed, status.depth) == (None, 100, 0)
+
+    queue.put(120)
+    assert [payload for _, payload, _ in mqtt.sent] == [100, 120]
+
+
+def test_setpoint_is_reasserted(mqtt, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("ctrlsolar.mqtt.outbox.time.monotonic", lambda: now[0])
+    mqtt.set_deadband("power", 10)
+    queue = CommandQueue(mqtt, "power", reassert_s=300)
+    queue.put(100)
+    acknowledge(mqtt, 1)
+
+    now[0] += 299
+    queue.put(100)
+    queue.put(105)
+    assert len(mqtt.sent) == 1
+
+    # a device that was reset meanwhile gets its setpoint again, duplicate or within the deadband
+    now[0] += 1
+    queue.put(105)
+    assert [payload for _, payload, _ in mqtt.sent] == [100, 105]
+    acknowledge(mqtt, 2)
+    assert queue.status.confirmed == 105
+
+    now[0] += 10
+    queue.put(105)
+    assert len(mqtt.sent) == 2
+
+
+def test_reassert_can_be_disabled(mqtt, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("ctrlsolar.mqtt.outbox.time.monotonic", lambda: now[0])
+    queue = CommandQueue(mqtt, "power", reassert_s=None)
+    queue.put(100)
+    acknowledge(mqtt, 1)
+    now[0] += 3600
+    queue.put(100)
+    assert len(mqtt.sent) == 1
@@ -0,0 +1,59 @@
+from ctrlsolar.panels.abstract import Panel, ProductionSeries, Weather
+from ctrlsolar.panels.panels import GenericPanel, PanelGroup, create_panels, predicted_production_batch
+from datetime import timedelta
+from conftest import FixedWeather
+import numpy as np
+import pytest
+
+
+class ConstantPanel(Panel):
+    """Not a `GenericPanel`, so a `PanelGroup` has to ask it for its own forecast."""
+
+    def __init__(self, power_W: float):
+        self.power_W = power_W
+
+    @property
+    def config_key(self) -> tuple[object, ...]:
+        return (self.power_W,)
+
+    def predicted_production(self, weather: Weather) -> ProductionSeries:
+        times = weather.get()["times"].to_numpy(dtype="datetime64[ns]")
+        energy = np.full(len(times), self.power_W * (weather.resolution / timedelta(hours=1)))
+        return ProductionSeries(times=times, energy=energy, resolution=weather.resolution)
+
+
+def south_panels() -> PanelGroup:
+    return create_panels([
+        {"tilt": 45, "azimuth": 180, "area": 2.0, "efficiency": 0.2},
+        {"tilt": 45, "azimuth": 180, "area": 2.0, "efficiency": 0.2},
+    ])
+
+
+def east_west_panels() -> PanelGroup:
+    return PanelGroup([
+        GenericPanel(area=1.5, efficiency=0.2, tilt=30, azimuth=90, calibration=[0.9] * 24),
+        GenericPanel(area=1.5, efficiency=0.2, tilt=30, azimuth=270),
+        ConstantPanel(20.0),
+    ])
+
+
+@pytest.mark.parametrize("resolution", [timedelta(hours=1), timedelta(minutes=15)])
+def test_batch_matches_single_panels(resolution):
+    weather = FixedWeather(resolution)
+    groups = [south_panels(), east_west_panels()]
+    batch = predicted_production_batch(groups, weather)
+
+    for group, series in zip(groups, batch):
+        expected = sum(panel.predicted_production(weather).energy for panel in group._panels)
+        np.testing.assert_allclose(series.energy, expected, rtol=1e-12, atol=1e-9)
+        assert series.resolution == resolution
+        assert len(series.energy) == 2 * series.slots_per_day
+
+    assert batch[0].energy.max() > 0
+
+
+def test_group_merges_equal_orientations():
+    tilts, azimuths, weights = south_panels()._build_layout()
+    assert tilts.tolist() == [45.0]
+    assert azimuths.tolist() == [180.0]
+    np.testing.assert_allclose(weights, np.full((1, 24), 0.8))
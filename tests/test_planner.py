@@ -0,0 +1,55 @@
+from ctrlsolar.controller.planner import DayPlanner, taut_string
+import numpy as np
+import pytest
+
+
+def clear_day(peak: float = 400.0) -> list[float]:
+    return [max(peak * np.sin((hour - 5) / 15 * np.pi), 0.0) for hour in range(24)]
+
+
+def test_taut_string_stays_in_the_tube():
+    rng = np.random.default_rng(0)
+    for _ in range(50):
+        n = int(rng.integers(2, 60))
+        lower = np.cumsum(rng.uniform(-50, 100, n + 1))
+        upper = lower + rng.uniform(0, 200, n + 1)
+        lower[0], upper[0] = min(lower[0], 0.0), max(upper[0], 0.0)
+        lower[n] = upper[n]
+
+        path = taut_string(lower, upper)
+        assert path[0] == 0.0
+        assert path[n] == pytest.approx(upper[n])
+        assert np.all(path >= lower - 1e-6)
+        assert np.all(path <= upper + 1e-6)
+
+
+def test_taut_string_is_straight_without_constraints():
+    n = 10
+    lower, upper = np.full(n + 1, -1e9), np.full(n + 1, 1e9)
+    lower[n] = upper[n] = 50.0
+    path = taut_string(lower, upper)
+    np.testing.assert_allclose(path, np.linspace(0, 50, n + 1))
+
+
+def test_planner_fills_the_battery_by_the_end_of_production():
+    production = np.array(clear_day(600) + clear_day(600))
+    planner = DayPlanner(p_min=0, p_max=800)
+    plan = planner.plan(production, slot_hours=1.0, energy=500, capacity=2000)
+
+    full_at = plan.full_at
+    assert full_at is not None
+    assert not production[full_at] > 0
+    assert plan.energy[full_at] == pytest.approx(2000)
+    assert np.all(plan.energy >= -1e-6)
+    assert np.all(plan.energy <= 2000 + 1e-6)
+    assert np.all((plan.power >= 0) & (plan.power <= 800))
+    assert plan.target == pytest.approx(plan.power[0])
+
+
+def test_planner_output_is_flat_overnight():
+    # the stored energy is spread evenly over the night, it lasts exactly until the sun is back
+    production = np.array([0.0] * 8 + [1000.0] * 8 + [0.0] * 8)
+    plan = DayPlanner(p_min=0, p_max=800).plan(production, slot_hours=1.0, energy=800, capacity=5000)
+    night = plan.power[:8]
+    np.testing.assert_allclose(night, night[0])
+    assert night[0] == pytest.approx(100)
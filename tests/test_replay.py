@@ -0,0 +1,147 @@
+from ctrlsolar.battery import Noah2000
+from ctrlsolar.controller import ZeroExportController
+from ctrlsolar.mqtt.library import Generic_Power
+from ctrlsolar.mqtt.replay import MqttRecorder, RecordedMessage, ReplayMqtt, read_recording
+from conftest import BrokerStandIn
+from pathlib import Path
+from typing import Any
+import asyncio
+import gzip
+import json
+import signal
+import subprocess
+import sys
+import threading
+import time
+import pytest
+
+SERIAL = "ABC123"
+COMMAND_TOPIC = f"homeassistant/number/grobro/{SERIAL}/slot1_power/set"
+
+TRAFFIC = [
+    (f"homeassistant/grobro/{SERIAL}/availability", "online"),
+    (f"homeassistant/grobro/{SERIAL}/state", json.dumps({"tot_bat_soc_pct": 80, "out_power": 400, "bat_cnt": 1})),
+    ("meter/power", "150"),
+    ("meter/power", "unavailable"),
+    ("meter/power", "-220"),
+    (f"homeassistant/grobro/{SERIAL}/state", json.dumps({"tot_bat_soc_pct": 79, "out_power": 300, "bat_cnt": 1})),
+    ("meter/power", "40"),
+    ("other/topic", "ignored"),
+]
+
+
+class Session:
+    """The devices and the controller of one battery with a grid meter."""
+
+    def __init__(self):
+        self.battery = Noah2000.from_grobro(SERIAL)
+        self.meter = Generic_Power("meter/power")
+        self.controller = ZeroExportController(self.battery, self.meter, p_min=0, p_max=800, settle_s=0)
+        self.controller.set_target(600)
+        self.readings: list[tuple[Any, ...]] = []
+
+    def step(self) -> None:
+        self.controller.update()
+        self.readings.append((self.battery.online, self.battery.state_of_charge, self.meter.value))
+        return
+
+
+def test_replay_reproduces_a_recorded_session(mqtt, monkeypatch, tmp_path):
+    # one second between messages, the replay can step through them one by one
+    seconds = iter(range(1_700_000_000, 1_700_001_000))
+    monkeypatch.setattr("ctrlsolar.mqtt.replay.time.time", lambda: float(next(seconds)))
+    path = str(tmp_path / "session.jsonl.gz")
+    recorder = MqttRecorder(mqtt, path)
+    recorder.start()
+    live = Session()
+    for topic, payload in TRAFFIC:
+        mqtt._dispatch(topic, payload)
+        # the broker acknowledges every command right away, as the replay does
+        for mid in range(1, len(mqtt.sent) + 1):
+            mqtt._on_publish(mqtt.client, None, mid)
+        live.step()
+    recorder.stop()
+    assert recorder.count == len(TRAFFIC)
+
+    replay = ReplayMqtt(path, speed=0)
+    monkeypatch.setattr("ctrlsolar.mqtt.mqtt._mqtt", replay)
+    replayed = Session()
+    assert replay.advance(0) == 1
+    replayed.step()
+    while replay.advance(1) > 0:
+        replayed.step()
+
+    assert replayed.readings == live.readings
+    assert [message.payload for message in replay.published if message.topic == COMMAND_TOPIC] == [
+        str(payload) for topic, payload, _ in mqtt.sent if topic == COMMAND_TOPIC
+    ]
+    # the controller did react to the meter
+    assert len({payload for topic, payload, _ in mqtt.sent if topic == COMMAND_TOPIC}) > 1
+
+
+def test_recording_format(mqtt, monkeypatch, tmp_path):
+    now = [1_700_000_000.0]
+    monkeypatch.setattr("ctrlsolar.mqtt.replay.time.time", lambda: now[0])
+    path = tmp_path / "recording.jsonl"
+    recorder = MqttRecorder(mqtt, str(path), topics=["meter/#"])
+    recorder.start()
+    mqtt._dispatch("meter/power", "150")
+    now[0] += 1.2345
+    mqtt._dispatch("meter/power", '{"a": 1}')
+    mqtt._dispatch("other", "not recorded")
+    recorder.stop()
+
+    # one JSON array of unix time, topic and payload per line
+    assert path.read_text().splitlines() == [
+        '[1700000000.0,"meter/power","150"]',
+        '[1700000001.234,"meter/power","{\\"a\\": 1}"]',
+    ]
+
+    # a restarted recorder appends
+    recorder.start()
+    now[0] += 10
+    mqtt._dispatch("meter/power", "170")
+    recorder.stop()
+    assert read_recording(str(path)) == [
+        RecordedMessage(t=0.0, topic="meter/power", payload="150"),
+        RecordedMessage(t=pytest.approx(1.234), topic="meter/power", payload='{"a": 1}'),
+        RecordedMessage(t=pytest.approx(11.2345, abs=1e-3), topic="meter/power", payload="170"),
+    ]
+
+
+def test_recorder_command_line(tmp_path):
+    # the stand-in broker runs on a loop of its own, the recorder in a separate process
+    loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    broker = BrokerStandIn()
+    asyncio.run_coroutine_threadsafe(broker.start(), loop).result(timeout=5)
+
+    path = tmp_path / "recording.jsonl.gz"
+    process = subprocess.Popen(
+        [
+            sys.executable, "-m", "ctrlsolar.mqtt.replay",
+            "--host", "127.0.0.1", "--port", str(broker.port),
+            "--output", str(path), "--topic", "meter/#",
+        ],
+        cwd=Path(__file__).parents[1],
+    )
+    try:
+        deadline = time.monotonic() + 10
+        while broker.subscribed != ["meter/#"] and time.monotonic() < deadline:
+            time.sleep(0.05)
+        assert broker.subscribed == ["meter/#"]
+
+        for payload in (b"150", b"160"):
+            loop.call_soon_threadsafe(broker.send, "meter/power", payload)
+        time.sleep(0.5)
+    finally:
+        process.send_signal(signal.SIGINT)
+        process.wait(timeout=10)
+        asyncio.run_coroutine_threadsafe(broker.stop(), loop).result(timeout=5)
+        loop.call_soon_threadsafe(loop.stop)
+
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        rows = [json.loads(line) for line in f]
+    assert [row[1:] for row in rows] == [["meter/power", "150"], ["meter/power", "160"]]
+    assert all(isinstance(row[0], float) and abs(row[0] - time.time()) < 60 for row in rows)
@@ -0,0 +1,225 @@
+from ctrlsolar.clock import TickContext, VirtualClock
+from ctrlsolar.controller.abstract import Controller
+from ctrlsolar.runtime import ControllerTask, TickSchedule, run_controllers, update_concurrently
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+from zoneinfo import ZoneInfo
+import asyncio
+import threading
+import pytest
+
+BERLIN = ZoneInfo("Europe/Berlin")
+
+
+class Time:
+    """Moves the global clock and `time.monotonic` together."""
+
+    def __init__(self, clock: VirtualClock, monkeypatch: pytest.MonkeyPatch):
+        self.clock = clock
+        self.monotonic = 1000.0
+        monkeypatch.setattr("ctrlsolar.runtime.time.monotonic", lambda: self.monotonic)
+
+    def set(self, now: datetime) -> None:
+        # in UTC, the difference of local times is off by a daylight saving change
+        self.advance(now.astimezone(timezone.utc) - self.clock.now().astimezone(timezone.utc))
+        return
+
+    def advance(self, delta: timedelta) -> None:
+        self.clock.advance(delta)
+        self.monotonic += delta.total_seconds()
+        return
+
+
+@pytest.fixture
+def ticks(clock: VirtualClock, monkeypatch: pytest.MonkeyPatch) -> Time:
+    return Time(clock, monkeypatch)
+
+
+def next_tick(schedule: TickSchedule, tz: ZoneInfo = BERLIN) -> datetime:
+    return datetime.fromtimestamp(schedule._due, tz)
+
+
+def run_update(schedule: TickSchedule, ticks: Time, duration: timedelta = timedelta(0)) -> None:
+    schedule.begin()
+    ticks.advance(duration)
+    schedule.finish()
+    return
+
+
+@pytest.mark.parametrize("now, interval_s, slot_s, expected", [
+    (datetime(2024, 6, 1, 12, 3, 20), 600, 3600, datetime(2024, 6, 1, 12, 10)),
+    (datetime(2024, 6, 1, 12, 10), 600, 3600, datetime(2024, 6, 1, 12, 20)),
+    # always a tick at the start of the slot
+    (datetime(2024, 6, 1, 12, 50), 1000, 3600, datetime(2024, 6, 1, 13, 0)),
+    (datetime(2024, 6, 1, 12, 14), 600, 900, datetime(2024, 6, 1, 12, 15)),
+    (datetime(2024, 6, 1, 12, 16), 600, 900, datetime(2024, 6, 1, 12, 25)),
+    # slots start at the local hour, across the change to daylight saving time
+    (datetime(2024, 3, 31, 1, 55), 600, 3600, datetime(2024, 3, 31, 3, 0)),
+])
+def test_ticks_are_aligned_to_slots(ticks, now, interval_s, slot_s, expected):
+    ticks.set(now.replace(tzinfo=BERLIN))
+    schedule = TickSchedule(interval_s, slot_s=slot_s)
+    run_update(schedule, ticks)
+
+    assert next_tick(schedule) == expected.replace(tzinfo=BERLIN)
+    assert schedule.remaining_s() == pytest.approx(next_tick(schedule).timestamp() - ticks.clock.now().timestamp())
+
+
+def test_half_hour_offset(ticks):
+    kolkata = ZoneInfo("Asia/Kolkata")
+    ticks.clock.set(datetime(2024, 6, 1, 12, 3, tzinfo=kolkata))
+    schedule = TickSchedule(600, slot_s=3600)
+    run_update(schedule, ticks)
+    assert next_tick(schedule, kolkata) == datetime(2024, 6, 1, 12, 10, tzinfo=kolkata)
+
+
+def test_phase_does_not_drift(ticks):
+    ticks.set(datetime(2024, 6, 1, 12, 0, tzinfo=BERLIN))
+    schedule = TickSchedule(600, slot_s=3600)
+    for _ in range(10):
+        run_update(schedule, ticks, timedelta(seconds=37))
+        ticks.advance(timedelta(seconds=schedule.remaining_s()))
+
+    assert ticks.clock.now() == datetime(2024, 6, 1, 13, 40, tzinfo=BERLIN)
+    assert schedule.ticks == 10
+    assert (schedule.late, schedule.skipped) == (0, 0)
+
+
+def test_overrun_skips_ticks(ticks):
+    ticks.set(datetime(2024, 6, 1, 12, 9, 50, tzinfo=BERLIN))
+    schedule = TickSchedule(600, slot_s=3600)
+    run_update(schedule, ticks, timedelta(minutes=11, seconds=10))
+
+    assert schedule.skipped == 2
+    assert next_tick(schedule) == datetime(2024, 6, 1, 12, 30, tzinfo=BERLIN)
+
+
+def test_slot_start_is_caught_up(ticks):
+    ticks.set(datetime(2024, 6, 1, 12, 55, tzinfo=BERLIN))
+    schedule = TickSchedule(600, slot_s=3600)
+    run_update(schedule, ticks, timedelta(minutes=10))
+
+    # the tick at 13:00 runs right away, the first update of the slot sees its new target
+    assert schedule.skipped == 0
+    assert next_tick(schedule) == datetime(2024, 6, 1, 13, 0, tzinfo=BERLIN)
+    assert schedule.remaining_s() == 0
+
+
+def test_late_ticks_are_counted(ticks):
+    ticks.set(datetime(2024, 6, 1, 12, 5, tzinfo=BERLIN))
+    schedule = TickSchedule(600, slot_s=3600, tolerance_s=1.0)
+    run_update(schedule, ticks)
+    ticks.set(datetime(2024, 6, 1, 12, 10, 5, tzinfo=BERLIN))
+    run_update(schedule, ticks)
+
+    assert (schedule.ticks, schedule.late) == (2, 1)
+    assert schedule.max_late_s == pytest.approx(5)
+
+    # an update started early, e.g. by a trigger, is not a tick
+    run_update(schedule, ticks)
+    assert schedule.ticks == 2
+
+
+def test_rejects_invalid_intervals():
+    with pytest.raises(ValueError):
+        TickSchedule(0)
+
+
+class RecordingController(Controller):
+    def __init__(self, name: str, release: Optional[threading.Event] = None):
+        self.name = name
+        self.release = release
+        self.contexts: list[Optional[TickContext]] = []
+        self.threads: list[int] = []
+        self.released = False
+
+    def update(self, context: Optional[TickContext] = None) -> None:
+        self.threads.append(threading.get_ident())
+        self.contexts.append(context)
+        if self.release is not None:
+            self.released = self.release.wait(timeout=2)
+        return
+
+
+def run_until_updated(tasks: list[ControllerTask], during=None) -> None:
+    async def main() -> None:
+        runner = asyncio.create_task(run_controllers(tasks, startup_delay_s=0))
+        if during is not None:
+            await during()
+        async with asyncio.timeout(5):
+            while not all(task.latency.count > 0 for task in tasks):
+                await asyncio.sleep(0.01)
+        runner.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await runner
+        return
+
+    asyncio.run(main())
+    return
+
+
+def test_asyncio_updates_get_the_tick(clock):
+    controllers = [RecordingController("a"), RecordingController("b")]
+    run_until_updated([ControllerTask(controller, interval_s=600, verbose=False) for controller in controllers])
+
+    for controller in controllers:
+        assert controller.contexts == [TickContext.at(clock.now())]
+        assert controller.threads[0] != threading.get_ident()
+
+
+def test_slow_update_does_not_block_the_loop():
+    # the update only finishes once the event loop ran again
+    release = threading.Event()
+    slow = RecordingController("slow", release=release)
+
+    async def release_from_the_loop() -> None:
+        while not slow.contexts:
+            await asyncio.sleep(0.01)
+        release.set()
+        return
+
+    fast = RecordingController("fast")
+    run_until_updated(
+        [ControllerTask(slow, interval_s=600, verbose=False), ControllerTask(fast, interval_s=600, verbose=False)],
+        during=release_from_the_loop,
+    )
+    assert slow.released
+    assert len(slow.contexts) == len(fast.contexts) == 1
+
+
+def test_update_concurrently(clock):
+    # each update waits for the others, they only finish if they run at once
+    barrier = threading.Barrier(3, timeout=5)
+
+    class BarrierController(RecordingController):
+        def update(self, context: Optional[TickContext] = None) -> None:
+            super().update(context)
+            barrier.wait()
+            return
+
+    controllers = [BarrierController(name) for name in "abc"]
+    tasks = [ControllerTask(controller, interval_s=600, verbose=False) for controller in controllers]
+    with ThreadPoolExecutor(max_workers=3) as executor:
+        update_concurrently(tasks, executor)
+        clock.advance(timedelta(minutes=10))
+        update_concurrently(tasks, executor)
+        update_concurrently([], executor)
+
+    for controller in controllers:
+        assert controller.contexts == [TickContext.at(clock.now() - timedelta(minutes=10)), TickContext.at(clock.now())]
+    assert all(task.latency.count == 2 for task in tasks)
+
+
+def test_failed_update_does_not_stop_the_others(clock):
+    class FailingController(RecordingController):
+        def update(self, context: Optional[TickContext] = None) -> None:
+            raise RuntimeError("broker gone")
+
+    ok = RecordingController("ok")
+    tasks = [ControllerTask(FailingController("failing"), interval_s=600), ControllerTask(ok, interval_s=600)]
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        update_concurrently(tasks, executor)
+
+    assert len(ok.contexts) == 1
+    assert tasks[0].latency.count == 1
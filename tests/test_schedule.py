@@ -0,0 +1,66 @@
+from ctrlsolar.controller.schedule import Schedule
+from ctrlsolar.panels.abstract import ProductionSeries
+from datetime import date, timedelta
+import numpy as np
+import pytest
+
+
+def production_series(power: list[float], first_day: str = "2024-06-01", slot_minutes: int = 60) -> ProductionSeries:
+    resolution = timedelta(minutes=slot_minutes)
+    times = np.datetime64(first_day, "ns") + np.arange(len(power)) * np.timedelta64(resolution)
+    energy = np.asarray(power, dtype=float) * (resolution / timedelta(hours=1))
+    return ProductionSeries(times=times, energy=energy, resolution=resolution)
+
+
+def clear_day(peak: float = 400.0) -> list[float]:
+    return [max(peak * np.sin((hour - 5) / 15 * np.pi), 0.0) for hour in range(24)]
+
+
+def test_schedule_splits_days():
+    series = production_series(clear_day() + [0.0] * 24 + clear_day()[:12])
+    schedule = Schedule.build(series, p_min=100, key=("k",))
+
+    assert len(schedule) == 60
+    assert schedule.date == date(2024, 6, 1)
+    production = np.flatnonzero(schedule.production).tolist()
+    first_day = [hour for hour in range(24) if clear_day()[hour] > 100]
+    assert production == first_day + [48 + hour for hour in first_day if hour < 12]
+    assert schedule.is_battery_slot(0)
+    assert schedule.is_production_slot(12)
+
+    # hours until the next production period, the end of the forecast if there is none
+    assert schedule.hours_until_production(0) == first_day[0]
+    assert schedule.hours_until_production(first_day[-1]) == 48 + first_day[0] - first_day[-1]
+    assert schedule.hours_until_production(59) == 1
+    assert schedule.matches(("k",), date(2024, 6, 1))
+    assert not schedule.matches(("k",), date(2024, 6, 2))
+
+
+def test_production_period_bridges_clouds():
+    power = [0.0] * 8 + [150, 300, 50, 50, 300, 100] + [0.0] * 10
+    schedule = Schedule.build(production_series(power), p_min=100, key=())
+    assert np.flatnonzero(schedule.production).tolist() == list(range(8, 14))
+
+
+@pytest.mark.parametrize("slot_minutes", [60, 15])
+def test_incremental_build_matches_full_build(slot_minutes):
+    rng = np.random.default_rng(slot_minutes)
+    per_day = 24 * 60 // slot_minutes
+    power = rng.uniform(0, 300, size=4 * per_day) * np.tile(np.sin(np.linspace(0, np.pi, per_day)), 4)
+
+    previous = Schedule.build(production_series(power[: 3 * per_day], slot_minutes=slot_minutes), 100, key=(1,))
+    cases = [
+        ("2024-06-01", power[: 3 * per_day]),                       # unchanged
+        ("2024-06-01", np.concatenate([power[:per_day], 0.5 * power[per_day : 3 * per_day]])),
+        ("2024-06-02", power[per_day : 4 * per_day]),               # day rollover
+        ("2024-06-02", power[per_day : 3 * per_day + per_day // 2]),  # partial last day
+        ("2024-06-05", power[: 2 * per_day]),                       # nothing in common
+    ]
+    for first_day, values in cases:
+        series = production_series(values.tolist(), first_day, slot_minutes)
+        incremental = Schedule.build(series, 100, key=(2,), previous=previous)
+        full = Schedule.build(series, 100, key=(2,))
+        assert incremental.date == full.date
+        np.testing.assert_array_equal(incremental.production, full.production)
+        np.testing.assert_array_equal(incremental.until_production, full.until_production)
+        previous = incremental
@@ -0,0 +1,110 @@
+from ctrlsolar.clock import get_clock
+from ctrlsolar.mqtt.replay import ReplayMqtt
+from ctrlsolar.panels import create_panels
+from ctrlsolar.simulation import Backtest, HistoricalWeather, SimulatedBattery
+from conftest import historical_weather
+from datetime import date, datetime, timedelta
+import numpy as np
+import pandas as pd
+import pytest
+
+PANELS = [{"tilt": 30, "azimuth": 180, "area": 2.0, "efficiency": 0.2}] * 4
+
+
+def test_battery_stops_at_the_discharge_limit():
+    battery = SimulatedBattery(capacity_per_battery=1000, state_of_charge=0.2, discharge_limit=0.1)
+    battery.output_power = 400
+    assert battery.step(0, seconds=900) == pytest.approx(100)
+    assert battery.state_of_charge == pytest.approx(0.1)
+    assert battery.output_power == pytest.approx(400)
+
+    # the limit holds, only solar power is passed on
+    assert battery.step(0, seconds=3600) == 0
+    assert battery.step(150, seconds=3600) == pytest.approx(150)
+    assert battery.state_of_charge == pytest.approx(0.1)
+
+
+def test_battery_passes_surplus_on_when_full():
+    battery = SimulatedBattery(capacity_per_battery=1000, state_of_charge=0.9, charge_limit=1.0)
+    battery.output_power = 0
+    # 100 Wh fit, the rest is passed to the output
+    assert battery.step(600, seconds=3600) == pytest.approx(500)
+    assert battery.state_of_charge == pytest.approx(1.0)
+    assert battery.curtailed_Wh == 0
+
+    # beyond max_power the surplus is curtailed
+    assert battery.step(1000, seconds=3600) == pytest.approx(800)
+    assert battery.curtailed_Wh == pytest.approx(200)
+    assert battery.energy_out == pytest.approx(1300)
+
+
+def test_battery_limits_the_setpoint():
+    battery = SimulatedBattery()
+    battery.output_power = 2000
+    assert battery.output_power_status.confirmed == 800
+    battery.output_power = -50
+    assert battery.output_power_status.confirmed == 0
+
+
+def test_historical_weather_follows_the_clock(clock):
+    weather = historical_weather()
+    clock.set(datetime(2024, 6, 2, 8))
+    first = weather.get()
+    assert weather.version == 1
+    assert first["times"].iloc[0] == pd.Timestamp("2024-06-02")
+    # the day of now plus the horizon, completely
+    assert first["times"].iloc[-1] == pd.Timestamp("2024-06-03 23:00")
+
+    clock.advance(timedelta(hours=10))
+    assert weather.get() is first
+    clock.set(datetime(2024, 6, 3, 0, 5))
+    assert weather.get()["times"].iloc[0] == pd.Timestamp("2024-06-03")
+    assert weather.version == 2
+
+
+def test_historical_weather_is_memory_mapped(clock, tmp_path):
+    weather = historical_weather()
+    weather.save(str(tmp_path))
+    loaded = HistoricalWeather.load(str(tmp_path), 52.52, 13.41, "Europe/Berlin", horizon=timedelta(hours=24))
+
+    assert isinstance(loaded._values, np.memmap)
+    assert (loaded.first_day, loaded.last_day) == (date(2024, 6, 1), date(2024, 6, 4))
+    pd.testing.assert_frame_equal(loaded.get(), weather.get())
+
+
+def test_backtest_is_deterministic(clock, monkeypatch):
+    monkeypatch.setattr("ctrlsolar.mqtt.mqtt._mqtt", ReplayMqtt())
+
+    def run() -> pd.DataFrame:
+        backtest = Backtest(
+            weather=historical_weather(),
+            panels=create_panels(PANELS),
+            battery=SimulatedBattery(state_of_charge=0.5),
+            p_min=100,
+            p_max=800,
+            load_W=250.0,
+        )
+        return backtest.run(date(2024, 6, 1), date(2024, 6, 2))
+
+    results = run()
+    pd.testing.assert_frame_equal(results, run())
+    # the global clock is restored
+    assert get_clock() is clock
+
+    assert results["date"].tolist() == [date(2024, 6, 1), date(2024, 6, 2)]
+    first = results.iloc[0]
+    assert first.solar_Wh > 0
+    # energy balance of the battery over the day
+    capacity = SimulatedBattery().capacity
+    stored = (first.soc_end - 0.5) * capacity
+    assert first.solar_Wh == pytest.approx(first.output_Wh + stored + first.curtailed_Wh)
+    assert first.self_consumed_Wh + first.exported_Wh == pytest.approx(first.output_Wh)
+    assert first.load_Wh == pytest.approx(250 * 24)
+    assert 0.1 <= results["soc_end"].min() and results["soc_end"].max() <= 1.0
+
+
+def test_backtest_needs_the_weather_of_the_period(monkeypatch):
+    monkeypatch.setattr("ctrlsolar.mqtt.mqtt._mqtt", ReplayMqtt())
+    backtest = Backtest(historical_weather(), create_panels(PANELS), SimulatedBattery(), p_min=100, p_max=800)
+    with pytest.raises(ValueError):
+        backtest.run(date(2024, 6, 3), date(2024, 6, 6))
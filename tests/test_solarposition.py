@@ -0,0 +1,60 @@
+from ctrlsolar.panels.solarposition import SolarPositionTable
+from pvlib.location import Location  # type:ignore
+from pvlib.solarposition import get_solarposition  # type:ignore
+from datetime import timedelta
+import numpy as np
+import pandas as pd
+import pytest
+
+SITES = [
+    (52.52, 13.41, "Europe/Berlin"),
+    (-36.85, 174.76, "Pacific/Auckland"),
+    (37.77, -122.42, "America/Los_Angeles"),
+]
+
+# naive local times, around the year boundary the UTC year differs from the local one
+# a wrong time zone would be off by degrees, batched pvlib calls differ by about 1e-5
+TIMES = pd.DatetimeIndex([
+    "2024-06-21 12:00",
+    "2024-03-31 03:00",
+    "2024-12-31 23:00",
+    "2025-01-01 00:00",
+    "2025-01-01 09:00",
+    "2024-01-01 00:00",
+])
+
+
+@pytest.mark.parametrize("latitude, longitude, tz", SITES)
+def test_lookup_matches_pvlib(latitude, longitude, tz):
+    location = Location(latitude, longitude, tz=tz)
+    table = SolarPositionTable(location)
+    result = table.lookup(TIMES)
+
+    # naive timestamps are local time of the location
+    expected = get_solarposition(TIMES.tz_localize(tz), latitude, longitude, altitude=location.altitude)
+    np.testing.assert_allclose(result["apparent_zenith"], expected["apparent_zenith"], atol=1e-3)
+    np.testing.assert_allclose(result["azimuth"], expected["azimuth"], atol=1e-3)
+    assert result.index.equals(TIMES)
+
+    aware = table.lookup(TIMES.tz_localize(tz).tz_convert("UTC"))
+    np.testing.assert_allclose(aware.to_numpy(), result.to_numpy())
+
+
+def test_off_grid_times_are_computed():
+    location = Location(52.52, 13.41, tz="Europe/Berlin")
+    times = pd.DatetimeIndex(["2024-06-21 12:07:30", "2024-06-21 13:00"])
+    result = SolarPositionTable(location).lookup(times)
+    expected = get_solarposition(times.tz_localize("Europe/Berlin"), 52.52, 13.41, altitude=location.altitude)
+    np.testing.assert_allclose(result["azimuth"], expected["azimuth"], atol=1e-3)
+
+
+def test_tables_are_stored_and_memory_mapped(tmp_path):
+    location = Location(52.52, 13.41, tz="Europe/Berlin")
+    times = pd.date_range("2024-06-21", periods=96, freq="15min")
+    first = SolarPositionTable(location, resolution=timedelta(minutes=15), cache_dir=str(tmp_path)).lookup(times)
+    assert [path.suffix for path in tmp_path.iterdir()] == [".npy"]
+
+    table = SolarPositionTable(location, resolution=timedelta(minutes=15), cache_dir=str(tmp_path))
+    _, values = table.table(2024)
+    assert isinstance(values, np.memmap)
+    np.testing.assert_allclose(table.lookup(times).to_numpy(), first.to_numpy())
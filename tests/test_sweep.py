@@ -0,0 +1,57 @@
+from ctrlsolar.simulation import sweep
+from ctrlsolar.simulation.sweep import SweepSetup, parameter_grid, run_sweep, sample_grid
+from conftest import historical_weather
+from datetime import date
+import numpy as np
+import pytest
+
+PANELS = [{"tilt": 30, "azimuth": 180, "area": 2.0, "efficiency": 0.2}] * 4
+
+
+def test_parameter_grid():
+    grid = parameter_grid({"power_max": [600, 800], "calibration": [0.9, 1.0, 1.1]})
+    assert len(grid) == 6
+    assert grid[0] == {"power_max": 600, "calibration": 0.9}
+    assert grid[-1] == {"power_max": 800, "calibration": 1.1}
+
+    assert sample_grid(grid, 10) == grid
+    sample = sample_grid(grid, 3, seed=1)
+    assert len(sample) == 3 and all(candidate in grid for candidate in sample)
+    assert sample_grid(grid, 3, seed=1) == sample
+
+    with pytest.raises(ValueError):
+        parameter_grid({"kp": [0.1]})
+
+
+def test_sweep_on_shared_weather(tmp_path, monkeypatch):
+    historical_weather().save(str(tmp_path))
+    setup = SweepSetup(
+        weather_dir=str(tmp_path),
+        latitude=52.52,
+        longitude=13.41,
+        timezone="Europe/Berlin",
+        horizon_h=24,
+        panels=PANELS,
+        start=date(2024, 6, 1),
+        end=date(2024, 6, 1),
+        power_min=100,
+        power_max=800,
+        update_interval_s=900,
+    )
+    candidates = parameter_grid({"power_max": [300, 800]})
+    results = run_sweep(setup, candidates, workers=1, rank_by="self_consumed_kWh")
+
+    assert results["rank"].tolist() == [1, 2]
+    assert sorted(results["power_max"].tolist()) == [300, 800]
+    assert results["self_consumed_kWh"].is_monotonic_decreasing
+
+    # the worker maps the saved weather instead of loading a copy, and computes what a local run does
+    monkeypatch.setattr(sweep, "_setup", None)
+    monkeypatch.setattr(sweep, "_weather", None)
+    sweep._init_worker(setup)
+    assert sweep._weather is not None and isinstance(sweep._weather._values, np.memmap)
+    for candidate in candidates:
+        local = sweep._run_candidate(candidate)
+        row = results[results["power_max"] == candidate["power_max"]].iloc[0]
+        for metric in ("self_consumed_kWh", "exported_kWh", "curtailed_kWh", "soc_end_min"):
+            assert row[metric] == pytest.approx(local[metric])
@@ -0,0 +1,172 @@
+from ctrlsolar.battery import Noah2000
+from ctrlsolar.controller import PowerTracker, ZeroExportController
+from ctrlsolar.controller.tracking import PIController
+from ctrlsolar.mqtt.library import Generic_Power, Shelly1PM_Power, ShellyPro3EM_Power
+import json
+import pytest
+
+SERIAL = "ABC123"
+
+
+class Plant:
+    """A battery whose AC output falls short of its setpoint by the inverter losses, measured by a meter."""
+
+    def __init__(self, mqtt, monkeypatch: pytest.MonkeyPatch, efficiency: float = 0.9):
+        self.mqtt = mqtt
+        self.efficiency = efficiency
+        self.now = 1000.0
+        # sensor timestamps and controller updates share `time.monotonic`
+        monkeypatch.setattr("ctrlsolar.controller.tracking.time.monotonic", lambda: self.now)
+        self.battery = Noah2000.from_grobro(SERIAL)
+        mqtt._dispatch(f"homeassistant/grobro/{SERIAL}/availability", "online")
+        self.meter = Generic_Power("meter/ac")
+
+    def measure(self, payload: str) -> None:
+        self.mqtt._dispatch("meter/ac", payload)
+        return
+
+    def step(self, tracker: PowerTracker, seconds: float = 5) -> float:
+        """Advance by `seconds`, report the output of the current setpoint and update."""
+        self.now += seconds
+        assert tracker.setpoint is not None
+        self.measure(str(self.efficiency * round(tracker.setpoint)))
+        tracker.update()
+        return self.efficiency * round(tracker.setpoint)
+
+
+def test_pi_freezes_the_integral_when_saturated():
+    pi = PIController(kp=0.5, ki=0.1, output_min=-100, output_max=100)
+    assert pi.step(10, dt=5) == pytest.approx(0.5 * 10 + 5)
+    assert pi.step(10, dt=5, saturated_high=True) == pytest.approx(5 + 5)
+    assert pi.integral == pytest.approx(5)
+
+    # an error away from the limit still integrates
+    pi.step(-10, dt=5, saturated_high=True)
+    assert pi.integral == pytest.approx(0)
+
+    # the integral itself is clamped as well
+    for _ in range(100):
+        pi.step(1000, dt=5)
+    assert pi.integral == 100
+    assert pi.step(-1000, dt=0) == -100
+
+
+def test_converges_on_a_setpoint_step(mqtt, monkeypatch):
+    plant = Plant(mqtt, monkeypatch)
+    tracker = PowerTracker(plant.battery, plant.meter, p_min=0, p_max=800, max_step_W=50)
+    tracker.set_target(400)
+    plant.step(tracker)
+    for _ in range(60):
+        output = plant.step(tracker)
+    assert output == pytest.approx(400, abs=2)
+
+    tracker.set_target(250)
+    outputs = [plant.step(tracker) for _ in range(60)]
+    assert outputs[-1] == pytest.approx(250, abs=2)
+    # the setpoint moves by at most max_step_W per update
+    assert all(abs(b - a) <= 50 * plant.efficiency + 1 for a, b in zip(outputs, outputs[1:]))
+
+
+def test_no_windup_at_the_power_limits(mqtt, monkeypatch):
+    plant = Plant(mqtt, monkeypatch)
+    tracker = PowerTracker(plant.battery, plant.meter, p_min=200, p_max=800, max_correction_W=200)
+    tracker.set_target(800)
+    for _ in range(100):
+        plant.step(tracker)
+    # the output cannot reach the target, the setpoint stays at p_max without the integral running away
+    assert tracker.setpoint == 800
+    assert tracker._pi.integral < 30
+
+    tracker.set_target(400)
+    outputs = [plant.step(tracker) for _ in range(30)]
+    # a wound-up integral would first have to unwind, overshooting below the new target
+    assert min(outputs) > 350
+    assert outputs[15] == pytest.approx(400, abs=10)
+    assert outputs[-1] == pytest.approx(400, abs=2)
+
+    # same at the lower limit, the output of p_min is above the target
+    integral = tracker._pi.integral
+    tracker.set_target(150)
+    for _ in range(100):
+        plant.step(tracker)
+    assert tracker.setpoint == 200
+    assert tracker._pi.integral > integral - 30
+
+
+@pytest.mark.parametrize("payload", ["unavailable", "nan", "NaN"])
+def test_holds_the_setpoint_without_valid_measurements(mqtt, monkeypatch, payload):
+    plant = Plant(mqtt, monkeypatch)
+    tracker = PowerTracker(plant.battery, plant.meter, p_min=0, p_max=800, max_age_s=30)
+    tracker.set_target(400)
+    plant.now += 5
+    plant.measure(payload)
+    tracker.update()
+    plant.now += 5
+    tracker.update()
+    assert tracker.setpoint == 400
+
+    # a stale measurement is not used either
+    plant.measure("200")
+    plant.now += 31
+    tracker.update()
+    assert tracker.setpoint == 400
+
+    plant.now += 1
+    plant.measure("360")
+    tracker.update()
+    assert tracker.setpoint is not None and tracker.setpoint > 400
+
+
+def test_resets_while_the_battery_is_offline(mqtt, monkeypatch):
+    plant = Plant(mqtt, monkeypatch)
+    tracker = PowerTracker(plant.battery, plant.meter, p_min=0, p_max=800)
+    tracker.set_target(400)
+    for _ in range(10):
+        plant.step(tracker)
+    assert tracker._pi.integral > 0
+
+    mqtt._dispatch(f"homeassistant/grobro/{SERIAL}/availability", "offline")
+    setpoint = tracker.setpoint
+    plant.step(tracker)
+    assert (tracker._pi.integral, tracker.setpoint) == (0, setpoint)
+
+
+@pytest.mark.parametrize("sensor_type, topic, payload", [
+    # the Shelly 1PM between inverter and grid reports the inverter output as negative power
+    (Shelly1PM_Power, "shelly1pm/status/switch:0", json.dumps({"apower": -360.0})),
+    (Generic_Power, "meter/ac", "360"),
+])
+def test_output_sensor_sign(mqtt, monkeypatch, sensor_type, topic, payload):
+    plant = Plant(mqtt, monkeypatch)
+    sensor = sensor_type(topic.split("/status")[0] if "/status" in topic else topic)
+    tracker = PowerTracker(plant.battery, sensor, p_min=0, p_max=800)
+    tracker.set_target(400)
+    plant.now += 5
+    mqtt._dispatch(topic, payload)
+    tracker.update()
+
+    # an output below the target raises the setpoint
+    assert sensor.value == 360
+    assert tracker.setpoint is not None and tracker.setpoint > 400
+
+
+@pytest.mark.parametrize("sensor_type, topic, import_payload, export_payload", [
+    (ShellyPro3EM_Power, "pro3em/status/em:0", json.dumps({"total_act_power": 150}), json.dumps({"total_act_power": -150})),
+    (Generic_Power, "meter/grid", "150", "-150"),
+])
+def test_grid_sensor_sign(mqtt, monkeypatch, sensor_type, topic, import_payload, export_payload):
+    plant = Plant(mqtt, monkeypatch)
+    sensor = sensor_type(topic.split("/status")[0] if "/status" in topic else topic)
+    controller = ZeroExportController(plant.battery, sensor, p_min=0, p_max=800, settle_s=0)
+    controller.set_target(800)
+    controller._apply(400)
+
+    # import raises the output, export lowers it
+    mqtt._dispatch(topic, import_payload)
+    controller.update()
+    assert sensor.value == 150
+    assert controller.setpoint == pytest.approx(400 + 0.7 * 150)
+
+    mqtt._dispatch(topic, export_payload)
+    controller.update()
+    assert controller.setpoint == pytest.approx(400)
@@ -0,0 +1,138 @@
+from ctrlsolar.controller.trigger import ChangeTrigger
+from ctrlsolar.mqtt.abstract import Sensor
+from ctrlsolar.runtime import TickSchedule, run_scheduled
+from typing import Any
+import asyncio
+import threading
+import pytest
+
+
+class ValueSensor(Sensor):
+    @property
+    def value(self) -> Any:
+        return self._last
+
+
+class Monotonic:
+    """Stands in for `time.monotonic` and `time.sleep` of the trigger."""
+
+    def __init__(self, monkeypatch: pytest.MonkeyPatch):
+        self.now = 1000.0
+        self.slept: list[float] = []
+        monkeypatch.setattr("ctrlsolar.controller.trigger.time.monotonic", lambda: self.now)
+        monkeypatch.setattr("ctrlsolar.controller.trigger.time.sleep", self.sleep)
+
+    def sleep(self, seconds: float) -> None:
+        self.slept.append(seconds)
+        self.now += seconds
+        return
+
+
+@pytest.fixture
+def monotonic(monkeypatch: pytest.MonkeyPatch) -> Monotonic:
+    return Monotonic(monkeypatch)
+
+
+def test_fires_at_threshold_from_the_last_update(monotonic):
+    power = ValueSensor()
+    power._record(500)
+    trigger = ChangeTrigger(min_interval_s=0)
+    trigger.watch(power, threshold=100, name="power")
+
+    power._record(590)
+    power._record(410)
+    assert not trigger.wait(0)
+
+    # measured from the reference, not from the previous reading
+    power._record(400)
+    assert trigger.wait(0)
+    assert trigger.reason == "power: 500 -> 400"
+
+    trigger.arm()
+    assert not trigger.wait(0)
+    power._record(480)
+    assert not trigger.wait(0)
+    assert trigger.fired == 1
+
+
+def test_fires_on_any_change_without_threshold(monotonic):
+    available = ValueSensor()
+    trigger = ChangeTrigger(min_interval_s=0)
+    trigger.watch(available)
+    trigger.arm()
+
+    available._record(None)
+    assert not trigger.wait(0)
+    available._record("offline")
+    assert trigger.wait(0)
+
+    # a non-numeric reading of a numeric sensor is a change as well
+    power = ValueSensor()
+    power._record(100)
+    trigger = ChangeTrigger(min_interval_s=0)
+    trigger.watch(power, threshold=50)
+    power._record("unavailable")
+    assert trigger.wait(0)
+
+
+def test_updates_keep_the_minimum_interval(monotonic):
+    power = ValueSensor()
+    power._record(0)
+    trigger = ChangeTrigger(min_interval_s=30)
+    trigger.watch(power, threshold=100)
+    trigger.arm()
+
+    monotonic.now += 10
+    power._record(200)
+    assert trigger.wait(0)
+    assert monotonic.slept == [pytest.approx(20)]
+
+    trigger.arm()
+    monotonic.now += 45
+    power._record(0)
+    assert trigger.wait(0)
+    assert monotonic.slept == [pytest.approx(20)]
+
+
+def test_wakes_the_waiting_loop():
+    power = ValueSensor()
+    power._record(0)
+    trigger = ChangeTrigger(min_interval_s=0)
+    trigger.watch(power, threshold=100)
+    stop = threading.Event()
+    updates: list[int] = []
+
+    def update() -> None:
+        updates.append(power.value)
+        if len(updates) == 2:
+            stop.set()
+        return
+
+    thread = threading.Thread(target=run_scheduled, args=(update, TickSchedule(3600), stop, trigger))
+    thread.start()
+    while not updates:
+        stop.wait(0.01)
+
+    # the reading arrives on another thread, long before the next tick
+    power._record(150)
+    thread.join(timeout=5)
+    assert not thread.is_alive()
+    assert updates == [0, 150]
+    assert trigger.fired == 1
+
+
+def test_wakes_the_asyncio_loop():
+    power = ValueSensor()
+    power._record(0)
+    trigger = ChangeTrigger(min_interval_s=0)
+    trigger.watch(power, threshold=100, name="power")
+    trigger.arm()
+
+    async def main() -> bool:
+        waiting = asyncio.create_task(trigger.wait_async(5))
+        await asyncio.sleep(0)
+        await asyncio.to_thread(power._record, 150)
+        return await waiting
+
+    assert asyncio.run(main())
+    assert trigger.reason == "power: 0 -> 150"
@@ -0,0 +1,230 @@
+from ctrlsolar.clock import VirtualClock
+from ctrlsolar.panels.cache import WeatherCache
+from ctrlsolar.panels.weather import OpenMeteoWeather
+from datetime import datetime, timedelta
+import pandas as pd
+import pytest
+import requests
+import time
+
+
+def create_weather(url: str, cache_dir=None, **kwargs) -> OpenMeteoWeather:
+    return OpenMeteoWeather(
+        latitude=52.52,
+        longitude=13.41,
+        timezone="Europe/Berlin",
+        cache_dir=cache_dir,
+        base_url=url,
+        **{"retries": 0, **kwargs},
+    )
+
+
+def test_cache_ttl(tmp_path, clock):
+    cache = WeatherCache(str(tmp_path), ttl_s=60)
+    key = {"latitude": 52.52, "start_date": "2024-06-01"}
+    cache.store(key, {"time": ["2024-06-01T00:00"]})
+
+    assert cache.load(key).data == {"time": ["2024-06-01T00:00"]}
+    assert cache.load(key).fetched_at == clock.now().timestamp()
+    assert cache.load({**key, "start_date": "2024-06-02"}) is None
+
+    clock.advance(timedelta(seconds=61))
+    assert cache.load(key) is None
+    assert cache.load(key, allow_expired=True).data == {"time": ["2024-06-01T00:00"]}
+    assert [k for k, _ in cache.entries()] == [key]
+
+
+def test_cache_prunes_old_entries(tmp_path, clock):
+    cache = WeatherCache(str(tmp_path), ttl_s=60, keep_s=600)
+    cache.store({"day": "2024-06-01"}, {})
+    clock.advance(timedelta(seconds=300))
+    cache.store({"day": "2024-06-02"}, {})
+    cache.store({"day": "2024-06-03"}, {})
+    assert len(list(cache.entries())) == 3
+
+    clock.advance(timedelta(seconds=301))
+    cache.store({"day": "2024-06-04"}, {}, keep=lambda key: key["day"] >= "2024-06-03")
+    assert sorted(key["day"] for key, _ in cache.entries()) == ["2024-06-03", "2024-06-04"]
+    # newest first
+    assert [key["day"] for key, _ in cache.entries()][0] == "2024-06-04"
+
+
+def test_cache_ignores_broken_files(tmp_path):
+    cache = WeatherCache(str(tmp_path))
+    key = {"latitude": 52.52}
+    cache.store(key, {"time": []})
+    with open(cache._path(key), "w") as f:
+        f.write("{")
+
+    assert cache.load(key) is None
+    assert list(cache.entries()) == []
+
+
+def test_forecast_starts_today(open_meteo, clock):
+    weather = create_weather(open_meteo.url)
+    forecast = weather.get()
+
+    assert forecast["times"].iloc[0] == pd.Timestamp("2024-06-01")
+    assert forecast["times"].iloc[-1] == pd.Timestamp("2024-06-03 23:00")
+    assert weather.version == 1
+    assert len(open_meteo.requests) == 1
+    assert open_meteo.requests[0]["start_date"] == "2024-06-01"
+    assert open_meteo.requests[0]["end_date"] == "2024-06-03"
+
+
+def test_forecast_refreshes_after_update_every(open_meteo, clock):
+    weather = create_weather(open_meteo.url)
+    weather.get()
+    clock.advance(timedelta(minutes=59))
+    weather.get()
+    assert len(open_meteo.requests) == 1
+    assert weather.version == 1
+
+    clock.advance(timedelta(minutes=2))
+    weather.get()
+    assert len(open_meteo.requests) == 2
+    assert weather.version == 2
+
+
+def test_quarter_hour_resolution(open_meteo, clock):
+    weather = create_weather(open_meteo.url, resolution=timedelta(minutes=15))
+    forecast = weather.get()
+
+    assert "minutely_15" in open_meteo.requests[0]
+    assert len(forecast) == 3 * 96
+    assert (forecast["times"].diff().dropna() == pd.Timedelta(minutes=15)).all()
+
+
+def test_unsupported_resolution(open_meteo):
+    with pytest.raises(ValueError):
+        create_weather(open_meteo.url, resolution=timedelta(minutes=30))
+
+
+def test_warm_start_from_disk(open_meteo, clock, tmp_path):
+    create_weather(open_meteo.url, cache_dir=str(tmp_path)).get()
+    assert len(open_meteo.requests) == 1
+
+    # a restart within the TTL does not download again
+    restarted = create_weather(open_meteo.url, cache_dir=str(tmp_path))
+    forecast = restarted.get()
+    assert len(open_meteo.requests) == 1
+    assert forecast["times"].iloc[0] == pd.Timestamp("2024-06-01")
+
+    # an expired entry is downloaded again
+    clock.advance(timedelta(hours=2))
+    expired = create_weather(open_meteo.url, cache_dir=str(tmp_path))
+    expired.get()
+    assert len(open_meteo.requests) == 2
+
+
+def test_keeps_forecast_when_download_fails(open_meteo, clock):
+    weather = create_weather(open_meteo.url)
+    forecast = weather.get()
+    open_meteo.fail = True
+    clock.advance(timedelta(minutes=61))
+
+    assert weather.get() is forecast
+    assert weather.version == 1
+    assert len(open_meteo.requests) == 2
+
+    # the failed refresh is not retried on every call
+    weather.get()
+    assert len(open_meteo.requests) == 2
+
+
+def test_serves_disk_cache_when_offline(open_meteo, clock, tmp_path):
+    create_weather(open_meteo.url, cache_dir=str(tmp_path)).get()
+    open_meteo.fail = True
+    clock.advance(timedelta(hours=3))
+
+    restarted = create_weather(open_meteo.url, cache_dir=str(tmp_path))
+    forecast = restarted.get()
+    assert forecast["times"].iloc[0] == pd.Timestamp("2024-06-01")
+    assert len(open_meteo.requests) == 2
+
+
+def test_drops_forecasts_that_ended_before_today(open_meteo, clock, tmp_path):
+    weather = create_weather(open_meteo.url, cache_dir=str(tmp_path), horizon=timedelta(hours=12))
+    weather.get()
+    clock.set(datetime(2024, 6, 2, 12))
+    weather.get()
+    clock.set(datetime(2024, 6, 3, 12))
+    weather.get()
+
+    # the forecast of 06-01 ended on 06-02, the one of 06-02 still covers today
+    assert sorted(key["start_date"] for key, _ in weather._cache.entries()) == ["2024-06-02", "2024-06-03"]
+
+
+@pytest.mark.parametrize("on_disk", [True, False])
+def test_offline_across_midnight(open_meteo, clock: VirtualClock, tmp_path, on_disk):
+    weather = create_weather(open_meteo.url, cache_dir=str(tmp_path) if on_disk else None)
+    weather.get()
+    open_meteo.fail = True
+    clock.set(datetime(2024, 6, 2, 0, 5))
+
+    # yesterday's forecast still covers today, it is cut to start at 00:00
+    forecast = weather.get()
+    assert forecast["times"].iloc[0] == pd.Timestamp("2024-06-02")
+    assert forecast["times"].iloc[-1] == pd.Timestamp("2024-06-03 23:00")
+    assert weather.version == 2
+
+
+def test_raises_without_fallback(open_meteo, clock):
+    open_meteo.fail = True
+    weather = create_weather(open_meteo.url)
+    with pytest.raises(requests.RequestException):
+        weather.get()
+
+
+def test_refresh_if_due(open_meteo, clock):
+    weather = create_weather(open_meteo.url)
+    wait_s = weather.refresh_if_due(lead=timedelta(minutes=5))
+    assert len(open_meteo.requests) == 1
+    assert wait_s == pytest.approx(55 * 60)
+
+    clock.advance(timedelta(minutes=56))
+    weather.refresh_if_due(lead=timedelta(minutes=5))
+    assert len(open_meteo.requests) == 2
+
+
+def test_retries_failed_requests(open_meteo, clock):
+    open_meteo.failures = 2
+    weather = create_weather(open_meteo.url, retries=2, backoff_s=0)
+    weather.get()
+    assert len(open_meteo.requests) == 3
+
+    open_meteo.failures = 3
+    clock.advance(timedelta(hours=2))
+    weather.get()
+    # the retries are used up, the previous forecast is kept
+    assert len(open_meteo.requests) == 6
+    assert weather.version == 1
+
+
+def test_request_timeout(open_meteo, clock):
+    open_meteo.delay_s = 1.0
+    weather = create_weather(open_meteo.url, timeout=(1.0, 0.2))
+    start = time.monotonic()
+    with pytest.raises(requests.RequestException):
+        weather.get()
+    assert time.monotonic() - start < 1.0
+
+
+def test_prefetch_in_background(open_meteo, clock):
+    weather = create_weather(open_meteo.url)
+    open_meteo.delay_s = 0.3
+    weather.start_prefetch()
+    try:
+        # waits for the download in flight instead of starting another one
+        forecast = weather.get()
+        assert len(open_meteo.requests) == 1
+        assert weather.background_refresh
+
+        # an expired forecast is served while the prefetch refreshes it
+        clock.advance(timedelta(hours=2))
+        assert weather.get() is forecast
+    finally:
+        weather.stop_prefetch()
+
+    assert not weather.background_refresh
+    assert len(open_meteo.requests) == 1
@@ -0,0 +1,118 @@
+from ctrlsolar.battery import Noah2000
+from ctrlsolar.controller import ZeroExportController
+from ctrlsolar.mqtt.library import Generic_Power
+import pytest
+
+SERIAL = "ABC123"
+
+
+class House:
+    """A household whose grid meter sees the consumption minus the battery output."""
+
+    def __init__(self, mqtt, monkeypatch: pytest.MonkeyPatch, consumption_W: float = 0):
+        self.mqtt = mqtt
+        self.consumption_W = consumption_W
+        self.now = 1000.0
+        monkeypatch.setattr("ctrlsolar.controller.zeroexport.time.monotonic", lambda: self.now)
+        self.battery = Noah2000.from_grobro(SERIAL)
+        mqtt._dispatch(f"homeassistant/grobro/{SERIAL}/availability", "online")
+        self.meter = Generic_Power("meter/grid")
+
+    def step(self, controller: ZeroExportController, seconds: float = 5) -> float:
+        self.now += seconds
+        assert controller.setpoint is not None
+        self.mqtt._dispatch("meter/grid", str(self.consumption_W - round(controller.setpoint)))
+        controller.update()
+        assert controller.setpoint is not None
+        return controller.setpoint
+
+
+def controller_for(house: House, p_min: float = 0, p_max: float = 800, settle_s: float = 0, **kwargs) -> ZeroExportController:
+    return ZeroExportController(house.battery, house.meter, p_min=p_min, p_max=p_max, settle_s=settle_s, **kwargs)
+
+
+def test_follows_the_consumption(mqtt, monkeypatch):
+    house = House(mqtt, monkeypatch, consumption_W=350)
+    controller = controller_for(house)
+    controller.set_target(600)
+    assert controller.setpoint == 600
+
+    for _ in range(20):
+        setpoint = house.step(controller)
+    assert setpoint == pytest.approx(350, abs=2)
+
+    house.consumption_W = 500
+    for _ in range(20):
+        setpoint = house.step(controller)
+    assert setpoint == pytest.approx(500, abs=2)
+
+
+def test_never_exceeds_the_planned_target(mqtt, monkeypatch):
+    house = House(mqtt, monkeypatch, consumption_W=900)
+    controller = controller_for(house)
+    controller.set_target(400)
+    setpoints = [house.step(controller) for _ in range(20)]
+    assert max(setpoints) == 400
+
+    # a lower target applies right away
+    controller.set_target(250)
+    assert controller.setpoint == 250
+    assert max(house.step(controller) for _ in range(20)) == 250
+
+    # the target itself is limited to the power range
+    controller.set_target(1000)
+    assert controller.limit == 800
+
+
+def test_clamps_to_zero_on_export(mqtt, monkeypatch):
+    house = House(mqtt, monkeypatch, consumption_W=0)
+    controller = controller_for(house)
+    controller.set_target(300)
+    for _ in range(30):
+        setpoint = house.step(controller)
+    assert round(setpoint) == 0
+
+    # with the panels exporting on their own, the output cannot go below zero
+    house.consumption_W = -200
+    assert house.step(controller) == 0
+    assert [payload for topic, payload, _ in mqtt.sent if topic.endswith("slot1_power/set")][-1] == 0
+
+
+def test_respects_p_min(mqtt, monkeypatch):
+    house = House(mqtt, monkeypatch, consumption_W=0)
+    controller = controller_for(house, p_min=100)
+    controller.set_target(300)
+    for _ in range(30):
+        setpoint = house.step(controller)
+    assert setpoint == 100
+
+
+@pytest.mark.parametrize("payload", ["unavailable", "nan"])
+def test_holds_without_valid_reading(mqtt, monkeypatch, payload):
+    house = House(mqtt, monkeypatch, consumption_W=0)
+    controller = controller_for(house, max_age_s=15)
+    controller.set_target(300)
+    mqtt._dispatch("meter/grid", payload)
+    controller.update()
+    assert controller.setpoint == 300
+
+    # a reading older than max_age_s is not used
+    mqtt._dispatch("meter/grid", "-300")
+    house.now += 16
+    controller.update()
+    assert controller.setpoint == 300
+
+
+def test_waits_for_the_meter_to_settle(mqtt, monkeypatch):
+    house = House(mqtt, monkeypatch, consumption_W=200)
+    controller = controller_for(house, settle_s=2)
+    controller.set_target(400)
+    house.now += 1
+    mqtt._dispatch("meter/grid", "-200")
+    controller.update()
+    assert controller.setpoint == 400
+
+    house.now += 2
+    mqtt._dispatch("meter/grid", "-200")
+    controller.update()
+    assert controller.setpoint == pytest.approx(400 - 0.7 * 200)